@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Redis Cluster Layout for RobertAI
+Hash tags por usuario, agrupación de claves por slot y clientes Redis compartidos
+"""
+
+import hashlib
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from redis.asyncio import ConnectionPool, Redis, RedisCluster
+from redis.asyncio.cluster import ClusterNode
+from redis.crc import key_slot
+
+logger = logging.getLogger(__name__)
+
+# Nodos usados si la URL pide cluster y no se configuran otros
+DEFAULT_CLUSTER_NODES = ["localhost:7000", "localhost:7001", "localhost:7002"]
+
+def user_hash_tag(user_id: str) -> str:
+    """Hash tag de Redis Cluster para un usuario (sin exponer el ID en la clave)"""
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).hexdigest()
+    return f"{{u:{digest}}}"
+
+def user_key(namespace: str, user_id: str, suffix: Optional[str] = None) -> str:
+    """Clave de cache por usuario: todas las del mismo usuario caen en el mismo slot"""
+    key = f"{namespace}:{user_hash_tag(user_id)}"
+    return f"{key}:{suffix}" if suffix else key
+
+def group_by_slot(keys: Sequence[str]) -> List[List[int]]:
+    """Índices de las claves agrupados por slot, para un MGET por grupo"""
+    groups: Dict[int, List[int]] = {}
+    for index, key in enumerate(keys):
+        groups.setdefault(key_slot(key.encode()), []).append(index)
+    return list(groups.values())
+
+def parse_cluster_nodes(nodes: Sequence[str]) -> List[ClusterNode]:
+    """Convertir "host:puerto" en ClusterNode"""
+    parsed = []
+    for node in nodes:
+        host, _, port = node.rpartition(":")
+        parsed.append(ClusterNode(host or "localhost", int(port)))
+    return parsed
+
+class SharedRedisClients:
+    """Clientes Redis compartidos por destino, con su pool acotado
+    
+    Varias instancias del cache (o de otros servicios) en el mismo proceso
+    reutilizan el mismo pool en vez de abrir conexiones propias; el cliente
+    se cierra cuando lo libera el último que lo pidió.
+    """
+    
+    def __init__(self):
+        self.clients: Dict[Tuple, Union[Redis, RedisCluster]] = {}
+        self.refcounts: Dict[Tuple, int] = {}
+    
+    async def acquire(self, url: str, db: int = 0,
+                      cluster_nodes: Optional[Sequence[str]] = None,
+                      max_connections: int = 64,
+                      socket_timeout: float = 5.0) -> Union[Redis, RedisCluster]:
+        """Obtener el cliente compartido para la URL/DB (o el cluster)"""
+        target = (url, db, tuple(cluster_nodes) if cluster_nodes else None)
+        client = self.clients.get(target)
+        
+        if client is None:
+            if cluster_nodes:
+                # En cluster el pool es por nodo; los pipelines se reparten por nodo
+                client = RedisCluster(
+                    startup_nodes=parse_cluster_nodes(cluster_nodes),
+                    max_connections=max_connections,
+                    socket_timeout=socket_timeout,
+                    socket_connect_timeout=socket_timeout,
+                    decode_responses=False
+                )
+                await client.initialize()
+            else:
+                pool = ConnectionPool.from_url(
+                    url,
+                    db=db,
+                    max_connections=max_connections,
+                    socket_timeout=socket_timeout,
+                    socket_connect_timeout=socket_timeout,
+                    decode_responses=False
+                )
+                client = Redis(connection_pool=pool)
+            
+            self.clients[target] = client
+            self.refcounts[target] = 0
+            logger.info(f"Opened shared Redis client for {target[2] or url} (db {db})")
+        
+        self.refcounts[target] += 1
+        return client
+    
+    async def release(self, client: Union[Redis, RedisCluster]):
+        """Liberar el cliente; se cierra al quedar sin usuarios"""
+        for target, shared in list(self.clients.items()):
+            if shared is not client:
+                continue
+            self.refcounts[target] -= 1
+            if self.refcounts[target] <= 0:
+                del self.clients[target]
+                del self.refcounts[target]
+                await client.aclose()
+                if not isinstance(client, RedisCluster):
+                    await client.connection_pool.disconnect()
+            return
+
+# Registro del proceso
+shared_redis_clients = SharedRedisClients()
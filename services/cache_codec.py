@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Cache Codec for RobertAI
+Serialización binaria de una sola pasada para los niveles L2/L3 del cache
+"""
+
+import json
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Optional
+
+import msgpack
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # lz4 es opcional
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard es opcional
+    zstandard = None
+
+CODEC_VERSION = 1
+
+# Header: byte de versión/formato + created_at, ttl, soft_ttl (0 = sin soft TTL), delta
+HEADER = struct.Struct("!BdIIf")
+
+class Compression(Enum):
+    NONE = 0
+    ZLIB = 1
+    LZ4 = 2
+    ZSTD = 3
+
+class Serializer(Enum):
+    MSGPACK = 0
+    # 1 era pickle: se rechaza al decodificar (ejecutaría código escrito por cualquiera con acceso a Redis)
+
+class CodecError(TypeError):
+    """Valor que no se puede codificar de forma segura (msgpack no lo soporta)"""
+
+@dataclass
+class DecodedPayload:
+    """Valor decodificado con los metadatos del header"""
+    value: Any
+    created_at: float
+    ttl: int
+    soft_ttl: Optional[int] = None
+    delta: float = 0.0
+    compression: Compression = Compression.NONE
+
+def _format_byte(serializer: Serializer, compression: Compression) -> int:
+    # 4 bits de versión | 1 bit de serializador | 2 bits de compresión
+    return (CODEC_VERSION << 4) | (serializer.value << 2) | compression.value
+
+class CacheCodec:
+    """Codec msgpack + compresión elegida por tamaño con header versionado"""
+    
+    def __init__(self, compression_threshold: int = 1024,
+                 large_value_threshold: int = 64 * 1024,
+                 zstd_level: int = 3):
+        self.compression_threshold = compression_threshold
+        self.large_value_threshold = large_value_threshold
+        self._zstd_compressor = zstandard.ZstdCompressor(level=zstd_level) if zstandard else None
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+        
+        # Bytes serializados antes y después de comprimir (para la tasa de compresión)
+        self.encoded_values = 0
+        self.compressed_values = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+    
+    def encode(self, value: Any, created_at: Optional[float] = None, ttl: int = 0,
+               soft_ttl: Optional[int] = None, delta: float = 0.0) -> bytes:
+        """Serializar y comprimir en una sola pasada"""
+        serializer = Serializer.MSGPACK
+        try:
+            body = msgpack.packb(value, use_bin_type=True)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise CodecError(f"Cannot encode {type(value).__name__} for cache: {e}") from e
+        
+        compression = Compression.NONE
+        raw_size = len(body)
+        if raw_size > self.compression_threshold:
+            compression, compressed_body = self._compress(body)
+            if len(compressed_body) < len(body):
+                body = compressed_body
+            else:
+                compression = Compression.NONE
+        
+        self.encoded_values += 1
+        self.raw_bytes += raw_size
+        self.encoded_bytes += len(body)
+        if compression != Compression.NONE:
+            self.compressed_values += 1
+        
+        header = HEADER.pack(
+            _format_byte(serializer, compression),
+            created_at if created_at is not None else time.time(),
+            ttl,
+            soft_ttl or 0,
+            delta
+        )
+        return header + body
+    
+    def decode(self, data: bytes) -> DecodedPayload:
+        """Decodificar payload; acepta también el formato legacy (dict msgpack)"""
+        if is_legacy_payload(data):
+            try:
+                return LegacyCodec().decode(data)
+            except ValueError:
+                raise
+            except Exception as e:  # Dict sin 'value', zlib.error
+                raise ValueError(f"Corrupt legacy cache payload: {e}") from e
+        
+        if len(data) < HEADER.size:
+            raise ValueError(f"Truncated cache payload: {len(data)} bytes, header needs {HEADER.size}")
+        format_byte, created_at, ttl, soft_ttl, delta = HEADER.unpack_from(data)
+        version = format_byte >> 4
+        if version != CODEC_VERSION:
+            raise ValueError(f"Unsupported cache codec version: {version}")
+        
+        if (format_byte >> 2) & 0x1 != Serializer.MSGPACK.value:
+            raise ValueError("Refusing to decode pickle cache payload")
+        compression = Compression(format_byte & 0x3)
+        
+        body = memoryview(data)[HEADER.size:]
+        try:
+            if compression != Compression.NONE:
+                body = self._decompress(compression, body)
+            value = msgpack.unpackb(body, raw=False, strict_map_key=False)
+        except ValueError:
+            raise
+        except Exception as e:  # zlib.error, errores de lz4/zstd
+            raise ValueError(f"Corrupt cache payload body: {e}") from e
+        
+        return DecodedPayload(
+            value=value,
+            created_at=created_at,
+            ttl=ttl,
+            soft_ttl=soft_ttl or None,
+            delta=delta,
+            compression=compression
+        )
+    
+    def get_stats(self) -> dict:
+        return {
+            "encoded_values": self.encoded_values,
+            "compressed_values": self.compressed_values,
+            "raw_bytes": self.raw_bytes,
+            "encoded_bytes": self.encoded_bytes,
+            "compression_ratio": self.raw_bytes / self.encoded_bytes if self.encoded_bytes else 1.0
+        }
+    
+    def _compress(self, body: bytes):
+        """Elegir compresor según el tamaño del valor"""
+        if len(body) >= self.large_value_threshold and self._zstd_compressor:
+            return Compression.ZSTD, self._zstd_compressor.compress(body)
+        if lz4_frame:
+            return Compression.LZ4, lz4_frame.compress(body)
+        return Compression.ZLIB, zlib.compress(body)
+    
+    def _decompress(self, compression: Compression, body) -> bytes:
+        if compression == Compression.ZLIB:
+            return zlib.decompress(body)
+        if compression == Compression.LZ4:
+            if not lz4_frame:
+                raise ValueError("lz4 payload found but lz4 is not installed")
+            return lz4_frame.decompress(body)
+        if compression == Compression.ZSTD:
+            if not self._zstd_decompressor:
+                raise ValueError("zstd payload found but zstandard is not installed")
+            return self._zstd_decompressor.decompress(body)
+        return bytes(body)
+
+def is_legacy_payload(data: bytes) -> bool:
+    """Los payloads legacy son un dict msgpack (fixmap 0x80-0x8f)"""
+    return bool(data) and (data[0] >> 4) == 0x8
+
+class LegacyCodec:
+    """Formato anterior: json → zlib → dict msgpack (lectura durante el rollout y benchmarks)"""
+    
+    def __init__(self, compression_threshold: int = 1024):
+        self.compression_threshold = compression_threshold
+    
+    def encode(self, value: Any, created_at: Optional[float] = None, ttl: int = 0,
+               soft_ttl: Optional[int] = None, delta: float = 0.0) -> bytes:
+        if isinstance(value, (dict, list)):
+            serialized = json.dumps(value)
+        else:
+            serialized = str(value)
+        
+        compressed = False
+        if len(serialized.encode()) > self.compression_threshold:
+            compressed_data = zlib.compress(serialized.encode())
+            if len(compressed_data) < len(serialized.encode()):
+                serialized = compressed_data
+                compressed = True
+        
+        return msgpack.packb({
+            "value": serialized,
+            "compressed": compressed,
+            "ttl": ttl,
+            "created_at": created_at if created_at is not None else time.time(),
+            "soft_ttl": soft_ttl,
+            "delta": delta
+        })
+    
+    def decode(self, data: bytes) -> DecodedPayload:
+        cache_data = msgpack.unpackb(data)
+        value = cache_data['value']
+        compressed = cache_data.get('compressed', False)
+        
+        if compressed:
+            value = zlib.decompress(value).decode()
+        if isinstance(value, bytes):
+            value = value.decode()
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        
+        return DecodedPayload(
+            value=value,
+            created_at=cache_data.get('created_at') or time.time(),
+            ttl=cache_data.get('ttl', 0),
+            soft_ttl=cache_data.get('soft_ttl'),
+            delta=cache_data.get('delta', 0.0),
+            compression=Compression.ZLIB if compressed else Compression.NONE
+        )
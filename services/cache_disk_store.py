@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+Disk Log Store for RobertAI
+Nivel L3 local: log de segmentos append-only con índice hash mapeado en memoria
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Registro: crc32, largo del valor (TOMBSTONE = borrado), largo de la clave, expires_at
+RECORD_HEADER = struct.Struct("!IIHd")
+TOMBSTONE = 0xFFFFFFFF
+
+# Índice: tabla hash de direccionamiento abierto persistida en index.bin
+INDEX_MAGIC = b"RAIL3IDX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("!8sIIIIIIB")  # magic, versión, capacidad, count, usados, segmento activo, offset, limpio
+INDEX_SLOT = struct.Struct("!QIIIHd")  # hash, segmento, offset, largo del registro, largo de la clave, expires_at
+EMPTY_HASH = 0
+DELETED_HASH = 1
+
+def _key_hash(key: bytes) -> int:
+    h = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+    return h if h > DELETED_HASH else h + 2
+
+class DiskLogStore:
+    """Almacén clave-valor embebido para el L3 del nodo
+    
+    Las escrituras se agregan al segmento activo (mmap preasignado) y el índice
+    apunta al último registro de cada clave. Las lecturas devuelven un
+    memoryview sobre el segmento, sin copiar. La compactación reescribe los
+    registros vivos de segmentos con mucha basura y borra el archivo viejo;
+    compact_step la hace por tramos para no frenar al event loop.
+    Si el proceso muere sin cerrar, el índice se reconstruye leyendo el log.
+    """
+    
+    def __init__(self,
+                 directory: str,
+                 segment_size: int = 32 * 1024 * 1024,  # 32MB por segmento
+                 index_capacity: int = 65536,
+                 compaction_threshold: float = 0.5,  # Fracción de basura para compactar
+                 max_load_factor: float = 0.7):
+        
+        self.directory = directory
+        self.segment_size = segment_size
+        self.initial_index_capacity = index_capacity
+        self.compaction_threshold = compaction_threshold
+        self.max_load_factor = max_load_factor
+        
+        self.segments: Dict[int, mmap.mmap] = {}
+        self.segment_files: Dict[int, object] = {}
+        self.live_bytes: Dict[int, int] = {}
+        self.retired_maps: List[mmap.mmap] = []  # mmaps con lecturas aún vivas
+        self.active_segment = 0
+        self.write_offset = 0
+        
+        self.index_file = None
+        self.index_mm: Optional[mmap.mmap] = None
+        self.capacity = 0
+        self.count = 0
+        self.used_slots = 0  # Vivos + borrados
+        
+        self.sweep_cursor = 0
+        self.compaction: Optional[List] = None  # [segmento, offset, bytes movidos, hay segmentos más viejos]
+        self.stats = {
+            "writes": 0,
+            "reads": 0,
+            "read_hits": 0,
+            "compactions": 0,
+            "compacted_bytes": 0,
+            "index_rebuilds": 0
+        }
+        self.is_open = False
+    
+    # Ciclo de vida
+    
+    def open(self):
+        """Abrir segmentos e índice (reconstruyéndolo si el cierre no fue limpio)"""
+        os.makedirs(self.directory, exist_ok=True)
+        
+        segment_ids = sorted(
+            int(name[len("segment-"):-len(".log")])
+            for name in os.listdir(self.directory)
+            if name.startswith("segment-") and name.endswith(".log")
+        )
+        for segment_id in segment_ids:
+            self._map_segment(segment_id, create=False)
+        if not segment_ids:
+            self._map_segment(0, create=True)
+            segment_ids = [0]
+        
+        if not self._load_index():
+            self._rebuild_index(segment_ids)
+        
+        self._write_index_header(clean=False)
+        self.is_open = True
+        logger.info(f"Disk L3 opened at {self.directory}: {self.count} keys, {len(self.segments)} segments")
+    
+    def close(self):
+        """Sincronizar a disco y marcar el índice como limpio"""
+        if not self.is_open:
+            return
+        
+        self.sync()
+        self._write_index_header(clean=True)
+        self.index_mm.flush()
+        
+        # Una compactación a medias se retoma desde cero (lo ya movido es basura del segmento viejo)
+        self.compaction = None
+        for segment_id in list(self.segments):
+            self._unmap_segment(segment_id)
+        self._close_index()
+        self.is_open = False
+    
+    def sync(self):
+        """Forzar escritura del segmento activo y del índice"""
+        self.segments[self.active_segment].flush()
+        self._write_index_header(clean=False)
+        self.index_mm.flush()
+    
+    # Operaciones
+    
+    def get(self, key: str) -> Optional[memoryview]:
+        """Valor de la clave como memoryview sobre el segmento (zero-copy)"""
+        self.stats["reads"] += 1
+        key_bytes = key.encode()
+        slot, _ = self._find_slot(key_bytes, _key_hash(key_bytes))
+        if slot is None:
+            return None
+        
+        _, segment_id, offset, record_len, key_len, expires_at = self._read_slot(slot)
+        if expires_at and expires_at <= time.time():
+            self._delete_slot(slot)
+            return None
+        
+        self.stats["read_hits"] += 1
+        start = offset + RECORD_HEADER.size + key_len
+        return memoryview(self.segments[segment_id])[start:offset + record_len]
+    
+    def put(self, key: str, value: bytes, ttl: float = 0):
+        """Agregar valor al log; ttl=0 significa sin expiración"""
+        expires_at = time.time() + ttl if ttl else 0.0
+        self._append(key.encode(), value, expires_at)
+    
+    def delete(self, key: str) -> bool:
+        """Borrar clave (tombstone en el log para que sobreviva a reinicios)"""
+        key_bytes = key.encode()
+        slot, _ = self._find_slot(key_bytes, _key_hash(key_bytes))
+        if slot is None:
+            return False
+        
+        self._write_record(key_bytes, b"", 0.0, tombstone=True)
+        self._delete_slot(slot)
+        return True
+    
+    def needs_compaction(self) -> bool:
+        return self.compaction is not None or any(
+            self._garbage_ratio(segment_id) >= self.compaction_threshold
+            for segment_id in self.segments if segment_id != self.active_segment
+        )
+    
+    @property
+    def compacting(self) -> bool:
+        return self.compaction is not None
+    
+    def compact(self, max_segments: int = 1, sweep_budget: int = 4096) -> int:
+        """Compactar los segmentos con más basura de una vez; devuelve bytes liberados"""
+        reclaimed = 0
+        for _ in range(max_segments):
+            if not self.needs_compaction():
+                break
+            reclaimed += self.compact_step(record_budget=None, sweep_budget=sweep_budget)
+        return reclaimed
+    
+    def compact_step(self, record_budget: Optional[int] = 1024, sweep_budget: int = 4096) -> int:
+        """Avanzar la compactación hasta record_budget registros (None = hasta terminar el segmento)
+        
+        Entre tramos se puede leer y escribir normalmente: un registro reescrito
+        o borrado mientras tanto ya no es el que apunta el índice y se descarta.
+        Devuelve los bytes liberados si el segmento terminó, si no 0.
+        """
+        if self.compaction is None:
+            self._sweep_expired(sweep_budget)
+            self._release_retired_maps()
+            candidates = sorted(
+                (segment_id for segment_id in self.segments
+                 if segment_id != self.active_segment
+                 and self._garbage_ratio(segment_id) >= self.compaction_threshold),
+                key=lambda segment_id: (self.live_bytes.get(segment_id, 0), segment_id)
+            )
+            if not candidates:
+                return 0
+            segment_id = candidates[0]
+            self.compaction = [segment_id, 0, 0, any(other < segment_id for other in self.segments)]
+        
+        return self._compact_segment(record_budget)
+    
+    def get_stats(self) -> Dict[str, object]:
+        """Estadísticas del almacén"""
+        live = sum(self.live_bytes.values())
+        allocated = len(self.segments) * self.segment_size
+        return {
+            **self.stats,
+            "keys": self.count,
+            "segments": len(self.segments),
+            "live_bytes": live,
+            "allocated_bytes": allocated,
+            "garbage_ratio": 1 - live / allocated if allocated else 0.0,
+            "index_capacity": self.capacity,
+            "index_load_factor": self.used_slots / self.capacity if self.capacity else 0.0
+        }
+    
+    def keys(self) -> Iterator[str]:
+        """Claves vivas, en el orden del índice"""
+        now = time.time()
+        for slot in range(self.capacity):
+            key_hash, segment_id, offset, _, key_len, expires_at = self._read_slot(slot)
+            if key_hash > DELETED_HASH and not (expires_at and expires_at <= now):
+                key_start = offset + RECORD_HEADER.size
+                yield bytes(self.segments[segment_id][key_start:key_start + key_len]).decode()
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+    
+    # Segmentos
+    
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment_id:08d}.log")
+    
+    def _map_segment(self, segment_id: int, create: bool):
+        path = self._segment_path(segment_id)
+        f = open(path, "w+b" if create else "r+b")
+        if create or os.fstat(f.fileno()).st_size < self.segment_size:
+            f.truncate(self.segment_size)  # Archivo disperso, se llena con las escrituras
+        self.segment_files[segment_id] = f
+        self.segments[segment_id] = mmap.mmap(f.fileno(), self.segment_size)
+        self.live_bytes.setdefault(segment_id, 0)
+    
+    def _unmap_segment(self, segment_id: int):
+        mm = self.segments.pop(segment_id)
+        mm.flush()
+        try:
+            mm.close()
+        except BufferError:
+            # Un lector todavía tiene un memoryview; se cierra más tarde
+            self.retired_maps.append(mm)
+        self.segment_files.pop(segment_id).close()
+        self.live_bytes.pop(segment_id, None)
+    
+    def _release_retired_maps(self):
+        still_exported = []
+        for mm in self.retired_maps:
+            try:
+                mm.close()
+            except BufferError:
+                still_exported.append(mm)
+        self.retired_maps = still_exported
+    
+    def _garbage_ratio(self, segment_id: int) -> float:
+        return 1 - self.live_bytes.get(segment_id, 0) / self.segment_size
+    
+    def _read_record(self, mm: mmap.mmap, offset: int) -> Optional[Tuple[bytes, memoryview, float, int, bool]]:
+        """Registro en offset o None al llegar al final (o a una escritura truncada)"""
+        if offset + RECORD_HEADER.size > self.segment_size:
+            return None
+        crc, value_len, key_len, expires_at = RECORD_HEADER.unpack_from(mm, offset)
+        if key_len == 0:
+            return None
+        
+        tombstone = value_len == TOMBSTONE
+        body_len = key_len + (0 if tombstone else value_len)
+        record_len = RECORD_HEADER.size + body_len
+        if offset + record_len > self.segment_size:
+            return None
+        
+        view = memoryview(mm)[offset + 4:offset + record_len]
+        if zlib.crc32(view) != crc:
+            return None
+        
+        key_start = offset + RECORD_HEADER.size
+        key = bytes(mm[key_start:key_start + key_len])
+        value = memoryview(mm)[key_start + key_len:offset + record_len]
+        return key, value, expires_at, record_len, tombstone
+    
+    def _write_record(self, key: bytes, value, expires_at: float, tombstone: bool = False) -> Tuple[int, int, int]:
+        """Escribir registro en el segmento activo; devuelve (segmento, offset, largo)"""
+        if not key or len(key) > 0xFFFF:
+            raise ValueError("L3 keys must be between 1 and 65535 bytes")
+        
+        value_len = TOMBSTONE if tombstone else len(value)
+        record_len = RECORD_HEADER.size + len(key) + (0 if tombstone else len(value))
+        if record_len > self.segment_size:
+            raise ValueError(f"Value of {len(value)} bytes exceeds L3 segment size")
+        
+        if self.write_offset + record_len > self.segment_size:
+            self._roll_segment()
+        
+        mm = self.segments[self.active_segment]
+        offset = self.write_offset
+        body_start = offset + RECORD_HEADER.size
+        mm[body_start:body_start + len(key)] = key
+        if not tombstone:
+            mm[body_start + len(key):offset + record_len] = value
+        
+        # El CRC cubre header (sin el propio CRC), clave y valor
+        RECORD_HEADER.pack_into(mm, offset, 0, value_len, len(key), expires_at)
+        crc = zlib.crc32(memoryview(mm)[offset + 4:offset + record_len])
+        struct.pack_into("!I", mm, offset, crc)
+        
+        self.write_offset += record_len
+        self.stats["writes"] += 1
+        return self.active_segment, offset, record_len
+    
+    def _roll_segment(self):
+        self.segments[self.active_segment].flush()
+        self.active_segment += 1
+        self._map_segment(self.active_segment, create=True)
+        self.write_offset = 0
+    
+    def _append(self, key: bytes, value, expires_at: float):
+        segment_id, offset, record_len = self._write_record(key, value, expires_at)
+        self._index_put(key, segment_id, offset, record_len, expires_at)
+    
+    def _compact_segment(self, record_budget: Optional[int]) -> int:
+        segment_id, offset, moved, has_older_segments = self.compaction
+        mm = self.segments[segment_id]
+        
+        processed = 0
+        finished = False
+        while record_budget is None or processed < record_budget:
+            record = self._read_record(mm, offset)
+            if record is None:
+                finished = True
+                break
+            key, value, expires_at, record_len, tombstone = record
+            
+            slot, _ = self._find_slot(key, _key_hash(key))
+            if tombstone:
+                # Conservar el borrado si segmentos más viejos pueden tener la clave;
+                # si fue reescrita después, el registro nuevo ya la tapa
+                if has_older_segments and slot is None:
+                    self._write_record(key, b"", 0.0, tombstone=True)
+            else:
+                if slot is not None:
+                    _, slot_segment, slot_offset, _, _, _ = self._read_slot(slot)
+                    if (slot_segment, slot_offset) == (segment_id, offset):
+                        if expires_at and expires_at <= time.time():
+                            self._delete_slot(slot)
+                        else:
+                            self._append(key, value, expires_at)
+                            moved += record_len
+            
+            value.release()
+            offset += record_len
+            processed += 1
+        
+        if not finished:
+            self.compaction = [segment_id, offset, moved, has_older_segments]
+            return 0
+        
+        self.compaction = None
+        self._unmap_segment(segment_id)
+        os.remove(self._segment_path(segment_id))
+        
+        self.stats["compactions"] += 1
+        self.stats["compacted_bytes"] += self.segment_size - moved
+        logger.debug(f"Compacted L3 segment {segment_id}: moved {moved} live bytes")
+        return self.segment_size - moved
+    
+    # Índice
+    
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.bin")
+    
+    def _create_index(self, capacity: int, path: Optional[str] = None):
+        path = path or self._index_path()
+        with open(path, "w+b") as f:
+            f.truncate(INDEX_HEADER.size + capacity * INDEX_SLOT.size)
+        self._open_index(path)
+        self.capacity = capacity
+        self.count = 0
+        self.used_slots = 0
+        self._write_index_header(clean=False)
+    
+    def _open_index(self, path: str):
+        self.index_file = open(path, "r+b")
+        self.index_mm = mmap.mmap(self.index_file.fileno(), 0)
+    
+    def _close_index(self):
+        if self.index_mm is not None:
+            self.index_mm.close()
+            self.index_file.close()
+            self.index_mm = None
+            self.index_file = None
+    
+    def _write_index_header(self, clean: bool):
+        INDEX_HEADER.pack_into(
+            self.index_mm, 0, INDEX_MAGIC, INDEX_VERSION, self.capacity, self.count,
+            self.used_slots, self.active_segment, self.write_offset, int(clean)
+        )
+    
+    def _load_index(self) -> bool:
+        """Usar el índice persistido si el último cierre fue limpio"""
+        path = self._index_path()
+        if not os.path.exists(path) or os.path.getsize(path) < INDEX_HEADER.size:
+            return False
+        
+        self._open_index(path)
+        magic, version, capacity, count, used, active, write_offset, clean = INDEX_HEADER.unpack_from(self.index_mm, 0)
+        expected_size = INDEX_HEADER.size + capacity * INDEX_SLOT.size
+        if (magic != INDEX_MAGIC or version != INDEX_VERSION or not clean
+                or len(self.index_mm) != expected_size or active not in self.segments):
+            self._close_index()
+            return False
+        
+        self.capacity, self.count, self.used_slots = capacity, count, used
+        self.active_segment, self.write_offset = active, write_offset
+        for slot in range(capacity):
+            key_hash, segment_id, _, record_len, _, _ = self._read_slot(slot)
+            if key_hash > DELETED_HASH:
+                self.live_bytes[segment_id] = self.live_bytes.get(segment_id, 0) + record_len
+        return True
+    
+    def _rebuild_index(self, segment_ids: List[int]):
+        """Reconstruir el índice recorriendo el log en orden"""
+        self._close_index()
+        self._create_index(self.initial_index_capacity)
+        for segment_id in segment_ids:
+            self.live_bytes[segment_id] = 0
+        
+        now = time.time()
+        for segment_id in segment_ids:
+            mm = self.segments[segment_id]
+            offset = 0
+            while True:
+                record = self._read_record(mm, offset)
+                if record is None:
+                    break
+                key, value, expires_at, record_len, tombstone = record
+                value.release()
+                
+                if tombstone or (expires_at and expires_at <= now):
+                    slot, _ = self._find_slot(key, _key_hash(key))
+                    if slot is not None:
+                        self._delete_slot(slot)
+                else:
+                    self._index_put(key, segment_id, offset, record_len, expires_at)
+                offset += record_len
+            
+            self.active_segment = segment_id
+            self.write_offset = offset
+        
+        self.stats["index_rebuilds"] += 1
+        logger.info(f"Rebuilt disk L3 index from {len(segment_ids)} segments ({self.count} keys)")
+    
+    def _slot_offset(self, slot: int) -> int:
+        return INDEX_HEADER.size + slot * INDEX_SLOT.size
+    
+    def _read_slot(self, slot: int) -> Tuple[int, int, int, int, int, float]:
+        return INDEX_SLOT.unpack_from(self.index_mm, self._slot_offset(slot))
+    
+    def _find_slot(self, key: bytes, key_hash: int) -> Tuple[Optional[int], Optional[int]]:
+        """(slot de la clave o None, primer slot libre para insertarla)"""
+        first_free = None
+        slot = key_hash % self.capacity
+        for _ in range(self.capacity):
+            slot_hash, segment_id, offset, _, key_len, _ = self._read_slot(slot)
+            if slot_hash == EMPTY_HASH:
+                return None, first_free if first_free is not None else slot
+            if slot_hash == DELETED_HASH:
+                if first_free is None:
+                    first_free = slot
+            elif slot_hash == key_hash and key_len == len(key):
+                # Colisión de hash posible: comparar la clave guardada en el log
+                key_start = offset + RECORD_HEADER.size
+                if self.segments[segment_id][key_start:key_start + key_len] == key:
+                    return slot, first_free
+            slot = (slot + 1) % self.capacity
+        return None, first_free
+    
+    def _index_put(self, key: bytes, segment_id: int, offset: int, record_len: int, expires_at: float):
+        key_hash = _key_hash(key)
+        slot, free_slot = self._find_slot(key, key_hash)
+        
+        if slot is not None:
+            _, old_segment, _, old_len, _, _ = self._read_slot(slot)
+            if old_segment in self.live_bytes:
+                self.live_bytes[old_segment] -= old_len
+        else:
+            slot = free_slot
+            self.count += 1
+            if INDEX_SLOT.unpack_from(self.index_mm, self._slot_offset(slot))[0] == EMPTY_HASH:
+                self.used_slots += 1
+        
+        INDEX_SLOT.pack_into(self.index_mm, self._slot_offset(slot),
+                             key_hash, segment_id, offset, record_len, len(key), expires_at)
+        self.live_bytes[segment_id] = self.live_bytes.get(segment_id, 0) + record_len
+        
+        if self.used_slots > self.capacity * self.max_load_factor:
+            self._resize_index()
+    
+    def _delete_slot(self, slot: int):
+        _, segment_id, _, record_len, _, _ = self._read_slot(slot)
+        if segment_id in self.live_bytes:
+            self.live_bytes[segment_id] -= record_len
+        INDEX_SLOT.pack_into(self.index_mm, self._slot_offset(slot), DELETED_HASH, 0, 0, 0, 0, 0.0)
+        self.count -= 1
+    
+    def _resize_index(self):
+        """Duplicar capacidad (o solo purgar borrados) reescribiendo el índice"""
+        entries = []
+        for slot in range(self.capacity):
+            entry = self._read_slot(slot)
+            if entry[0] > DELETED_HASH:
+                entries.append(entry)
+        
+        new_capacity = self.capacity * 2 if len(entries) > self.capacity * self.max_load_factor / 2 else self.capacity
+        tmp_path = self._index_path() + ".tmp"
+        self._close_index()
+        self._create_index(new_capacity, tmp_path)
+        
+        for key_hash, segment_id, offset, record_len, key_len, expires_at in entries:
+            slot = key_hash % new_capacity
+            while INDEX_SLOT.unpack_from(self.index_mm, self._slot_offset(slot))[0] != EMPTY_HASH:
+                slot = (slot + 1) % new_capacity
+            INDEX_SLOT.pack_into(self.index_mm, self._slot_offset(slot),
+                                 key_hash, segment_id, offset, record_len, key_len, expires_at)
+        self.count = self.used_slots = len(entries)
+        self._write_index_header(clean=False)
+        
+        self._close_index()
+        os.replace(tmp_path, self._index_path())
+        self._open_index(self._index_path())
+    
+    def _sweep_expired(self, budget: int):
+        """Borrar del índice entradas expiradas, avanzando un cursor por slots"""
+        now = time.time()
+        for _ in range(min(budget, self.capacity)):
+            slot = self.sweep_cursor
+            self.sweep_cursor = (self.sweep_cursor + 1) % self.capacity
+            key_hash, _, _, _, _, expires_at = self._read_slot(slot)
+            if key_hash > DELETED_HASH and expires_at and expires_at <= now:
+                self._delete_slot(slot)
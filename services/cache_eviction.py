@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Cache Eviction Policies for RobertAI
+Motores de expulsión O(1) para el cache L1 (LRU, LFU y W-TinyLFU) y admisión por promoción
+"""
+
+import random
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Dict, Optional, Tuple
+
+# Tabla de traducción para dividir todos los contadores a la mitad de una vez
+_HALVE_TABLE = bytes(i >> 1 for i in range(256))
+
+class EvictionPolicy(Enum):
+    LRU = "lru"              # Least Recently Used
+    LFU = "lfu"              # Least Frequently Used
+    W_TINYLFU = "w-tinylfu"  # Ventana LRU + admisión por frecuencia estimada
+
+class FrequencySketch:
+    """Count-min sketch con envejecimiento para estimar frecuencias de acceso"""
+    
+    def __init__(self, width: int = 4096, depth: int = 4, max_count: int = 15,
+                 sample_size: Optional[int] = None):
+        # Ancho potencia de 2 para indexar con máscara
+        self.width = 1 << max(4, (width - 1).bit_length())
+        self.depth = depth
+        self.max_count = max_count
+        self.sample_size = sample_size or self.width * 10
+        self.mask = self.width - 1
+        self.table = [bytearray(self.width) for _ in range(depth)]
+        self.seeds = [random.getrandbits(32) | 1 for _ in range(depth)]
+        self.additions = 0
+    
+    def _indexes(self, key: str):
+        h = hash(key)
+        return [((h ^ seed) * 0x9E3779B1 >> 7) & self.mask for seed in self.seeds]
+    
+    def increment(self, key: str):
+        """Registrar un acceso a la clave"""
+        added = False
+        for row, index in zip(self.table, self._indexes(key)):
+            if row[index] < self.max_count:
+                row[index] += 1
+                added = True
+        
+        if added:
+            self.additions += 1
+            if self.additions >= self.sample_size:
+                self._reset()
+    
+    def estimate(self, key: str) -> int:
+        """Frecuencia estimada (cota superior) de la clave"""
+        return min(row[index] for row, index in zip(self.table, self._indexes(key)))
+    
+    def _reset(self):
+        """Envejecer contadores dividiéndolos a la mitad"""
+        self.table = [row.translate(_HALVE_TABLE) for row in self.table]
+        self.additions //= 2
+    
+    def clear(self):
+        self.table = [bytearray(self.width) for _ in range(self.depth)]
+        self.additions = 0
+
+class L1EvictionEngine:
+    """Interfaz común de los motores de expulsión de L1
+    
+    Todas las operaciones son O(1). El motor solo lleva el orden de las
+    claves; el almacenamiento de los valores sigue en MassiveCacheStrategy.
+    """
+    
+    policy: EvictionPolicy
+    
+    def record_insert(self, key: str):
+        raise NotImplementedError
+    
+    def record_access(self, key: str):
+        raise NotImplementedError
+    
+    def remove(self, key: str):
+        raise NotImplementedError
+    
+    def select_victim(self) -> Optional[str]:
+        """Clave que debe expulsarse a continuación (sin removerla)"""
+        raise NotImplementedError
+    
+    def clear(self):
+        raise NotImplementedError
+    
+    def __len__(self) -> int:
+        raise NotImplementedError
+    
+    def __contains__(self, key: str) -> bool:
+        raise NotImplementedError
+
+class LRUEngine(L1EvictionEngine):
+    """LRU sobre OrderedDict (lista doblemente enlazada interna)"""
+    
+    policy = EvictionPolicy.LRU
+    
+    def __init__(self, capacity: int = 0):
+        self.order: "OrderedDict[str, None]" = OrderedDict()
+    
+    def record_insert(self, key: str):
+        self.order[key] = None
+        self.order.move_to_end(key)
+    
+    def record_access(self, key: str):
+        if key in self.order:
+            self.order.move_to_end(key)
+    
+    def remove(self, key: str):
+        self.order.pop(key, None)
+    
+    def select_victim(self) -> Optional[str]:
+        return next(iter(self.order), None)
+    
+    def clear(self):
+        self.order.clear()
+    
+    def __len__(self) -> int:
+        return len(self.order)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.order
+
+class LFUEngine(L1EvictionEngine):
+    """LFU O(1) con buckets por frecuencia (empates resueltos por LRU)"""
+    
+    policy = EvictionPolicy.LFU
+    
+    def __init__(self, capacity: int = 0):
+        self.key_freq: Dict[str, int] = {}
+        self.buckets: Dict[int, "OrderedDict[str, None]"] = {}
+        self.min_freq = 0
+    
+    def record_insert(self, key: str):
+        if key in self.key_freq:
+            self.record_access(key)
+            return
+        self.key_freq[key] = 1
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.min_freq = 1
+    
+    def record_access(self, key: str):
+        freq = self.key_freq.get(key)
+        if freq is None:
+            return
+        
+        bucket = self.buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[freq]
+            if self.min_freq == freq:
+                self.min_freq = freq + 1
+        
+        self.key_freq[key] = freq + 1
+        self.buckets.setdefault(freq + 1, OrderedDict())[key] = None
+    
+    def remove(self, key: str):
+        freq = self.key_freq.pop(key, None)
+        if freq is None:
+            return
+        
+        bucket = self.buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[freq]
+            if self.min_freq == freq:
+                # Se recalcula de forma perezosa; la siguiente inserción lo fija en 1
+                self.min_freq = 0
+    
+    def select_victim(self) -> Optional[str]:
+        if self.min_freq not in self.buckets:
+            if not self.buckets:
+                return None
+            self.min_freq = min(self.buckets)
+        return next(iter(self.buckets[self.min_freq]))
+    
+    def clear(self):
+        self.key_freq.clear()
+        self.buckets.clear()
+        self.min_freq = 0
+    
+    def __len__(self) -> int:
+        return len(self.key_freq)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.key_freq
+
+class WTinyLFUEngine(L1EvictionEngine):
+    """W-TinyLFU: ventana LRU pequeña + SLRU principal con admisión por sketch
+    
+    Las claves nuevas entran en la ventana. Mientras la región principal
+    (probation + protected) tenga lugar, lo que desborda la ventana pasa a
+    probation sin competir. Con la principal llena, el candidato LRU de la
+    ventana compite con la víctima de probation y solo es admitido si su
+    frecuencia estimada es mayor.
+    """
+    
+    policy = EvictionPolicy.W_TINYLFU
+    
+    def __init__(self, capacity: int, window_ratio: float = 0.01,
+                 protected_ratio: float = 0.8):
+        self.capacity = max(1, capacity)
+        self.window_capacity = max(1, int(self.capacity * window_ratio))
+        self.main_capacity = max(1, self.capacity - self.window_capacity)
+        self.protected_capacity = max(1, int(self.main_capacity * protected_ratio))
+        
+        self.window: "OrderedDict[str, None]" = OrderedDict()
+        self.probation: "OrderedDict[str, None]" = OrderedDict()
+        self.protected: "OrderedDict[str, None]" = OrderedDict()
+        self.sketch = FrequencySketch(width=self.capacity)
+    
+    def record_insert(self, key: str):
+        self.sketch.increment(key)
+        if key in self:
+            self._touch(key)
+            return
+        self.window[key] = None
+        self._drain_window()
+    
+    def record_access(self, key: str):
+        self.sketch.increment(key)
+        self._touch(key)
+    
+    def _touch(self, key: str):
+        if key in self.window:
+            self.window.move_to_end(key)
+        elif key in self.probation:
+            # Promover a protected y degradar el LRU de protected si se llena
+            del self.probation[key]
+            self.protected[key] = None
+            if len(self.protected) > self.protected_capacity:
+                demoted, _ = self.protected.popitem(last=False)
+                self.probation[demoted] = None
+        elif key in self.protected:
+            self.protected.move_to_end(key)
+    
+    def remove(self, key: str):
+        if key in self.window:
+            del self.window[key]
+        elif key in self.probation:
+            del self.probation[key]
+        else:
+            self.protected.pop(key, None)
+    
+    def _drain_window(self):
+        """Pasar a probation el desborde de la ventana mientras la principal tenga lugar"""
+        while (len(self.window) > self.window_capacity
+               and len(self.probation) + len(self.protected) < self.main_capacity):
+            key, _ = self.window.popitem(last=False)
+            self.probation[key] = None
+    
+    def select_victim(self) -> Optional[str]:
+        self._drain_window()  # Una expulsión anterior pudo dejar lugar en la principal
+        main_victim = self._main_victim()
+        candidate = next(iter(self.window), None)
+        if main_victim is None:
+            return candidate
+        if candidate is None or len(self.window) <= self.window_capacity:
+            return main_victim
+        
+        # Admisión: el candidato de la ventana pasa a prueba si es más frecuente
+        if self.sketch.estimate(candidate) > self.sketch.estimate(main_victim):
+            del self.window[candidate]
+            self.probation[candidate] = None
+            return main_victim
+        return candidate
+    
+    def _main_victim(self) -> Optional[str]:
+        if self.probation:
+            return next(iter(self.probation))
+        if self.protected:
+            return next(iter(self.protected))
+        return None
+    
+    def clear(self):
+        self.window.clear()
+        self.probation.clear()
+        self.protected.clear()
+        self.sketch.clear()
+    
+    def __len__(self) -> int:
+        return len(self.window) + len(self.probation) + len(self.protected)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.window or key in self.probation or key in self.protected
+
+def create_eviction_engine(policy: EvictionPolicy, capacity: int) -> L1EvictionEngine:
+    """Crear motor de expulsión para la política indicada"""
+    if policy == EvictionPolicy.LRU:
+        return LRUEngine(capacity)
+    if policy == EvictionPolicy.LFU:
+        return LFUEngine(capacity)
+    if policy == EvictionPolicy.W_TINYLFU:
+        return WTinyLFUEngine(capacity)
+    raise ValueError(f"Unsupported eviction policy: {policy}")
+
+class PromotionPolicy(Enum):
+    ALWAYS = "always"  # Toda lectura de L2/L3 sube a L1
+    N_HITS = "n-hits"  # Sube tras N lecturas dentro de una ventana
+    SKETCH = "sketch"  # Sube si la frecuencia estimada por el sketch alcanza el umbral
+
+class PromotionGate:
+    """Admisión a L1 para entradas leídas desde L2/L3
+    
+    Evita que lecturas únicas desplacen del L1 a claves que sí se repiten.
+    """
+    
+    def __init__(self, policy: PromotionPolicy = PromotionPolicy.N_HITS,
+                 min_hits: int = 2, window_seconds: float = 60.0,
+                 max_tracked: int = 100000):
+        self.policy = PromotionPolicy(policy)
+        self.min_hits = min_hits
+        self.window_seconds = window_seconds
+        self.max_tracked = max_tracked
+        
+        # clave -> (inicio de ventana, lecturas); acotado, se descartan las más viejas
+        self.hits: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self.sketch = FrequencySketch(width=max_tracked) if self.policy == PromotionPolicy.SKETCH else None
+        
+        self.promoted = 0
+        self.rejected = 0
+    
+    def should_promote(self, key: str) -> bool:
+        """Registrar una lectura remota y decidir si la entrada sube a L1"""
+        if self.policy == PromotionPolicy.ALWAYS:
+            admitted = True
+        elif self.policy == PromotionPolicy.SKETCH:
+            self.sketch.increment(key)
+            admitted = self.sketch.estimate(key) >= self.min_hits
+        else:
+            admitted = self._count_hit(key)
+        
+        if admitted:
+            self.promoted += 1
+        else:
+            self.rejected += 1
+        return admitted
+    
+    def _count_hit(self, key: str) -> bool:
+        now = time.time()
+        window_start, count = self.hits.pop(key, (now, 0))
+        if now - window_start > self.window_seconds:
+            window_start, count = now, 0
+        count += 1
+        
+        if count >= self.min_hits:
+            return True
+        
+        self.hits[key] = (window_start, count)
+        while len(self.hits) > self.max_tracked:
+            self.hits.popitem(last=False)
+        return False
+    
+    def clear(self):
+        self.hits.clear()
+        if self.sketch:
+            self.sketch.clear()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Hot Key Detection for RobertAI
+Top-K de claves más leídas en streaming (count-min sketch + heap)
+"""
+
+import heapq
+import random
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+class CountMinSketch:
+    """Count-min sketch con contadores de 32 bits y decaimiento por mitades"""
+    
+    def __init__(self, width: int = 4096, depth: int = 4):
+        # Ancho potencia de 2 para indexar con máscara
+        self.width = 1 << max(4, (width - 1).bit_length())
+        self.depth = depth
+        self.mask = self.width - 1
+        self.rows = [array("I", bytes(4 * self.width)) for _ in range(depth)]
+        self.seeds = [random.getrandbits(32) | 1 for _ in range(depth)]
+    
+    def _indexes(self, key: str):
+        h = hash(key)
+        return [((h ^ seed) * 0x9E3779B1 >> 7) & self.mask for seed in self.seeds]
+    
+    def add(self, key: str, count: int = 1) -> int:
+        """Sumar y devolver la frecuencia estimada (conservative update)"""
+        indexes = self._indexes(key)
+        estimate = min(row[i] for row, i in zip(self.rows, indexes)) + count
+        for row, i in zip(self.rows, indexes):
+            if row[i] < estimate:
+                row[i] = min(estimate, 0xFFFFFFFF)
+        return estimate
+    
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in zip(self.rows, self._indexes(key)))
+    
+    def decay(self):
+        self.rows = [array("I", (c >> 1 for c in row)) for row in self.rows]
+    
+    def clear(self):
+        self.rows = [array("I", bytes(4 * self.width)) for _ in range(self.depth)]
+
+class HotKeyDetector:
+    """Detector de claves calientes: sketch para contar, min-heap para el top-K
+    
+    El heap guarda entradas (conteo, clave) con actualización perezosa; las
+    obsoletas se descartan al llegar a la cima. Los contadores se dividen a la
+    mitad cada decay_interval para que el top-K refleje tráfico reciente.
+    """
+    
+    def __init__(self,
+                 k: int = 32,
+                 min_count: int = 100,  # Lecturas mínimas (por ventana de decaimiento) para ser caliente
+                 decay_interval: float = 60.0,
+                 width: int = 4096,
+                 depth: int = 4):
+        
+        self.k = k
+        self.min_count = min_count
+        self.decay_interval = decay_interval
+        self.sketch = CountMinSketch(width, depth)
+        
+        self.top: Dict[str, int] = {}
+        self.heap: List[Tuple[int, str]] = []
+        self.last_decay = time.time()
+        self.total_records = 0
+        self.window_counts: Dict[str, int] = {}  # Lecturas del top-K desde el último drain
+    
+    def record(self, key: str) -> bool:
+        """Registrar una lectura; devuelve si la clave está en el top-K caliente"""
+        now = time.time()
+        if now - self.last_decay >= self.decay_interval:
+            self.decay()
+            self.last_decay = now
+        
+        self.total_records += 1
+        count = self.sketch.add(key)
+        
+        if key in self.top:
+            self.top[key] = count
+            heapq.heappush(self.heap, (count, key))
+        elif len(self.top) < self.k:
+            self.top[key] = count
+            heapq.heappush(self.heap, (count, key))
+        else:
+            min_count, min_key = self._peek_min()
+            if count > min_count:
+                heapq.heappop(self.heap)
+                del self.top[min_key]
+                self.top[key] = count
+                heapq.heappush(self.heap, (count, key))
+        
+        # Compactar entradas obsoletas para que el heap no crezca sin límite
+        if len(self.heap) > 4 * self.k + 64:
+            self.heap = [(c, k) for k, c in self.top.items()]
+            heapq.heapify(self.heap)
+        
+        if key in self.top:
+            self.window_counts[key] = self.window_counts.get(key, 0) + 1
+            return count >= self.min_count
+        return False
+    
+    def _peek_min(self) -> Tuple[int, str]:
+        while True:
+            count, key = self.heap[0]
+            if self.top.get(key) == count:
+                return count, key
+            heapq.heappop(self.heap)
+    
+    def is_hot(self, key: str) -> bool:
+        return self.top.get(key, 0) >= self.min_count
+    
+    def hot_keys(self) -> List[str]:
+        return [key for key, count in self.top.items() if count >= self.min_count]
+    
+    def top_k(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Top-K como (clave, lecturas estimadas) en orden descendente"""
+        ranked = sorted(self.top.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n] if n else ranked
+    
+    def drain_window_counts(self) -> Dict[str, int]:
+        """Lecturas de claves del top-K desde la última llamada (para agregarlas entre nodos)"""
+        counts, self.window_counts = self.window_counts, {}
+        return counts
+    
+    def decay(self):
+        """Dividir conteos a la mitad (olvido exponencial)"""
+        self.sketch.decay()
+        self.top = {key: count >> 1 for key, count in self.top.items() if count >> 1}
+        self.heap = [(count, key) for key, count in self.top.items()]
+        heapq.heapify(self.heap)
+    
+    def clear(self):
+        self.sketch.clear()
+        self.top.clear()
+        self.heap.clear()
+        self.window_counts.clear()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Cache Instrumentation for RobertAI
+Histogramas de latencia por nivel y namespace, bytes por nivel, expulsiones y promociones
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+# Log-lineal: 16 sub-buckets por potencia de 2 (error relativo < 6.25%), en microsegundos
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_SHIFT = 32  # Hasta ~2^36 µs (19 h); lo mayor cae en el último bucket
+
+# Razones de salida de L1
+EVICTION_CAPACITY = "capacity"
+EVICTION_NAMESPACE_QUOTA = "namespace_quota"
+EVICTION_EXPIRED = "expired"
+EVICTION_REPLACED = "replaced"
+EVICTION_INVALIDATED = "invalidated"
+
+class LatencyHistogram:
+    """Histograma log-lineal de latencias (estilo HDR) con buckets fijos
+    
+    Registrar es O(1) y sin asignaciones; los percentiles se calculan al
+    leer recorriendo los buckets.
+    """
+    
+    def __init__(self):
+        self.counts = [0] * ((MAX_SHIFT + 2) * SUB_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    @staticmethod
+    def _index(micros: int) -> int:
+        shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+        if shift <= 0:
+            return micros
+        if shift > MAX_SHIFT:
+            return (MAX_SHIFT + 2) * SUB_BUCKETS - 1
+        return shift * SUB_BUCKETS + (micros >> shift)
+    
+    @staticmethod
+    def _upper_bound(index: int) -> int:
+        """Límite superior (exclusivo) del bucket en microsegundos"""
+        shift = max(0, index // SUB_BUCKETS - 1)
+        return (index - shift * SUB_BUCKETS + 1) << shift
+    
+    def record(self, seconds: float):
+        self.counts[self._index(int(seconds * 1_000_000))] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def percentile(self, pct: float) -> float:
+        """Percentil (0-100) en segundos; cota superior del bucket, acotada al máximo visto"""
+        if not self.count:
+            return 0.0
+        target = max(1, int(self.count * pct / 100 + 0.5))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            if seen >= target:
+                return min(self._upper_bound(index) / 1_000_000, self.max)
+        return self.max
+    
+    def merge(self, other: "LatencyHistogram"):
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+    
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def get_stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p90_ms": self.percentile(90) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "p999_ms": self.percentile(99.9) * 1000,
+            "max_ms": self.max * 1000
+        }
+
+class CacheInstrumentation:
+    """Contadores en memoria del camino caliente del cache
+    
+    Nada se escribe en Redis por operación: el monitor lee get_stats() en
+    cada ciclo de recolección.
+    """
+    
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str], LatencyHistogram] = {}  # (nivel, namespace)
+        self.bytes_read: Dict[str, int] = defaultdict(int)  # Por nivel
+        self.bytes_written: Dict[str, int] = defaultdict(int)
+        self.evictions: Dict[Tuple[str, str], int] = defaultdict(int)  # (razón, namespace)
+        self.promotions: Dict[Tuple[str, str], int] = defaultdict(int)  # (desde, hacia)
+    
+    def record_latency(self, level: str, namespace: str, seconds: float):
+        histogram = self.latency.get((level, namespace))
+        if histogram is None:
+            histogram = self.latency[(level, namespace)] = LatencyHistogram()
+        histogram.record(seconds)
+    
+    def record_read(self, level: str, num_bytes: int):
+        self.bytes_read[level] += num_bytes
+    
+    def record_write(self, level: str, num_bytes: int):
+        self.bytes_written[level] += num_bytes
+    
+    def record_eviction(self, reason: str, namespace: str):
+        self.evictions[(reason, namespace)] += 1
+    
+    def record_promotion(self, source: str, target: str, count: int = 1):
+        self.promotions[(source, target)] += count
+    
+    def level_latency(self, level: str) -> Optional[LatencyHistogram]:
+        """Histograma de un nivel sumando todos sus namespaces"""
+        merged = None
+        for (histogram_level, _), histogram in self.latency.items():
+            if histogram_level == level:
+                merged = merged or LatencyHistogram()
+                merged.merge(histogram)
+        return merged
+    
+    def reset(self):
+        self.latency.clear()
+        self.bytes_read.clear()
+        self.bytes_written.clear()
+        self.evictions.clear()
+        self.promotions.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        latency: Dict[str, Dict[str, dict]] = {}
+        for (level, namespace), histogram in sorted(self.latency.items()):
+            latency.setdefault(level, {})[namespace] = histogram.get_stats()
+        for level in latency:
+            latency[level]["*"] = self.level_latency(level).get_stats()
+        
+        evictions: Dict[str, Dict[str, int]] = {}
+        for (reason, namespace), count in sorted(self.evictions.items()):
+            evictions.setdefault(reason, {})[namespace] = count
+        
+        return {
+            "latency": latency,
+            "bytes": {
+                level: {"read": self.bytes_read.get(level, 0), "written": self.bytes_written.get(level, 0)}
+                for level in sorted(set(self.bytes_read) | set(self.bytes_written))
+            },
+            "evictions": evictions,
+            "promotions": {f"{source}_to_{target}": count for (source, target), count in sorted(self.promotions.items())}
+        }
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Cache Invalidation Bus for RobertAI
+Coherencia del L1 entre nodos mediante invalidaciones agrupadas por Redis pub/sub
+"""
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, List, Optional, Set
+
+import msgpack
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class InvalidationStats:
+    """Métricas del bus de invalidación"""
+    published_messages: int = 0
+    published_keys: int = 0
+    coalesced_keys: int = 0
+    received_messages: int = 0
+    received_keys: int = 0
+
+class InvalidationBus:
+    """Bus de invalidación de L1 sobre Redis pub/sub
+    
+    Las claves invalidadas se acumulan en un set (las repetidas se coalescen)
+    y se publican en un solo mensaje por lote, por tamaño o por tiempo.
+    Cada nodo ignora sus propios mensajes.
+    """
+    
+    def __init__(self,
+                 redis_client,
+                 on_invalidate: Callable[[List[str]], Awaitable[None]],
+                 channel: str = "robertai:cache:invalidate",
+                 node_id: Optional[str] = None,
+                 flush_interval: float = 0.01,  # 10ms de ventana para agrupar
+                 max_batch_size: int = 500):
+        
+        self.redis_client = redis_client
+        self.on_invalidate = on_invalidate
+        self.channel = channel
+        self.node_id = node_id or uuid.uuid4().hex
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        
+        self.pending_keys: Set[str] = set()
+        self.flush_event = asyncio.Event()
+        self.stats = InvalidationStats()
+        
+        self.pubsub = None
+        self.listener_task: Optional[asyncio.Task] = None
+        self.flush_task: Optional[asyncio.Task] = None
+        self.running = False
+    
+    async def start(self):
+        """Suscribirse al canal e iniciar las tareas de envío y recepción"""
+        if self.running:
+            return
+        
+        self.pubsub = self.redis_client.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        
+        self.running = True
+        self.listener_task = asyncio.create_task(self._listener_loop())
+        self.flush_task = asyncio.create_task(self._flush_loop())
+        
+        logger.info(f"Invalidation bus started on {self.channel} (node {self.node_id})")
+    
+    async def stop(self):
+        """Publicar invalidaciones pendientes y cerrar la suscripción"""
+        if not self.running:
+            return
+        
+        self.running = False
+        for task in (self.listener_task, self.flush_task):
+            if task:
+                task.cancel()
+        await asyncio.gather(
+            *[t for t in (self.listener_task, self.flush_task) if t],
+            return_exceptions=True
+        )
+        
+        await self.flush()
+        
+        try:
+            await self.pubsub.unsubscribe(self.channel)
+            await self.pubsub.close()
+        except Exception as e:
+            logger.warning(f"Error closing invalidation pubsub: {e}")
+        
+        logger.info("Invalidation bus stopped")
+    
+    def publish(self, keys: Iterable[str]):
+        """Encolar claves para invalidar en los demás nodos"""
+        for key in keys:
+            if key in self.pending_keys:
+                self.stats.coalesced_keys += 1
+            else:
+                self.pending_keys.add(key)
+        
+        if self.pending_keys:
+            self.flush_event.set()
+    
+    async def flush(self):
+        """Publicar las claves pendientes en lotes de max_batch_size"""
+        if not self.pending_keys:
+            return
+        
+        keys = list(self.pending_keys)
+        self.pending_keys.clear()
+        
+        for i in range(0, len(keys), self.max_batch_size):
+            batch = keys[i:i + self.max_batch_size]
+            try:
+                message = msgpack.packb({"node": self.node_id, "keys": batch})
+                await self.redis_client.publish(self.channel, message)
+                self.stats.published_messages += 1
+                self.stats.published_keys += len(batch)
+            except Exception as e:
+                logger.warning(f"Error publishing {len(batch)} invalidations: {e}")
+    
+    async def _flush_loop(self):
+        """Agrupar invalidaciones durante flush_interval antes de publicar"""
+        while self.running:
+            try:
+                await self.flush_event.wait()
+                if len(self.pending_keys) < self.max_batch_size:
+                    await asyncio.sleep(self.flush_interval)
+                self.flush_event.clear()
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in invalidation flush loop: {e}")
+    
+    async def _listener_loop(self):
+        """Recibir invalidaciones de otros nodos y aplicarlas al L1 local"""
+        while self.running:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message or message.get("type") != "message":
+                    continue
+                
+                payload = msgpack.unpackb(message["data"])
+                if payload.get("node") == self.node_id:
+                    continue
+                
+                keys = payload.get("keys", [])
+                self.stats.received_messages += 1
+                self.stats.received_keys += len(keys)
+                await self.on_invalidate(keys)
+            
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in invalidation listener: {e}")
+                await asyncio.sleep(1)
+    
+    def get_stats(self) -> dict:
+        """Estadísticas del bus"""
+        return {
+            "node_id": self.node_id,
+            "channel": self.channel,
+            "pending_keys": len(self.pending_keys),
+            "published_messages": self.stats.published_messages,
+            "published_keys": self.stats.published_keys,
+            "coalesced_keys": self.stats.coalesced_keys,
+            "received_messages": self.stats.received_messages,
+            "received_keys": self.stats.received_keys
+        }
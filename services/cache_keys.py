@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Cache Key Builder for RobertAI
+Hash estructural canónico de argumentos y contextos para derivar claves de cache
+"""
+
+import dataclasses
+import hashlib
+import inspect
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+import msgpack
+
+try:
+    import xxhash
+except ImportError:  # xxhash es opcional; blake2b corto como respaldo
+    xxhash = None
+
+# Todos los nodos deben usar el mismo algoritmo o no compartirán claves
+HASH_ALGORITHM = "xxh3_64" if xxhash is not None else "blake2b64"
+
+_SCALAR_TYPES = frozenset((str, bytes, int, float, bool, type(None)))
+
+# Tipos de extensión de msgpack para valores sin representación nativa
+EXT_SET = 1
+EXT_ENUM = 2
+EXT_DATETIME = 3
+EXT_TEXT = 4  # Decimal, UUID
+EXT_OBJECT = 5
+EXT_REPR = 6
+
+def _digest(data: bytes) -> str:
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+def _qualified(obj: Any) -> bytes:
+    return type(obj).__qualname__.encode() + b":"
+
+def _default(obj: Any) -> msgpack.ExtType:
+    """Representación canónica de lo que msgpack no serializa de forma nativa"""
+    if isinstance(obj, (set, frozenset)):
+        # Orden por bytes serializados: independiente del hash aleatorio de str
+        return msgpack.ExtType(EXT_SET, b"".join(sorted(canonical_bytes(item) for item in obj)))
+    if isinstance(obj, Enum):
+        return msgpack.ExtType(EXT_ENUM, _qualified(obj) + canonical_bytes(obj.value))
+    if isinstance(obj, (datetime, date)):
+        return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, (Decimal, UUID)):
+        return msgpack.ExtType(EXT_TEXT, str(obj).encode())
+    if dataclasses.is_dataclass(obj):
+        fields = {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+        return msgpack.ExtType(EXT_OBJECT, _qualified(obj) + canonical_bytes(fields))
+    if inspect.isroutine(obj) or inspect.isclass(obj):
+        # Funciones y clases por nombre: sus __dict__ suelen estar vacíos y colisionarían
+        name = f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}"
+        return msgpack.ExtType(EXT_REPR, name.encode())
+    if hasattr(obj, "__dict__"):
+        # canonical_bytes ordena los atributos: no depende del orden en que se asignaron
+        return msgpack.ExtType(EXT_OBJECT, _qualified(obj) + canonical_bytes(vars(obj)))
+    return msgpack.ExtType(EXT_REPR, _qualified(obj) + repr(obj).encode())
+
+@lru_cache(maxsize=4096)
+def _str_key_bytes(key: str) -> bytes:
+    # Las claves de texto se repiten entre dicts ("role", "text"...): se serializan una vez
+    return msgpack.packb(key, use_bin_type=True)
+
+@lru_cache(maxsize=4096)
+def _str_key_order(keys: Tuple[Any, ...]) -> Optional[Tuple[str, ...]]:
+    """Orden canónico de un juego de claves de texto (los dicts de una lista suelen repetirlo)
+    
+    None si hay claves de otro tipo: 1 y True son iguales como clave de la memo.
+    """
+    if not all(type(key) is str for key in keys):
+        return None
+    return tuple(sorted(keys, key=_str_key_bytes))
+
+def _key_order(item: Tuple[Any, Any]) -> bytes:
+    key = item[0]
+    if type(key) is str:
+        return _str_key_bytes(key)
+    return canonical_bytes(key)
+
+def _sort_dicts(obj: Any) -> Any:
+    """Copia con los dicts (a cualquier profundidad) ordenados por clave serializada
+    
+    msgpack recorre los dicts en orden de inserción; {"a": 1, "b": 2} y
+    {"b": 2, "a": 1} tienen que dar los mismos bytes. Mismo orden que los sets.
+    """
+    if isinstance(obj, dict):
+        order = _str_key_order(tuple(obj)) if 1 < len(obj) <= 64 else None
+        # Caso común (claves de texto, valores escalares): sin recorrido en Python
+        if order is not None and _SCALAR_TYPES.issuperset(map(type, obj.values())):
+            return dict(zip(order, map(obj.__getitem__, order)))
+        if order is not None:
+            items = ((key, obj[key]) for key in order)
+        elif len(obj) > 1:
+            items = sorted(obj.items(), key=_key_order)
+        else:
+            items = obj.items()
+        return {key: value if type(value) in _SCALAR_TYPES else _sort_dicts(value) for key, value in items}
+    if isinstance(obj, (list, tuple)):
+        if _SCALAR_TYPES.issuperset(map(type, obj)):
+            return obj
+        return [item if type(item) in _SCALAR_TYPES else _sort_dicts(item) for item in obj]
+    return obj
+
+def canonical_bytes(obj: Any) -> bytes:
+    """Serialización estructural para hashear (msgpack en C, con tipos extra canonizados)
+    
+    Sets, enums, fechas y objetos tienen forma canónica y los dicts se
+    ordenan por clave a cualquier profundidad.
+    """
+    return msgpack.packb(_sort_dicts(obj), default=_default, use_bin_type=True, datetime=False)
+
+def stable_hash(obj: Any) -> str:
+    """Hash corto y estable entre procesos de un valor estructurado"""
+    return _digest(canonical_bytes(obj))
+
+@lru_cache(maxsize=4096)
+def _memoized_hash(typed_values: Tuple[Tuple[type, Any], ...]) -> str:
+    return stable_hash(tuple(value for _, value in typed_values))
+
+def memoized_hash(values: Tuple[Any, ...]) -> str:
+    """stable_hash memoizado para tuplas planas de escalares (contextos inmutables)
+    
+    La memo se indexa por (tipo, valor) para que 1, 1.0 y True no compartan hash.
+    """
+    if all(type(value) in _SCALAR_TYPES for value in values):
+        return _memoized_hash(tuple((type(value), value) for value in values))
+    return stable_hash(values)
+
+class FunctionKeyBuilder:
+    """Claves de cache para llamadas a una función
+    
+    Los argumentos se normalizan con la firma (posicionales, nombrados y
+    defaults dan la misma clave). Con template, la clave es legible y se arma
+    con los argumentos, p. ej. "user:{user_id}"; sin template, se hashean.
+    """
+    
+    def __init__(self, func: Callable, template: Optional[str] = None,
+                 ignore: Iterable[str] = (), prefix: str = "func"):
+        self.signature = inspect.signature(func)
+        self.prefix = f"{prefix}:{func.__qualname__}"
+        self.template = template
+        
+        # self/cls no forman parte de la clave: hashear la instancia es caro e inestable
+        parameters = list(self.signature.parameters.values())
+        self.ignore = set(ignore)
+        if parameters and parameters[0].name in ("self", "cls"):
+            self.ignore.add(parameters[0].name)
+        
+        # Camino rápido sin inspect.bind para firmas solo con parámetros posicionales/nombrados
+        self.simple = all(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) for p in parameters)
+        self.names = [p.name for p in parameters if p.name not in self.ignore]
+        self.positional = [p.name for p in parameters]
+        # Nombrados aceptados por el camino rápido -> posición (los solo posicionales no van)
+        self.keyword_index = {p.name: i for i, p in enumerate(parameters) if p.kind is p.POSITIONAL_OR_KEYWORD}
+        self.defaults = {p.name: p.default for p in parameters if p.default is not p.empty}
+    
+    def build(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+        # Nombres desconocidos o repetidos van por bind, que levanta el TypeError de la llamada
+        if (self.simple and len(args) <= len(self.positional)
+                and all(self.keyword_index.get(name, -1) >= len(args) for name in kwargs)):
+            values = dict(self.defaults)
+            values.update(zip(self.positional, args))
+            values.update(kwargs)
+            try:
+                arguments = {name: values[name] for name in self.names}
+            except KeyError as e:
+                raise TypeError(f"missing required argument {e}") from None
+        else:
+            bound = self.signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {name: value for name, value in bound.arguments.items() if name not in self.ignore}
+        
+        if self.template is not None:
+            return f"{self.prefix}:{self.template.format(**arguments)}"
+        return f"{self.prefix}:{stable_hash(arguments)}"
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+L1 Memory Governor for RobertAI
+Estimación de tamaño profundo y cuotas de memoria por namespace para el L1
+"""
+
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import psutil
+except ImportError:  # psutil es opcional; se usa /proc como respaldo
+    psutil = None
+
+# Fracción del presupuesto de L1 para cada namespace (prefijo de la clave)
+DEFAULT_NAMESPACE_QUOTAS: Dict[str, float] = {
+    "conversation": 0.30,
+    "ai_response": 0.35,
+    "user_profile": 0.15,
+    "func": 0.10,
+    "common_response": 0.05
+}
+OTHER_NAMESPACE = "other"
+MIN_OTHER_QUOTA = 0.05
+
+# Overhead aproximado por entrada: CacheEntry, su __dict__ y los slots en índices
+ENTRY_OVERHEAD_BYTES = 400
+
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, bool, complex, type(None))
+
+def deep_sizeof(obj: Any) -> int:
+    """Tamaño en memoria de un objeto y todo lo que referencia (sin contar compartidos dos veces)"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        
+        if isinstance(current, _ATOMIC_TYPES):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            attributes = getattr(current, "__dict__", None)
+            if attributes is not None:
+                stack.append(attributes)
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    
+    return total
+
+def process_rss_bytes() -> Optional[int]:
+    """RSS actual del proceso"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+@dataclass
+class NamespaceUsage:
+    """Consumo de L1 de un namespace"""
+    quota_bytes: int
+    accounted_bytes: int = 0
+    entries: int = 0
+    quota_evictions: int = 0
+    rejected_oversize: int = 0
+
+class MemoryGovernor:
+    """Cuotas de bytes por namespace para el L1
+    
+    Cada namespace tiene un tope propio además del presupuesto global; las
+    claves con prefijos no configurados comparten el namespace "other".
+    """
+    
+    def __init__(self, total_budget: int, quotas: Optional[Dict[str, float]] = None):
+        quotas = dict(DEFAULT_NAMESPACE_QUOTAS if quotas is None else quotas)
+        if OTHER_NAMESPACE not in quotas:
+            quotas[OTHER_NAMESPACE] = max(1.0 - sum(quotas.values()), MIN_OTHER_QUOTA)
+        
+        self.total_budget = total_budget
+        self.namespaces: Dict[str, NamespaceUsage] = {
+            namespace: NamespaceUsage(quota_bytes=int(total_budget * fraction))
+            for namespace, fraction in quotas.items()
+        }
+    
+    def namespace_of(self, key: str) -> str:
+        namespace = key.split(":", 1)[0]
+        return namespace if namespace in self.namespaces else OTHER_NAMESPACE
+    
+    def estimate_entry_size(self, key: str, value: Any) -> int:
+        """Bytes que ocupa una entrada de L1 (valor, clave y estructura)"""
+        return deep_sizeof(value) + sys.getsizeof(key) + ENTRY_OVERHEAD_BYTES
+    
+    def fits(self, namespace: str, size_bytes: int) -> bool:
+        """Si una entrada de este tamaño cabe en la cuota del namespace"""
+        return size_bytes <= self.namespaces[namespace].quota_bytes
+    
+    def over_quota(self, namespace: str, incoming_bytes: int = 0) -> bool:
+        usage = self.namespaces[namespace]
+        return usage.accounted_bytes + incoming_bytes > usage.quota_bytes
+    
+    def charge(self, namespace: str, size_bytes: int):
+        usage = self.namespaces[namespace]
+        usage.accounted_bytes += size_bytes
+        usage.entries += 1
+    
+    def release(self, namespace: str, size_bytes: int):
+        usage = self.namespaces[namespace]
+        usage.accounted_bytes -= size_bytes
+        usage.entries -= 1
+    
+    def most_over_quota(self, candidates: Iterable[str]) -> Optional[str]:
+        """Namespace con mayor uso relativo a su cuota (víctima para la expulsión global)"""
+        best = None
+        best_ratio = -1.0
+        for namespace in candidates:
+            usage = self.namespaces[namespace]
+            if usage.entries == 0:
+                continue
+            ratio = usage.accounted_bytes / max(usage.quota_bytes, 1)
+            if ratio > best_ratio:
+                best, best_ratio = namespace, ratio
+        return best
+    
+    def clear(self):
+        for usage in self.namespaces.values():
+            usage.accounted_bytes = 0
+            usage.entries = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Bytes contabilizados por namespace frente al RSS del proceso"""
+        accounted = sum(usage.accounted_bytes for usage in self.namespaces.values())
+        rss = process_rss_bytes()
+        return {
+            "process_rss_bytes": rss,
+            "accounted_bytes": accounted,
+            "accounted_to_rss_ratio": accounted / rss if rss else None,
+            "total_budget_bytes": self.total_budget,
+            "namespaces": {
+                namespace: {
+                    "accounted_bytes": usage.accounted_bytes,
+                    "quota_bytes": usage.quota_bytes,
+                    "quota_utilization": usage.accounted_bytes / usage.quota_bytes if usage.quota_bytes else 0.0,
+                    "share_of_rss": usage.accounted_bytes / rss if rss else None,
+                    "entries": usage.entries,
+                    "quota_evictions": usage.quota_evictions,
+                    "rejected_oversize": usage.rejected_oversize
+                }
+                for namespace, usage in self.namespaces.items()
+            }
+        }
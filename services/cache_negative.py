@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Negative Cache for RobertAI
+Tombstones de misses confirmados y filtros de Bloom de claves conocidas por namespace
+"""
+
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class BloomFilter:
+    """Filtro de Bloom de claves existentes
+    
+    Si dice que una clave no está, seguro no se escribió; si dice que está,
+    puede ser un falso positivo (se consulta L2/L3 igual). El orden de bits es
+    el de los bitmaps de Redis (bit 0 = bit más alto del byte 0), así el filtro
+    se puede combinar con BITOP OR entre nodos.
+    """
+    
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.added = 0
+        self.dirty = False  # Bits nuevos sin sincronizar
+    
+    def _positions(self, key: str):
+        # Hashing doble sobre blake2b: estable entre procesos, a diferencia de hash()
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 0x80 >> (position & 7)
+        self.added += 1
+        self.dirty = True
+    
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (0x80 >> (position & 7)) for position in self._positions(key))
+    
+    def merge(self, data: Optional[bytes]):
+        """Sumar (OR) los bits de otro filtro del mismo tamaño"""
+        if not data:
+            return
+        data = bytes(data[:len(self.bits)]).ljust(len(self.bits), b"\0")
+        merged = int.from_bytes(self.bits, "big") | int.from_bytes(data, "big")
+        self.bits = bytearray(merged.to_bytes(len(self.bits), "big"))
+    
+    def fill_ratio(self) -> float:
+        set_bits = int.from_bytes(self.bits, "big").bit_count()
+        return set_bits / self.num_bits
+    
+    def estimated_false_positive_rate(self) -> float:
+        return self.fill_ratio() ** self.num_hashes
+    
+    def get_stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "bits": self.num_bits,
+            "hashes": self.num_hashes,
+            "added": self.added,
+            "fill_ratio": self.fill_ratio(),
+            "estimated_false_positive_rate": self.estimated_false_positive_rate()
+        }
+
+class NegativeCache:
+    """Tombstones de corta vida para claves que no están en ningún nivel
+    
+    Todas usan el mismo TTL, así el orden de inserción es el de vencimiento y
+    la limpieza solo mira el frente. Un set de la clave borra su tombstone y
+    también anula las búsquedas en curso, para que un miss que empezó antes
+    del set no deje un tombstone sobre un valor que ya existe.
+    """
+    
+    def __init__(self, ttl: float = 30.0, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.tombstones: "OrderedDict[str, float]" = OrderedDict()  # clave -> vence en
+        self.probing: Dict[str, int] = {}  # Búsquedas remotas en curso por clave
+        
+        self.hits = 0
+        self.added = 0
+        self.cleared = 0
+        self.evicted = 0
+    
+    def add(self, key: str):
+        self.tombstones[key] = time.time() + self.ttl
+        self.tombstones.move_to_end(key)
+        self.added += 1
+        while len(self.tombstones) > self.max_entries:
+            self.tombstones.popitem(last=False)
+            self.evicted += 1
+    
+    def begin(self, key: str):
+        """Marcar el inicio de una búsqueda en L2/L3"""
+        self.probing[key] = self.probing.get(key, 0) + 1
+    
+    def finish(self, key: str, missed: bool):
+        """Cerrar la búsqueda; deja tombstone si fue un miss y nadie escribió la clave mientras tanto"""
+        count = self.probing.get(key)
+        if count is None:
+            return
+        if count > 1:
+            self.probing[key] = count - 1
+        else:
+            del self.probing[key]
+        if missed:
+            self.add(key)
+    
+    def abort(self, key: str):
+        """Cerrar la búsqueda sin tombstone (el miss no está confirmado)"""
+        self.finish(key, missed=False)
+    
+    def contains(self, key: str) -> bool:
+        expires_at = self.tombstones.get(key)
+        if expires_at is None:
+            return False
+        if time.time() >= expires_at:
+            del self.tombstones[key]
+            return False
+        self.hits += 1
+        return True
+    
+    def discard(self, key: str) -> bool:
+        self.probing.pop(key, None)
+        if self.tombstones.pop(key, None) is not None:
+            self.cleared += 1
+            return True
+        return False
+    
+    def expire(self) -> int:
+        """Quitar tombstones vencidos del frente"""
+        now = time.time()
+        removed = 0
+        while self.tombstones:
+            key, expires_at = next(iter(self.tombstones.items()))
+            if expires_at > now:
+                break
+            del self.tombstones[key]
+            removed += 1
+        return removed
+    
+    def clear(self):
+        self.tombstones.clear()
+        self.probing.clear()
+    
+    def __len__(self) -> int:
+        return len(self.tombstones)
+    
+    def get_stats(self) -> dict:
+        return {
+            "tombstones": len(self.tombstones),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "added": self.added,
+            "cleared": self.cleared,
+            "evicted": self.evicted
+        }
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Query Normalization and Near-Duplicate Index for RobertAI
+Normalización de consultas en español y búsqueda aproximada con MinHash/LSH
+"""
+
+import random
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+# Stopwords frecuentes en español; se excluyen negaciones y palabras
+# interrogativas porque cambian el sentido de la consulta
+SPANISH_STOPWORDS = frozenset({
+    "a", "al", "algo", "ante", "con", "de", "del", "el", "en", "es", "esa", "ese",
+    "eso", "esta", "este", "esto", "la", "las", "le", "lo", "los", "me", "mi",
+    "mis", "para", "pero", "por", "porfa", "porfavor", "favor", "pues", "se",
+    "su", "sus", "te", "tu", "tus", "un", "una", "unas", "unos", "y", "ya",
+    "o", "oye", "bueno", "entonces"
+})
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_REPEATED_CHAR_RE = re.compile(r"([^\W\d_])\1{2,}", re.UNICODE)
+
+def fold_accents(text: str) -> str:
+    """Quitar tildes y diéresis conservando la ñ"""
+    text = text.replace("ñ", "\x00").replace("Ñ", "\x01")
+    decomposed = unicodedata.normalize("NFKD", text)
+    folded = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return folded.replace("\x00", "ñ").replace("\x01", "Ñ")
+
+def normalize_query(text: str, remove_stopwords: bool = True) -> Optional[str]:
+    """Normalizar consulta de usuario para usarla como clave de cache
+    
+    "¡Hola!!", "hola " y "Holaaa 👋" producen la misma forma normalizada.
+    Devuelve None si no queda ninguna palabra ("👍", "?!"): no se cachea.
+    """
+    text = fold_accents(text.lower())
+    
+    # Puntuación y emojis (no son caracteres de palabra)
+    text = _PUNCTUATION_RE.sub(" ", text)
+    text = text.replace("_", " ")
+    
+    # Alargamientos típicos de chat: "holaaa" -> "hola"
+    text = _REPEATED_CHAR_RE.sub(r"\1", text)
+    
+    tokens = _WHITESPACE_RE.sub(" ", text).strip().split(" ")
+    tokens = [t for t in tokens if t]
+    if not tokens:
+        return None
+    
+    if remove_stopwords:
+        content_tokens = [t for t in tokens if t not in SPANISH_STOPWORDS]
+        # Si la consulta es solo stopwords ("a la"), conservarla tal cual
+        if content_tokens:
+            tokens = content_tokens
+    
+    return " ".join(tokens)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+class MinHashLSHIndex:
+    """Índice de casi-duplicados con MinHash sobre shingles de caracteres
+    
+    Las firmas se dividen en bandas; dos textos son candidatos si coinciden en
+    al menos una banda. La similitud Jaccard estimada decide el match final.
+    El índice vive en memoria y se limita a max_entries (FIFO).
+    """
+    
+    def __init__(self,
+                 num_perm: int = 64,
+                 bands: int = 16,
+                 shingle_size: int = 3,
+                 threshold: float = 0.85,
+                 max_entries: int = 50000,
+                 seed: int = 1):
+        
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+        
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.max_entries = max_entries
+        
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        
+        # (namespace, banda, hash de banda) -> claves
+        self.buckets: Dict[Tuple[str, int, int], Set[str]] = {}
+        # clave -> (namespace, firma)
+        self.signatures: "OrderedDict[str, Tuple[str, Tuple[int, ...]]]" = OrderedDict()
+    
+    def _shingles(self, text: str) -> Set[str]:
+        padded = f" {text} "
+        if len(padded) <= self.shingle_size:
+            return {padded}
+        return {padded[i:i + self.shingle_size] for i in range(len(padded) - self.shingle_size + 1)}
+    
+    def signature(self, text: str) -> Tuple[int, ...]:
+        """Firma MinHash del texto"""
+        hashed = [hash(s) & _MAX_HASH for s in self._shingles(text)]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashed) & _MAX_HASH
+            for a, b in self.permutations
+        )
+    
+    def _band_keys(self, namespace: str, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield (namespace, band, hash(signature[start:start + self.rows]))
+    
+    def add(self, key: str, text: str, namespace: str = ""):
+        """Indexar texto bajo la clave de cache dada"""
+        if key in self.signatures:
+            self.remove(key)
+        
+        signature = self.signature(text)
+        self.signatures[key] = (namespace, signature)
+        for band_key in self._band_keys(namespace, signature):
+            self.buckets.setdefault(band_key, set()).add(key)
+        
+        while len(self.signatures) > self.max_entries:
+            oldest_key = next(iter(self.signatures))
+            self.remove(oldest_key)
+    
+    def remove(self, key: str):
+        entry = self.signatures.pop(key, None)
+        if entry is None:
+            return
+        
+        namespace, signature = entry
+        for band_key in self._band_keys(namespace, signature):
+            bucket = self.buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+    
+    def query(self, text: str, namespace: str = "") -> Optional[Tuple[str, float]]:
+        """Clave más similar por encima del umbral, con su similitud estimada"""
+        signature = self.signature(text)
+        
+        candidates: Set[str] = set()
+        for band_key in self._band_keys(namespace, signature):
+            candidates.update(self.buckets.get(band_key, ()))
+        
+        best: Optional[Tuple[str, float]] = None
+        for candidate in candidates:
+            _, candidate_signature = self.signatures[candidate]
+            matches = sum(1 for x, y in zip(signature, candidate_signature) if x == y)
+            similarity = matches / self.num_perm
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        
+        return best
+    
+    def __len__(self) -> int:
+        return len(self.signatures)
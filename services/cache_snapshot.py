@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+L1 Snapshot for RobertAI
+Volcado compacto del L1 a disco y recarga mapeada en memoria para reinicios en caliente
+"""
+
+import mmap
+import os
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Tuple
+
+SNAPSHOT_MAGIC = b"RAIL1SNP"
+SNAPSHOT_VERSION = 1
+
+# Header: magic, versión, cantidad de registros, crc32 del cuerpo, escrito en
+SNAPSHOT_HEADER = struct.Struct("!8sIIId")
+# Registro: largo de la clave, largo del payload (payload del codec, con created_at y TTL)
+RECORD_HEADER = struct.Struct("!HI")
+
+class SnapshotError(Exception):
+    """Snapshot ilegible o corrupto"""
+
+def write_snapshot(path: str, records: Iterable[Tuple[str, bytes]]) -> Tuple[int, int]:
+    """Escribir registros (clave, payload) de forma atómica; devuelve (registros, bytes)"""
+    tmp_path = f"{path}.tmp"
+    count = 0
+    crc = 0
+    
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * SNAPSHOT_HEADER.size)  # Se completa al final
+        for key, payload in records:
+            key_bytes = key.encode()
+            chunk = RECORD_HEADER.pack(len(key_bytes), len(payload)) + key_bytes
+            f.write(chunk)
+            f.write(payload)
+            crc = zlib.crc32(payload, zlib.crc32(chunk, crc))
+            count += 1
+        
+        size = f.tell()
+        f.seek(0)
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, count, crc, time.time()))
+        f.flush()
+        os.fsync(f.fileno())
+    
+    os.replace(tmp_path, path)
+    return count, size
+
+@contextmanager
+def open_snapshot(path: str) -> Iterator[Tuple[float, List[Tuple[str, memoryview]]]]:
+    """Abrir snapshot con mmap; los payloads son vistas sin copiar válidas dentro del with"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < SNAPSHOT_HEADER.size:
+            raise SnapshotError("Snapshot file is truncated")
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            records: List[Tuple[str, memoryview]] = []
+            try:
+                magic, version, count, crc, written_at = SNAPSHOT_HEADER.unpack_from(mm, 0)
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    raise SnapshotError(f"Unsupported snapshot format in {path}")
+                if zlib.crc32(view[SNAPSHOT_HEADER.size:]) != crc:
+                    raise SnapshotError("Snapshot checksum mismatch")
+                
+                offset = SNAPSHOT_HEADER.size
+                for _ in range(count):
+                    key_len, payload_len = RECORD_HEADER.unpack_from(mm, offset)
+                    offset += RECORD_HEADER.size
+                    key = bytes(view[offset:offset + key_len]).decode()
+                    offset += key_len
+                    records.append((key, view[offset:offset + payload_len]))
+                    offset += payload_len
+                
+                yield written_at, records
+            finally:
+                for _, payload in records:
+                    payload.release()
+                view.release()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Buffer for RobertAI
+Escrituras diferidas a L2/L3 agrupadas en lotes y coalescidas por clave
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PendingWrite:
+    """Escritura pendiente de una clave hacia los niveles remotos"""
+    payload: bytes
+    ttl: int
+    to_l2: bool = True
+    to_l3: bool = False
+    tags: List[str] = field(default_factory=list)
+    enqueued_at: float = field(default_factory=time.time)
+
+@dataclass
+class WriteBehindStats:
+    """Métricas del buffer de write-behind"""
+    enqueued: int = 0
+    coalesced: int = 0
+    flushed: int = 0
+    flush_batches: int = 0
+    flush_errors: int = 0
+    inline_flushes: int = 0  # Flushes hechos por el llamador con el buffer lleno
+    rejected: int = 0  # Escrituras rechazadas: buffer lleno y Redis sin responder
+    dropped: int = 0
+    last_flush_lag: float = 0.0
+    max_flush_lag: float = 0.0
+    avg_flush_lag: float = 0.0
+
+def _merge_into(write: PendingWrite, previous: PendingWrite):
+    """Coalescer: el payload nuevo va a todos los niveles y tags de ambas escrituras"""
+    write.to_l2 = write.to_l2 or previous.to_l2
+    write.to_l3 = write.to_l3 or previous.to_l3
+    write.tags = list(dict.fromkeys([*previous.tags, *write.tags]))
+    write.enqueued_at = min(write.enqueued_at, previous.enqueued_at)
+
+class WriteBehindBuffer:
+    """Buffer acotado de escrituras diferidas
+    
+    Una escritura nueva sobre una clave pendiente reemplaza el payload pero
+    conserva su antigüedad y los niveles y tags de la anterior, así el lag
+    refleja el dato más viejo sin escribir y no se pierde ningún destino.
+    El loop vacía lotes por tamaño o por tiempo; si el buffer se llena, el
+    llamador vacía un lote antes de encolar (backpressure), y si ese flush
+    falla la escritura se rechaza en vez de crecer sin límite.
+    """
+    
+    def __init__(self,
+                 flush_func: Callable[[Dict[str, PendingWrite]], Awaitable[None]],
+                 max_pending: int = 10000,
+                 max_batch_size: int = 500,
+                 flush_interval: float = 0.05,  # 50ms de ventana para agrupar
+                 max_retry_delay: float = 5.0):
+        
+        self.flush_func = flush_func
+        self.max_pending = max_pending
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        
+        self.pending: "OrderedDict[str, PendingWrite]" = OrderedDict()
+        self.inflight: Dict[str, PendingWrite] = {}  # Lote que se está escribiendo
+        self.flush_event = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.stats = WriteBehindStats()
+        
+        self.flush_task: Optional[asyncio.Task] = None
+        self.running = False
+        self.retry_delay = 0.0
+    
+    async def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.flush_task = asyncio.create_task(self._flush_loop())
+        logger.info("Write-behind buffer started")
+    
+    async def stop(self, max_attempts: int = 3):
+        """Detener el loop y vaciar todo lo pendiente"""
+        if not self.running:
+            return
+        
+        self.running = False
+        if self.flush_task:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+        
+        attempts = 0
+        while self.pending and attempts < max_attempts:
+            if not await self.flush():
+                attempts += 1
+        
+        if self.pending:
+            self.stats.dropped += len(self.pending)
+            logger.error(f"Write-behind stopped with {len(self.pending)} unflushed writes")
+            self.pending.clear()
+        
+        logger.info("Write-behind buffer drained")
+    
+    async def put(self, key: str, write: PendingWrite) -> bool:
+        """Encolar escritura, coalesciendo con una pendiente de la misma clave
+        
+        False si el buffer está lleno y no se pudo vaciar (la escritura se descarta).
+        """
+        previous = self.pending.get(key)
+        if previous is not None:
+            _merge_into(write, previous)
+            self.stats.coalesced += 1
+        elif len(self.pending) >= self.max_pending:
+            self.stats.inline_flushes += 1
+            if not await self.flush() and len(self.pending) >= self.max_pending:
+                self.stats.rejected += 1
+                logger.warning(f"Write-behind buffer full and flush failing; rejected write for {key}")
+                return False
+            previous = self.pending.get(key)  # El flush pudo reencolar la misma clave
+            if previous is not None:
+                _merge_into(write, previous)
+        
+        self.pending[key] = write
+        self.stats.enqueued += 1
+        
+        self.flush_event.set()
+        return True
+    
+    def get(self, key: str) -> Optional[PendingWrite]:
+        """Escritura pendiente de la clave (lectura de lo propio antes del flush)"""
+        write = self.pending.get(key)
+        return write if write is not None else self.inflight.get(key)
+    
+    async def discard(self, keys) -> int:
+        """Descartar escrituras pendientes (p. ej. porque la clave se borró)
+        
+        Espera al lote en curso para que un borrado posterior no quede tapado
+        por una escritura vieja que termina después.
+        """
+        async with self.flush_lock:
+            removed = 0
+            for key in keys:
+                if self.pending.pop(key, None) is not None:
+                    removed += 1
+            return removed
+    
+    def keys_with_tag(self, tag: str) -> List[str]:
+        return [key for key, write in self.pending.items() if tag in write.tags]
+    
+    async def flush(self) -> bool:
+        """Escribir un lote; en error las escrituras vuelven al buffer"""
+        async with self.flush_lock:
+            if not self.pending:
+                return True
+            
+            batch: Dict[str, PendingWrite] = {}
+            while self.pending and len(batch) < self.max_batch_size:
+                key, write = self.pending.popitem(last=False)
+                batch[key] = write
+            
+            self.inflight = batch
+            try:
+                await self.flush_func(batch)
+            except Exception as e:
+                self.stats.flush_errors += 1
+                logger.warning(f"Write-behind flush of {len(batch)} keys failed: {e}")
+                # Reencolar; si llegó una escritura más nueva, gana su payload
+                # pero hereda los niveles y tags del lote fallido
+                for key, write in reversed(list(batch.items())):
+                    newer = self.pending.get(key)
+                    if newer is not None:
+                        _merge_into(newer, write)
+                    else:
+                        self.pending[key] = write
+                        self.pending.move_to_end(key, last=False)
+                return False
+            finally:
+                self.inflight = {}
+            
+            now = time.time()
+            lag = now - min(write.enqueued_at for write in batch.values())
+            self.stats.last_flush_lag = lag
+            self.stats.max_flush_lag = max(self.stats.max_flush_lag, lag)
+            self.stats.avg_flush_lag = lag if self.stats.flush_batches == 0 else (
+                self.stats.avg_flush_lag * 0.9 + lag * 0.1
+            )
+            self.stats.flushed += len(batch)
+            self.stats.flush_batches += 1
+            return True
+    
+    async def _flush_loop(self):
+        """Agrupar escrituras durante flush_interval antes de escribir"""
+        while self.running:
+            try:
+                await self.flush_event.wait()
+                if len(self.pending) < self.max_batch_size:
+                    await asyncio.sleep(self.flush_interval)
+                self.flush_event.clear()
+                
+                while self.pending and self.running:
+                    if await self.flush():
+                        self.retry_delay = 0.0
+                    else:
+                        # Backoff exponencial mientras Redis no responda
+                        self.retry_delay = min(max(self.retry_delay * 2, self.flush_interval), self.max_retry_delay)
+                        await asyncio.sleep(self.retry_delay)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in write-behind flush loop: {e}")
+    
+    def oldest_pending_age(self) -> float:
+        if not self.pending:
+            return 0.0
+        # Orden FIFO por primera escritura: la más vieja está al frente
+        return time.time() - next(iter(self.pending.values())).enqueued_at
+    
+    def get_stats(self) -> dict:
+        """Estadísticas del buffer"""
+        return {
+            "pending": len(self.pending),
+            "max_pending": self.max_pending,
+            "enqueued": self.stats.enqueued,
+            "coalesced": self.stats.coalesced,
+            "flushed": self.stats.flushed,
+            "flush_batches": self.stats.flush_batches,
+            "flush_errors": self.stats.flush_errors,
+            "inline_flushes": self.stats.inline_flushes,
+            "rejected": self.stats.rejected,
+            "dropped": self.stats.dropped,
+            "flush_lag_ms": self.stats.last_flush_lag * 1000,
+            "avg_flush_lag_ms": self.stats.avg_flush_lag * 1000,
+            "max_flush_lag_ms": self.stats.max_flush_lag * 1000,
+            "oldest_pending_age_ms": self.oldest_pending_age() * 1000
+        }
@@ -10,18 +10,51 @@ import hashlib
 import time
 import pickle
 import logging
-from typing import Dict, Any, Optional, List, Union, Tuple
+import inspect
+import os
+import uuid
+import math
+import random
+from typing import Dict, Any, Optional, List, Union, Tuple, Callable, Set
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
-import aioredis
 from redis.asyncio import Redis, RedisCluster
-import zlib
-import msgpack
+
+from cache_cluster import DEFAULT_CLUSTER_NODES, group_by_slot, shared_redis_clients, user_hash_tag, user_key
+from cache_codec import CacheCodec, CodecError
+from cache_disk_store import DiskLogStore
+from cache_eviction import (EvictionPolicy, L1EvictionEngine, PromotionGate, PromotionPolicy,
+                            create_eviction_engine)
+from cache_hotkeys import HotKeyDetector
+from cache_instrumentation import (EVICTION_CAPACITY, EVICTION_EXPIRED, EVICTION_INVALIDATED,
+                                   EVICTION_NAMESPACE_QUOTA, EVICTION_REPLACED, CacheInstrumentation)
+from cache_keys import FunctionKeyBuilder, memoized_hash, stable_hash
+from cache_invalidation import InvalidationBus
+from cache_memory import MemoryGovernor
+from cache_negative import BloomFilter, NegativeCache
+from cache_similarity import MinHashLSHIndex, normalize_query
+from cache_snapshot import SnapshotError, open_snapshot, write_snapshot
+from cache_write_behind import PendingWrite, WriteBehindBuffer
+from timing_wheel import HierarchicalTimingWheel
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Campo del contexto de conversación que se guarda como lista acotada en Redis
+CONTEXT_HISTORY_FIELD = "history"
+
+# Claves calientes con réplicas en L2, compartidas por todos los nodos (score = vencimiento de las copias)
+REPLICATED_KEYS_KEY = "robertai:hotkeys:replicated"
+
+# Compare-and-delete para liberar el lease de recomputación
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 class CacheLevel(Enum):
     L1_MEMORY = "L1"  # In-memory cache (fastest)
     L2_REDIS = "L2"   # Redis cache (fast)
@@ -38,6 +71,26 @@ class CacheMetrics:
     l3_hits: int = 0
     avg_response_time: float = 0.0
     cache_size_bytes: int = 0
+    computations: int = 0
+    coalesced_requests: int = 0
+    background_refreshes: int = 0
+    near_duplicate_hits: int = 0
+    hot_key_refreshes: int = 0
+    l1_insertions: int = 0
+    l1_evictions: int = 0
+    wasted_promotions: int = 0  # Promovidas a L1 que salieron sin ningún hit
+    expired_entries_reclaimed: int = 0
+    expired_bytes_reclaimed: int = 0
+    dead_byte_seconds: float = 0.0  # Σ bytes × tiempo retenidos tras expirar
+    max_expiry_lag: float = 0.0
+    context_writes: int = 0  # Escrituras de contexto por delta (campos o turnos)
+    context_bytes_written: int = 0
+    last_context_write_bytes: int = 0
+    context_full_writes: int = 0  # Reemplazos completos del contexto
+    context_full_bytes_written: int = 0
+    context_checkpoints: int = 0
+    negative_hits: int = 0  # Misses resueltos por un tombstone de L1
+    bloom_rejections: int = 0  # Misses resueltos por el filtro de Bloom
     
     @property
     def hit_rate(self) -> float:
@@ -56,13 +109,21 @@ class CacheEntry:
     ttl: int
     access_count: int = 0
     last_access: float = field(default_factory=time.time)
-    compressed: bool = False
     size_bytes: int = 0
+    soft_ttl: Optional[int] = None  # Pasado este TTL el valor se sirve como stale
+    delta: float = 0.0  # Tiempo que tomó computar el valor (XFetch)
+    promoted: bool = False  # Llegó a L1 por una lectura de L2/L3
     
     @property
     def is_expired(self) -> bool:
         return time.time() > (self.created_at + self.ttl)
     
+    @property
+    def is_stale(self) -> bool:
+        if self.soft_ttl is None:
+            return False
+        return time.time() > (self.created_at + self.soft_ttl)
+    
     @property
     def age_seconds(self) -> float:
         return time.time() - self.created_at
@@ -72,74 +133,224 @@ class CacheEntry:
         self.access_count += 1
         self.last_access = time.time()
 
+@dataclass
+class ComputeSpec:
+    """Cómo recomputar y guardar una clave del cache"""
+    compute_func: Callable
+    ttl: int
+    levels: Optional[List[CacheLevel]] = None
+    hard_ttl: Optional[int] = None
+    distributed: bool = False
+
 class MassiveCacheStrategy:
     """Sistema de cache masivo con múltiples niveles"""
     
     def __init__(self, 
                  redis_cluster_url: str = "redis://localhost:6379",
+                 cluster_nodes: Optional[List[str]] = None,  # "host:puerto" de Redis Cluster para L2
+                 redis_max_connections: int = 64,  # Tope del pool compartido (por nodo en cluster)
+                 redis_socket_timeout: float = 5.0,
                  max_memory_cache_size: int = 10000,  # Número máximo de entradas en memoria
                  max_memory_size_bytes: int = 100 * 1024 * 1024,  # 100MB max en memoria
                  compression_threshold: int = 1024,  # Comprimir si > 1KB
-                 default_ttl: int = 3600):  # 1 hora por defecto
+                 default_ttl: int = 3600,  # 1 hora por defecto
+                 eviction_policy: EvictionPolicy = EvictionPolicy.LRU,
+                 lease_ttl: float = 10.0,  # Lease distribuido para recomputar
+                 early_refresh_beta: float = 1.0,  # XFetch; 0 desactiva el refresco anticipado
+                 codec: Optional[CacheCodec] = None,
+                 enable_invalidation_bus: bool = False,  # Coherencia de L1 entre nodos
+                 enable_near_duplicate_lookup: bool = False,
+                 near_duplicate_threshold: float = 0.85,
+                 expiry_granularity: float = 1.0,  # Segundos máximos de retraso al reclamar expirados
+                 l3_disk_path: Optional[str] = None,  # L3 local en disco en vez de Redis
+                 namespace_quotas: Optional[Dict[str, float]] = None,  # Fracción de L1 por prefijo de clave
+                 hot_key_top_k: int = 32,
+                 hot_key_min_count: int = 100,  # Lecturas por minuto para considerar caliente una clave
+                 hot_key_refresh_interval: float = 5.0,
+                 hot_key_replicas: int = 0,  # Copias extra en L2 (slots distintos en cluster)
+                 write_behind: bool = False,  # set vuelve tras L1; L2/L3 se escriben en lotes
+                 write_behind_max_pending: int = 10000,
+                 write_behind_flush_interval: float = 0.05,
+                 promotion_policy: PromotionPolicy = PromotionPolicy.N_HITS,
+                 promotion_min_hits: int = 2,  # Lecturas de L2/L3 antes de subir a L1
+                 promotion_window: float = 60.0,
+                 snapshot_path: Optional[str] = None,  # Volcado del L1 para reinicios en caliente
+                 snapshot_interval: float = 300.0,  # 0 solo guarda al cerrar
+                 snapshot_max_bytes: int = 100 * 1024 * 1024,
+                 snapshot_max_age: float = 900.0,  # Snapshots más viejos se ignoran (invalidaciones perdidas)
+                 negative_cache_ttl: Optional[float] = None,  # None: 10s con bus, desactivado sin él; 0 desactiva
+                 negative_cache_max_entries: int = 100000,
+                 bloom_namespaces: Optional[Dict[str, int]] = None,  # Namespace -> claves esperadas
+                 bloom_error_rate: float = 0.01,
+                 bloom_sync_interval: float = 30.0,
+                 max_context_turns: int = 50,  # Tope del historial de conversación (LTRIM en Redis)
+                 context_checkpoint_turns: int = 20):  # Cada cuántos turnos se guarda el contexto completo en L3
         
         self.redis_cluster_url = redis_cluster_url
+        if cluster_nodes is None and "cluster" in redis_cluster_url.lower():
+            cluster_nodes = DEFAULT_CLUSTER_NODES
+        self.cluster_nodes = cluster_nodes
+        self.redis_max_connections = redis_max_connections
+        self.redis_socket_timeout = redis_socket_timeout
         self.max_memory_cache_size = max_memory_cache_size
         self.max_memory_size_bytes = max_memory_size_bytes
         self.compression_threshold = compression_threshold
+        self.codec = codec or CacheCodec(compression_threshold=compression_threshold)
         self.default_ttl = default_ttl
+        self.eviction_policy = EvictionPolicy(eviction_policy)
         
         # L1 Cache - In Memory
         self.l1_cache: Dict[str, CacheEntry] = {}
-        self.l1_access_order: List[str] = []  # Para LRU eviction
         self.l1_size_bytes = 0
         
+        # Cuotas por namespace; cada uno con su propio orden de expulsión O(1)
+        self.memory_governor = MemoryGovernor(max_memory_size_bytes, namespace_quotas)
+        self.l1_policies: Dict[str, L1EvictionEngine] = {
+            namespace: create_eviction_engine(self.eviction_policy, max_memory_cache_size)
+            for namespace in self.memory_governor.namespaces
+        }
+        
+        # Expiración de L1: costo proporcional a lo que vence, no al tamaño del cache
+        self.expiry_granularity = expiry_granularity
+        self.l1_expiry_wheel = HierarchicalTimingWheel(tick=expiry_granularity, start_time=time.time())
+        self.started_at = time.time()
+        
         # L2 Cache - Redis Cluster
         self.redis_client: Optional[Union[Redis, RedisCluster]] = None
         
-        # L3 Cache - Persistent (implementación básica con Redis)
+        # L3 Cache - Persistent (log local en disco si se configura, si no Redis)
         self.persistent_client: Optional[Redis] = None
+        self.l3_store: Optional[DiskLogStore] = DiskLogStore(l3_disk_path) if l3_disk_path else None
+        
+        # Single-flight: una sola computación en curso por clave
+        self.inflight_computations: Dict[str, asyncio.Future] = {}
+        self.lease_ttl = lease_ttl
+        
+        # Stale-while-revalidate y refresco anticipado
+        self.early_refresh_beta = early_refresh_beta
+        self.refreshers: Dict[str, ComputeSpec] = {}
+        self.refresh_tasks: Set[asyncio.Task] = set()
         
         # Métricas
         self.metrics = CacheMetrics()
+        self.instrumentation = CacheInstrumentation()  # Latencias por nivel/namespace, bytes, expulsiones
         
         # Cache warmup data
         self.warmup_keys: List[str] = []
         
+        # Índice de tags: tag -> claves (L1 local; en L2 como sets de Redis)
+        self.l1_tag_index: Dict[str, Set[str]] = {}
+        self.l1_key_tags: Dict[str, Set[str]] = {}
+        self.tag_index_ttl = 14 * 86400  # Cubre el TTL extendido de L3
+        
+        # Índice de consultas AI casi duplicadas (MinHash/LSH, local al nodo)
+        self.near_duplicate_index: Optional[MinHashLSHIndex] = None
+        if enable_near_duplicate_lookup:
+            self.near_duplicate_index = MinHashLSHIndex(threshold=near_duplicate_threshold)
+        
+        # Admisión a L1 de lecturas de L2/L3
+        self.promotion_gate = PromotionGate(promotion_policy, min_hits=promotion_min_hits,
+                                            window_seconds=promotion_window)
+        
+        # Claves calientes: fijadas en L1 de todos los nodos y refrescadas desde L2
+        self.hot_key_detector = HotKeyDetector(k=hot_key_top_k, min_count=hot_key_min_count)
+        self.hot_key_refresh_interval = hot_key_refresh_interval
+        self.hot_key_replicas = hot_key_replicas
+        self.pinned_keys: Set[str] = set()
+        self.replicated_keys: Set[str] = set()  # De todos los nodos: quien escriba la clave actualiza sus copias
+        
+        # Contexto de conversación por deltas (hash + lista acotada en L2)
+        self.max_context_turns = max_context_turns
+        self.context_checkpoint_turns = context_checkpoint_turns
+        
+        # Cache negativo: tombstones de misses confirmados y Bloom de claves escritas por namespace
+        self.negative_cache: Optional[NegativeCache] = None
+        if negative_cache_ttl is None:
+            # Sin bus nadie borra el tombstone cuando otro nodo escribe la clave
+            negative_cache_ttl = 10.0 if enable_invalidation_bus else 0.0
+        if negative_cache_ttl > 0:
+            self.negative_cache = NegativeCache(negative_cache_ttl, negative_cache_max_entries)
+        self.bloom_filters: Dict[str, BloomFilter] = {
+            namespace: BloomFilter(capacity, bloom_error_rate)
+            for namespace, capacity in (bloom_namespaces or {}).items()
+        }
+        self.bloom_sync_interval = bloom_sync_interval
+        self.last_bloom_sync = 0.0
+        self.bloom_ready: Set[str] = set()  # Namespaces cuyo filtro ya puede descartar claves
+        
+        # Invalidación de L1 entre nodos (Redis pub/sub)
+        self.enable_invalidation_bus = enable_invalidation_bus
+        self.invalidation_bus: Optional[InvalidationBus] = None
+        
+        # Write-behind de L2/L3
+        self.enable_write_behind = write_behind
+        self.write_behind_max_pending = write_behind_max_pending
+        self.write_behind_flush_interval = write_behind_flush_interval
+        self.write_behind: Optional[WriteBehindBuffer] = None
+        
+        # Snapshot de las entradas más calientes de L1
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_max_bytes = snapshot_max_bytes
+        self.snapshot_max_age = snapshot_max_age
+        self.snapshot_stats: Dict[str, Any] = {}
+        
         # Background tasks
         self.cleanup_task: Optional[asyncio.Task] = None
         self.metrics_task: Optional[asyncio.Task] = None
+        self.hot_key_task: Optional[asyncio.Task] = None
+        self.snapshot_task: Optional[asyncio.Task] = None
         
     async def initialize(self):
         """Inicializar sistema de cache"""
         try:
-            # Conectar a Redis Cluster para L2
-            if "cluster" in self.redis_cluster_url.lower():
-                # Redis Cluster setup
-                cluster_nodes = [
-                    {"host": "localhost", "port": 7000},
-                    {"host": "localhost", "port": 7001},
-                    {"host": "localhost", "port": 7002}
-                ]
-                self.redis_client = RedisCluster(startup_nodes=cluster_nodes, decode_responses=False)
+            # L2: Redis Cluster o instancia única, con el pool compartido del proceso
+            self.redis_client = await shared_redis_clients.acquire(
+                self.redis_cluster_url,
+                cluster_nodes=self.cluster_nodes,
+                max_connections=self.redis_max_connections,
+                socket_timeout=self.redis_socket_timeout
+            )
+            
+            # L3: log local en disco (sobrevive reinicios del nodo) o Redis persistente
+            if self.l3_store is not None:
+                self.l3_store.open()
             else:
-                # Single Redis instance
-                self.redis_client = await aioredis.from_url(
-                    self.redis_cluster_url, 
-                    encoding=None,  # Handle binary data
-                    decode_responses=False
+                self.persistent_client = await shared_redis_clients.acquire(
+                    self.redis_cluster_url.replace("6379", "6380"),  # Otra instancia para persistente
+                    db=1,  # Usar DB diferente para persistencia
+                    max_connections=self.redis_max_connections,
+                    socket_timeout=self.redis_socket_timeout
                 )
             
-            # Conectar a Redis persistente para L3 (puede ser la misma instancia)
-            self.persistent_client = await aioredis.from_url(
-                self.redis_cluster_url.replace("6379", "6380"),  # Otra DB para persistente
-                encoding=None,
-                decode_responses=False,
-                db=1  # Usar DB diferente para persistencia
-            )
+            # Traer las claves que otros nodos ya sumaron a los filtros de Bloom
+            if self.bloom_filters:
+                self._add_l3_keys_to_bloom()
+                await self._sync_bloom_filters()
+            
+            # Bus de invalidación para que otros nodos descarten su copia en L1
+            if self.enable_invalidation_bus:
+                self.invalidation_bus = InvalidationBus(self.redis_client, self._on_remote_invalidation)
+                await self.invalidation_bus.start()
+            
+            if self.enable_write_behind:
+                self.write_behind = WriteBehindBuffer(
+                    self._flush_write_behind,
+                    max_pending=self.write_behind_max_pending,
+                    flush_interval=self.write_behind_flush_interval
+                )
+                await self.write_behind.start()
+            
+            # Recargar el L1 del último snapshot antes de recibir tráfico
+            if self.snapshot_path:
+                await self._load_l1_snapshot()
             
             # Iniciar tareas de background
             self.cleanup_task = asyncio.create_task(self._cleanup_loop())
             self.metrics_task = asyncio.create_task(self._metrics_loop())
+            self.hot_key_task = asyncio.create_task(self._hot_key_loop())
+            if self.snapshot_path and self.snapshot_interval > 0:
+                self.snapshot_task = asyncio.create_task(self._snapshot_loop())
             
             # Cache warmup con datos comunes
             await self._warmup_cache()
@@ -157,108 +368,230 @@ class MassiveCacheStrategy:
             self.cleanup_task.cancel()
         if self.metrics_task:
             self.metrics_task.cancel()
+        if self.hot_key_task:
+            self.hot_key_task.cancel()
+        if self.snapshot_task:
+            self.snapshot_task.cancel()
+        for task in list(self.refresh_tasks):
+            task.cancel()
+        
+        # Volcar el L1 antes de descartarlo
+        if self.snapshot_path:
+            await self._save_l1_snapshot()
+        
+        # Vaciar escrituras diferidas y publicar invalidaciones antes de cerrar Redis
+        if self.write_behind:
+            await self.write_behind.stop()
+        if self.invalidation_bus:
+            await self.invalidation_bus.stop()
+        if self.bloom_filters:
+            await self._sync_bloom_filters()
         
         # Cerrar conexiones Redis
         if self.redis_client:
-            await self.redis_client.close()
+            await shared_redis_clients.release(self.redis_client)
         if self.persistent_client:
-            await self.persistent_client.close()
+            await shared_redis_clients.release(self.persistent_client)
+        if self.l3_store is not None:
+            self.l3_store.close()
         
         # Limpiar cache L1
         self.l1_cache.clear()
-        self.l1_access_order.clear()
+        for policy in self.l1_policies.values():
+            policy.clear()
+        self.memory_governor.clear()
+        self.pinned_keys.clear()
+        self.replicated_keys.clear()
+        self.promotion_gate.clear()
+        if self.negative_cache is not None:
+            self.negative_cache.clear()
+        self.bloom_ready.clear()
+        self.l1_tag_index.clear()
+        self.l1_key_tags.clear()
+        self.l1_expiry_wheel = HierarchicalTimingWheel(tick=self.expiry_granularity, start_time=time.time())
+        self.l1_size_bytes = 0
         
         logger.info("Cache system shutdown complete")
     
     async def get(self, key: str, default: Any = None) -> Any:
         """Obtener valor del cache con estrategia multi-nivel"""
-        start_time = time.time()
-        self.metrics.total_requests += 1
+        entry = await self._lookup(key)
+        if entry is None:
+            return default
+        
+        # Stale-while-revalidate: servir el valor viejo y refrescar en background
+        if entry.is_stale:
+            self._schedule_refresh(key, self.refreshers.get(key))
+        
+        return entry.value
+    
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None, 
+                 levels: List[CacheLevel] = None, hard_ttl: Optional[int] = None,
+                 compute_time: float = 0.0, tags: Optional[List[str]] = None) -> bool:
+        """Guardar valor en cache con estrategia multi-nivel
+        
+        Si se indica hard_ttl, ttl pasa a ser el TTL blando: entre ambos el valor
+        se sirve como stale mientras se refresca en background. Los tags permiten
+        invalidar después todas las claves asociadas con invalidate_tag.
+        """
+        
+        if ttl is None:
+            ttl = self.default_ttl
+        
+        if levels is None:
+            levels = [CacheLevel.L1_MEMORY, CacheLevel.L2_REDIS]
+        
+        soft_ttl = None
+        if hard_ttl is not None and hard_ttl > ttl:
+            soft_ttl, ttl = ttl, hard_ttl
         
         try:
-            # L1 - In Memory Cache (más rápido)
-            if key in self.l1_cache:
-                entry = self.l1_cache[key]
-                if not entry.is_expired:
-                    entry.touch()
-                    self._update_l1_access_order(key)
-                    self.metrics.hits += 1
-                    self.metrics.l1_hits += 1
-                    self._update_response_time(start_time)
-                    logger.debug(f"L1 cache hit for key: {key}")
-                    return self._decompress_if_needed(entry.value, entry.compressed)
-                else:
-                    # Eliminar entrada expirada
-                    await self._remove_from_l1(key)
+            self._mark_known([key])
             
-            # L2 - Redis Cache
-            try:
-                redis_value = await self.redis_client.get(f"robertai:l2:{key}")
-                if redis_value:
-                    # Deserializar valor
-                    try:
-                        cache_data = msgpack.unpackb(redis_value)
-                        value = cache_data['value']
-                        compressed = cache_data.get('compressed', False)
-                        
-                        # Promover a L1 si es accedido frecuentemente
-                        await self._promote_to_l1(key, value, compressed)
-                        
-                        self.metrics.hits += 1
-                        self.metrics.l2_hits += 1
-                        self._update_response_time(start_time)
-                        logger.debug(f"L2 cache hit for key: {key}")
-                        
-                        return self._decompress_if_needed(value, compressed)
-                        
-                    except Exception as e:
-                        logger.warning(f"Error deserializing L2 cache for key {key}: {e}")
+            # Serializar una sola vez; L1 guarda el objeto y L2/L3 el payload binario
+            payload = self.codec.encode(value, time.time(), ttl, soft_ttl, compute_time)
             
-            except Exception as e:
-                logger.warning(f"L2 cache error for key {key}: {e}")
+            success = True
             
-            # L3 - Persistent Cache
-            try:
-                persistent_value = await self.persistent_client.get(f"robertai:l3:{key}")
-                if persistent_value:
-                    try:
-                        cache_data = msgpack.unpackb(persistent_value)
-                        value = cache_data['value']
-                        compressed = cache_data.get('compressed', False)
-                        ttl = cache_data.get('ttl', self.default_ttl)
-                        
-                        # Promover a L2 y L1
-                        await self._promote_to_l2(key, value, compressed, ttl)
-                        await self._promote_to_l1(key, value, compressed)
-                        
-                        self.metrics.hits += 1
-                        self.metrics.l3_hits += 1
-                        self._update_response_time(start_time)
-                        logger.debug(f"L3 cache hit for key: {key}")
-                        
-                        return self._decompress_if_needed(value, compressed)
-                        
-                    except Exception as e:
-                        logger.warning(f"Error deserializing L3 cache for key {key}: {e}")
+            # L1 - In Memory
+            if CacheLevel.L1_MEMORY in levels:
+                success &= await self._set_l1(key, value, ttl, soft_ttl=soft_ttl,
+                                              delta=compute_time)
+                self._index_l1_tags(key, tags)
             
-            except Exception as e:
-                logger.warning(f"L3 cache error for key {key}: {e}")
+            # Write-behind: L2/L3 (y la invalidación) salen en el próximo lote
+            if self.write_behind and (CacheLevel.L2_REDIS in levels or CacheLevel.L3_PERSISTENT in levels):
+                success &= await self.write_behind.put(key, self._pending_write(payload, ttl, levels, tags))
+                return success
             
-            # Cache miss - no encontrado en ningún nivel
-            self.metrics.misses += 1
-            self._update_response_time(start_time)
-            logger.debug(f"Cache miss for key: {key}")
+            # L2 - Redis (el índice de tags viaja en el mismo round trip)
+            if CacheLevel.L2_REDIS in levels:
+                success &= await self._set_l2(key, payload, ttl, tags=tags)
+            elif tags:
+                success &= await self._add_tags({key: (tags, ttl)})
             
-            return default
+            # L3 - Persistent
+            if CacheLevel.L3_PERSISTENT in levels:
+                success &= await self._set_l3(key, payload, ttl)
+            
+            self._publish_invalidation([key])
+            
+            if success:
+                logger.debug(f"Successfully cached key: {key} in levels: {[l.value for l in levels]}")
+            
+            return success
             
         except Exception as e:
-            logger.error(f"Error in cache get for key {key}: {e}")
-            self.metrics.misses += 1
-            return default
+            logger.error(f"Error setting cache for key {key}: {e}")
+            return False
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None, 
-                 levels: List[CacheLevel] = None) -> bool:
-        """Guardar valor en cache con estrategia multi-nivel"""
+    async def get_many(self, keys: List[str], default: Any = None) -> Dict[str, Any]:
+        """Obtener varias claves con un solo round trip por nivel"""
+        start_time = time.perf_counter()
+        found: Dict[str, CacheEntry] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        self.metrics.total_requests += len(unique_keys)
+        
+        # L1 - resolver hits locales
+        pending: List[str] = []
+        for key in unique_keys:
+            self.hot_key_detector.record(key)
+            entry = self.l1_cache.get(key)
+            if entry is not None:
+                if not entry.is_expired:
+                    entry.touch()
+                    self._l1_policy(key).record_access(key)
+                    self.metrics.hits += 1
+                    self.metrics.l1_hits += 1
+                    found[key] = entry
+                    continue
+                await self._remove_from_l1(key, EVICTION_EXPIRED)
+            buffered = self._buffered_entry(key)
+            if buffered is not None:
+                self.metrics.hits += 1
+                self.metrics.l1_hits += 1
+                found[key] = buffered
+                continue
+            if self._known_miss(key):
+                continue
+            pending.append(key)
+        
+        # Mismo protocolo que get: un set durante la lectura anula el tombstone de su clave
+        probing: List[str] = []
+        if self.negative_cache is not None:
+            for key in pending:
+                self.negative_cache.begin(key)
+            probing = list(pending)
+        confirmed_miss = False
+        
+        try:
+            # L2 - un pipeline para todos los misses de L1
+            if pending:
+                try:
+                    l2_found = await self._get_many_from_redis(self.redis_client, "robertai:l2", pending,
+                                                               raise_errors=True)
+                except Exception as e:
+                    logger.warning(f"Batch L2 error for {len(pending)} keys: {e}")
+                    self._abort_probes(probing)  # Sin respuesta de L2 los misses no están confirmados
+                    probing = []
+                    l2_found = {}
+                for key, entry in l2_found.items():
+                    await self._promote_to_l1(key, entry, "l2")
+                    self.metrics.hits += 1
+                    self.metrics.l2_hits += 1
+                found.update(l2_found)
+                pending = [key for key in pending if key not in l2_found]
+            
+            # L3 - un pipeline para los misses restantes y promoción a L2 en bloque
+            if pending:
+                try:
+                    l3_found = await self._get_many_l3(pending, raise_errors=True)
+                except Exception as e:
+                    logger.warning(f"Batch L3 error for {len(pending)} keys: {e}")
+                    self._abort_probes(probing)
+                    probing = []
+                    l3_found = {}
+                l2_payloads = {}
+                for key, entry in l3_found.items():
+                    ttls = self._remaining_ttls(entry)
+                    if ttls is not None:
+                        l2_payloads[key] = (self._encode_entry(entry), ttls[0])
+                if l2_payloads and await self._set_many_redis(self.redis_client, "robertai:l2", l2_payloads):
+                    self.instrumentation.record_promotion("l3", "l2", len(l2_payloads))
+                for key, entry in l3_found.items():
+                    await self._promote_to_l1(key, entry, "l3")
+                    self.metrics.hits += 1
+                    self.metrics.l3_hits += 1
+                found.update(l3_found)
+                pending = [key for key in pending if key not in l3_found]
+            
+            confirmed_miss = True
+        
+        finally:
+            for key in probing:
+                self.negative_cache.finish(key, confirmed_miss and key not in found)
+        
+        # Misses en todos los niveles (incluye los resueltos por el cache negativo)
+        self.metrics.misses += len(unique_keys) - len(found)
+        namespaces = {self.memory_governor.namespace_of(key) for key in unique_keys}
+        self._update_response_time(start_time, "batch", namespaces.pop() if len(namespaces) == 1 else "mixed")
+        
+        results: Dict[str, Any] = {}
+        for key in keys:
+            entry = found.get(key)
+            if entry is None:
+                results[key] = default
+                continue
+            if entry.is_stale:
+                self._schedule_refresh(key, self.refreshers.get(key))
+            results[key] = entry.value
+        
+        return results
+    
+    async def set_many(self, mapping: Dict[str, Any], ttl: Optional[int] = None,
+                       levels: List[CacheLevel] = None, hard_ttl: Optional[int] = None,
+                       tags: Optional[List[str]] = None) -> bool:
+        """Guardar varias claves con un solo round trip por nivel"""
         
         if ttl is None:
             ttl = self.default_ttl
@@ -266,31 +599,48 @@ class MassiveCacheStrategy:
         if levels is None:
             levels = [CacheLevel.L1_MEMORY, CacheLevel.L2_REDIS]
         
+        soft_ttl = None
+        if hard_ttl is not None and hard_ttl > ttl:
+            soft_ttl, ttl = ttl, hard_ttl
+        
         try:
-            # Preparar valor para almacenamiento
-            serialized_value, compressed, size_bytes = await self._prepare_value_for_storage(value)
+            self._mark_known(mapping.keys())
+            
+            now = time.time()
+            payloads: Dict[str, Tuple[bytes, int]] = {
+                key: (self.codec.encode(value, now, ttl, soft_ttl), ttl)
+                for key, value in mapping.items()
+            }
             
             success = True
             
             # L1 - In Memory
             if CacheLevel.L1_MEMORY in levels:
-                success &= await self._set_l1(key, serialized_value, ttl, compressed, size_bytes)
+                for key, value in mapping.items():
+                    success &= await self._set_l1(key, value, ttl, soft_ttl=soft_ttl)
+                    self._index_l1_tags(key, tags)
             
-            # L2 - Redis
+            if self.write_behind and (CacheLevel.L2_REDIS in levels or CacheLevel.L3_PERSISTENT in levels):
+                for key, (payload, _) in payloads.items():
+                    success &= await self.write_behind.put(key, self._pending_write(payload, ttl, levels, tags))
+                return success
+            
+            # L2 - Redis (pipeline)
             if CacheLevel.L2_REDIS in levels:
-                success &= await self._set_l2(key, serialized_value, ttl, compressed)
+                success &= await self._set_many_redis(self.redis_client, "robertai:l2", payloads)
+            if tags:
+                success &= await self._add_tags({key: (tags, ttl) for key in mapping})
             
-            # L3 - Persistent
+            # L3 - Persistent (pipeline, TTL extendido)
             if CacheLevel.L3_PERSISTENT in levels:
-                success &= await self._set_l3(key, serialized_value, ttl, compressed)
+                success &= await self._set_many_l3(payloads)
             
-            if success:
-                logger.debug(f"Successfully cached key: {key} in levels: {[l.value for l in levels]}")
+            self._publish_invalidation(mapping.keys())
             
             return success
-            
+        
         except Exception as e:
-            logger.error(f"Error setting cache for key {key}: {e}")
+            logger.error(f"Error setting {len(mapping)} cache keys: {e}")
             return False
     
     async def delete(self, key: str) -> bool:
@@ -298,23 +648,22 @@ class MassiveCacheStrategy:
         success = True
         
         try:
-            # Eliminar de L1
+            # Eliminar de L1 (local y en los demás nodos) y descartar escrituras diferidas
             if key in self.l1_cache:
                 await self._remove_from_l1(key)
+            if self.write_behind:
+                await self.write_behind.discard([key])
+            self._publish_invalidation([key])
             
             # Eliminar de L2
             try:
-                await self.redis_client.delete(f"robertai:l2:{key}")
+                await self.redis_client.delete(*self._l2_redis_keys(key))
             except Exception as e:
                 logger.warning(f"Error deleting from L2: {e}")
                 success = False
             
             # Eliminar de L3
-            try:
-                await self.persistent_client.delete(f"robertai:l3:{key}")
-            except Exception as e:
-                logger.warning(f"Error deleting from L3: {e}")
-                success = False
+            success &= await self._delete_l3([key])
             
             return success
             
@@ -322,27 +671,85 @@ class MassiveCacheStrategy:
             logger.error(f"Error deleting cache key {key}: {e}")
             return False
     
+    async def get_or_compute(self, key: str, compute_func, ttl: int = 3600,
+                             levels: List[CacheLevel] = None, distributed: bool = False,
+                             hard_ttl: Optional[int] = None) -> Any:
+        """Obtener del cache o computar una sola vez por clave (single-flight)
+        
+        Los valores stale se sirven de inmediato y se recomputan en background;
+        los frescos se recomputan antes de expirar con probabilidad XFetch.
+        """
+        spec = ComputeSpec(compute_func, ttl, levels, hard_ttl, distributed)
+        
+        entry = await self._lookup(key)
+        if entry is not None:
+            if entry.is_stale or self._should_refresh_early(entry):
+                self._schedule_refresh(key, spec)
+            return entry.value
+        
+        # Otra corrutina ya está computando esta clave: esperar su resultado
+        inflight = self.inflight_computations.get(key)
+        if inflight is not None:
+            self.metrics.coalesced_requests += 1
+            return await asyncio.shield(inflight)
+        
+        return await self._lead_computation(key, spec)
+    
+    def register_refresher(self, key: str, compute_func, ttl: int,
+                           levels: List[CacheLevel] = None, hard_ttl: Optional[int] = None):
+        """Registrar cómo recomputar una clave para refrescarla cuando quede stale"""
+        self.refreshers[key] = ComputeSpec(compute_func, ttl, levels, hard_ttl)
+    
     async def get_cached_ai_response(self, input_text: str, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Obtener respuesta AI cacheada"""
+        """Obtener respuesta AI cacheada (exacta tras normalizar, o casi duplicada)"""
         
-        # Crear hash único para la consulta
+        # Crear hash único para la consulta normalizada
+        normalized_input = normalize_query(input_text)
+        if normalized_input is None:
+            return None  # Solo emojis o puntuación: todas compartirían la misma clave
+        context_hash = self._hash_context(context)
         query_data = {
-            "input": input_text.lower().strip(),
-            "context_hash": self._hash_context(context)
+            "input": normalized_input,
+            "context_hash": context_hash
         }
-        query_hash = self._generate_cache_key("ai_response", query_data)
+        query_hash = self._ai_response_key(query_data, context)
+        
+        response = await self.get(query_hash)
+        if response is not None or self.near_duplicate_index is None:
+            return response
+        
+        # Buscar una consulta similar ya respondida en el mismo contexto
+        match = self.near_duplicate_index.query(normalized_input, namespace=context_hash)
+        if match is None or match[0] == query_hash:
+            return None
+        
+        similar_key, similarity = match
+        response = await self.get(similar_key)
+        if response is None:
+            self.near_duplicate_index.remove(similar_key)
+            return None
         
-        return await self.get(query_hash)
+        self.metrics.near_duplicate_hits += 1
+        logger.debug(f"Near-duplicate AI response hit ({similarity:.2f}) for key: {similar_key}")
+        return response
     
     async def cache_ai_response(self, input_text: str, context: Dict[str, Any], 
-                               response: Dict[str, Any], ttl: int = 1800) -> bool:
-        """Cachear respuesta AI (30 min TTL por defecto)"""
+                               response: Dict[str, Any], ttl: int = 1800,
+                               hard_ttl: Optional[int] = None) -> bool:
+        """Cachear respuesta AI (30 min TTL por defecto, stale hasta hard_ttl)"""
         
+        normalized_input = normalize_query(input_text)
+        if normalized_input is None:
+            return False
+        context_hash = self._hash_context(context)
         query_data = {
-            "input": input_text.lower().strip(),
-            "context_hash": self._hash_context(context)
+            "input": normalized_input,
+            "context_hash": context_hash
         }
-        query_hash = self._generate_cache_key("ai_response", query_data)
+        query_hash = self._ai_response_key(query_data, context)
+        
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.add(query_hash, normalized_input, namespace=context_hash)
         
         # Agregar metadata a la respuesta
         cached_response = {
@@ -351,73 +758,118 @@ class MassiveCacheStrategy:
             "cache_ttl": ttl
         }
         
+        tags = ["ai_response"]
+        if context.get("user_id"):
+            tags.append(self._user_tag(context["user_id"]))
+        
         return await self.set(
             query_hash, 
             cached_response, 
             ttl=ttl,
-            levels=[CacheLevel.L1_MEMORY, CacheLevel.L2_REDIS]
+            levels=[CacheLevel.L1_MEMORY, CacheLevel.L2_REDIS],
+            hard_ttl=hard_ttl,
+            tags=tags
         )
     
     async def get_conversation_context(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Obtener contexto de conversación"""
-        key = self._generate_cache_key("conversation", {"user_id": user_id})
+        """Obtener contexto de conversación (L1, hash de deltas en L2 o checkpoint en L3)"""
+        key = user_key("conversation", user_id)
+        # Solo una copia vigente en L1: vencida, get() caería al checkpoint de L3
+        # aunque el hash de L2 tenga turnos más nuevos de otros nodos
+        entry = self.l1_cache.get(key)
+        if entry is not None and not entry.is_expired:
+            context = await self.get(key)
+            if context is not None:
+                return context
+        
+        context = await self._read_context(key)
+        if context is not None:
+            return context
+        
+        # Sin hash en L2: contexto guardado antes de los deltas, o solo queda el checkpoint de L3
         return await self.get(key)
     
     async def set_conversation_context(self, user_id: str, context: Dict[str, Any], 
                                      ttl: int = 86400) -> bool:
-        """Guardar contexto de conversación (24h TTL)"""
-        key = self._generate_cache_key("conversation", {"user_id": user_id})
-        
-        return await self.set(
-            key, 
-            context, 
-            ttl=ttl,
-            levels=[CacheLevel.L1_MEMORY, CacheLevel.L2_REDIS, CacheLevel.L3_PERSISTENT]
-        )
+        """Guardar contexto de conversación completo, reemplazando campos e historial (24h TTL)"""
+        return await self._write_context(user_id, ttl, patch=context, replace=True)
+    
+    async def update_conversation_context(self, user_id: str, patch: Dict[str, Any],
+                                          ttl: int = 86400) -> bool:
+        """Actualizar solo los campos del patch (None borra el campo)"""
+        return await self._write_context(user_id, ttl, patch=patch)
+    
+    async def append_turn(self, user_id: str, turn: Any, ttl: int = 86400) -> bool:
+        """Agregar un turno al historial; Redis conserva solo los últimos max_context_turns"""
+        return await self._write_context(user_id, ttl, turns=[turn])
     
     async def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Obtener perfil de usuario"""
-        key = self._generate_cache_key("user_profile", {"user_id": user_id})
+        key = user_key("user_profile", user_id)
         return await self.get(key)
     
     async def set_user_profile(self, user_id: str, profile: Dict[str, Any], 
                               ttl: int = 604800) -> bool:
         """Guardar perfil de usuario (7 días TTL)"""
-        key = self._generate_cache_key("user_profile", {"user_id": user_id})
+        key = user_key("user_profile", user_id)
         
         return await self.set(
             key,
             profile,
             ttl=ttl,
-            levels=[CacheLevel.L2_REDIS, CacheLevel.L3_PERSISTENT]
+            levels=[CacheLevel.L2_REDIS, CacheLevel.L3_PERSISTENT],
+            tags=["user_profile", self._user_tag(user_id)]
         )
     
     async def invalidate_user_cache(self, user_id: str) -> bool:
         """Invalidar todo el cache de un usuario"""
-        patterns = [
-            f"conversation:{user_id}",
-            f"user_profile:{user_id}",
-            f"ai_response:*:{user_id}*"
-        ]
+        return await self.invalidate_tag(self._user_tag(user_id))
+    
+    async def invalidate_tag(self, tag: str) -> bool:
+        """Invalidar todas las claves con el tag en L1, L2 y L3
         
+        Usa el índice del tag (set de Redis + índice local) en vez de SCAN:
+        el costo es O(miembros) con un UNLINK en pipeline por nivel.
+        """
+        tag_key = f"robertai:tag:{tag}"
+        keys: Set[str] = set(self.l1_tag_index.get(tag, ()))
         success = True
-        for pattern in patterns:
-            try:
-                # Buscar claves que coincidan con el patrón
-                keys = []
-                if hasattr(self.redis_client, 'scan_iter'):
-                    async for key in self.redis_client.scan_iter(match=f"robertai:l2:{pattern}"):
-                        keys.append(key.decode() if isinstance(key, bytes) else key)
-                
-                # Eliminar claves encontradas
-                for key in keys:
-                    cache_key = key.replace("robertai:l2:", "")
-                    await self.delete(cache_key)
-                    
-            except Exception as e:
-                logger.warning(f"Error invalidating pattern {pattern}: {e}")
-                success = False
         
+        try:
+            members = await self.redis_client.smembers(tag_key)
+            keys.update(m.decode() if isinstance(m, bytes) else m for m in members)
+        except Exception as e:
+            logger.warning(f"Error reading tag index {tag}: {e}")
+            success = False
+        
+        if self.write_behind:
+            keys.update(self.write_behind.keys_with_tag(tag))
+            await self.write_behind.discard(keys)
+        
+        # L1 - local y en los demás nodos
+        for key in keys:
+            if key in self.l1_cache:
+                await self._remove_from_l1(key)
+        self.l1_tag_index.pop(tag, None)
+        self._publish_invalidation(keys)
+        
+        # L2 - un pipeline con UNLINK por clave (las réplicas viven en otros slots) y el propio índice
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                for redis_key in self._l2_redis_keys(key):
+                    pipe.unlink(redis_key)
+            pipe.unlink(tag_key)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error invalidating tag {tag} in L2: {e}")
+            success = False
+        
+        # L3
+        if keys:
+            success &= await self._delete_l3(keys)
+        
+        logger.debug(f"Invalidated {len(keys)} keys for tag {tag}")
         return success
     
     def get_cache_stats(self) -> Dict[str, Any]:
@@ -432,18 +884,41 @@ class MassiveCacheStrategy:
                 "l2_hits": self.metrics.l2_hits,
                 "l3_hits": self.metrics.l3_hits,
                 "l1_hit_rate": self.metrics.l1_hit_rate,
-                "avg_response_time_ms": self.metrics.avg_response_time * 1000
+                "avg_response_time_ms": self.metrics.avg_response_time * 1000,
+                "computations": self.metrics.computations,
+                "coalesced_requests": self.metrics.coalesced_requests,
+                "background_refreshes": self.metrics.background_refreshes,
+                "near_duplicate_hits": self.metrics.near_duplicate_hits,
+                "inflight_computations": len(self.inflight_computations)
             },
+            "l1_memory": self._get_l1_memory_footprint(),
             "l1_cache": {
                 "size": len(self.l1_cache),
                 "max_size": self.max_memory_cache_size,
                 "size_bytes": self.l1_size_bytes,
                 "max_size_bytes": self.max_memory_size_bytes,
-                "utilization": len(self.l1_cache) / self.max_memory_cache_size * 100
+                "utilization": len(self.l1_cache) / self.max_memory_cache_size * 100,
+                "indexed_tags": len(self.l1_tag_index)
             },
+            "promotion": self._get_promotion_stats(),
+            "instrumentation": self._get_instrumentation_stats(),
+            "negative_cache": self._get_negative_cache_stats(),
+            "conversation_context": self._get_context_write_stats(),
+            "hot_keys": {
+                "top_k": self.hot_key_detector.top_k(),
+                "pinned": sorted(self.pinned_keys),
+                "replicated": len(self.replicated_keys),
+                "refreshes": self.metrics.hot_key_refreshes
+            },
+            "invalidation_bus": self.invalidation_bus.get_stats() if self.invalidation_bus else None,
+            "write_behind": self.write_behind.get_stats() if self.write_behind else None,
+            "l3_disk": self.l3_store.get_stats() if self.l3_store is not None else None,
+            "l1_snapshot": {"path": self.snapshot_path, **self.snapshot_stats} if self.snapshot_path else None,
             "configuration": {
                 "compression_threshold": self.compression_threshold,
                 "default_ttl": self.default_ttl,
+                "eviction_policy": self.eviction_policy.value,
+                "expiry_granularity": self.expiry_granularity,
                 "max_memory_cache_size": self.max_memory_cache_size
             },
             "last_updated": datetime.now().isoformat()
@@ -451,64 +926,163 @@ class MassiveCacheStrategy:
     
     # Métodos internos privados
     
-    def _generate_cache_key(self, prefix: str, data: Dict[str, Any]) -> str:
-        """Generar clave de cache única"""
-        data_str = json.dumps(data, sort_keys=True)
-        data_hash = hashlib.md5(data_str.encode()).hexdigest()
-        return f"{prefix}:{data_hash}"
-    
-    def _hash_context(self, context: Dict[str, Any]) -> str:
-        """Crear hash del contexto para cache"""
-        # Solo incluir elementos relevantes del contexto para cache
-        relevant_context = {
-            "user_type": context.get("user_type"),
-            "conversation_stage": context.get("conversation_stage"),
-            "last_intent": context.get("last_intent")
-        }
-        return hashlib.md5(json.dumps(relevant_context, sort_keys=True).encode()).hexdigest()
-    
-    async def _prepare_value_for_storage(self, value: Any) -> Tuple[Any, bool, int]:
-        """Preparar valor para almacenamiento (serialización y compresión)"""
-        
-        # Serializar valor
-        if isinstance(value, (dict, list)):
-            serialized = json.dumps(value)
-        else:
-            serialized = str(value)
-        
-        # Verificar si necesita compresión
-        size_bytes = len(serialized.encode())
-        compressed = False
-        
-        if size_bytes > self.compression_threshold:
-            compressed_data = zlib.compress(serialized.encode())
-            if len(compressed_data) < size_bytes:
-                serialized = compressed_data
-                compressed = True
-                size_bytes = len(compressed_data)
+    async def _lookup(self, key: str) -> Optional[CacheEntry]:
+        """Buscar entrada en L1 → L2 → L3 registrando métricas"""
+        start_time = time.perf_counter()
+        namespace = self.memory_governor.namespace_of(key)
+        self.metrics.total_requests += 1
+        self.hot_key_detector.record(key)
+        probing = False
+        confirmed_miss = False
         
-        return serialized, compressed, size_bytes
-    
-    def _decompress_if_needed(self, value: Any, compressed: bool) -> Any:
-        """Descomprimir valor si es necesario"""
-        if compressed:
+        try:
+            # L1 - In Memory Cache (más rápido)
+            if key in self.l1_cache:
+                entry = self.l1_cache[key]
+                if not entry.is_expired:
+                    entry.touch()
+                    self._l1_policy(key).record_access(key)
+                    self.metrics.hits += 1
+                    self.metrics.l1_hits += 1
+                    self._update_response_time(start_time, "l1", namespace)
+                    logger.debug(f"L1 cache hit for key: {key}")
+                    return entry
+                else:
+                    # Eliminar entrada expirada
+                    await self._remove_from_l1(key, EVICTION_EXPIRED)
+            
+            # Escritura propia aún en el buffer de write-behind
+            buffered = self._buffered_entry(key)
+            if buffered is not None:
+                self.metrics.hits += 1
+                self.metrics.l1_hits += 1
+                self._update_response_time(start_time, "buffer", namespace)
+                return buffered
+            
+            # Miss conocido: tombstone vigente o clave que nunca se escribió
+            if self._known_miss(key):
+                self.metrics.misses += 1
+                self._update_response_time(start_time, "negative", namespace)
+                return None
+            if self.negative_cache is not None:
+                self.negative_cache.begin(key)
+                probing = True
+            
+            # L2 - Redis Cache
             try:
-                decompressed = zlib.decompress(value).decode()
-                return json.loads(decompressed)
-            except:
-                return value
-        
-        if isinstance(value, str):
+                redis_value = await self._get_l2(key)
+                if redis_value:
+                    self.instrumentation.record_read("l2", len(redis_value))
+                    # Deserializar valor
+                    try:
+                        entry = self._entry_from_payload(key, redis_value)
+                        
+                        # Promover a L1 si es accedido frecuentemente
+                        await self._promote_to_l1(key, entry, "l2")
+                        
+                        self.metrics.hits += 1
+                        self.metrics.l2_hits += 1
+                        self._update_response_time(start_time, "l2", namespace)
+                        logger.debug(f"L2 cache hit for key: {key}")
+                        
+                        return entry
+                        
+                    except Exception as e:
+                        logger.warning(f"Error deserializing L2 cache for key {key}: {e}")
+            
+            except Exception as e:
+                logger.warning(f"L2 cache error for key {key}: {e}")
+                if probing:
+                    self.negative_cache.abort(key)  # Sin respuesta de L2 el miss no está confirmado
+                    probing = False
+            
+            # L3 - Persistent Cache
             try:
-                return json.loads(value)
-            except:
-                return value
+                persistent_value = await self._get_l3(key)
+                if persistent_value:
+                    self.instrumentation.record_read("l3", len(persistent_value))
+                    try:
+                        entry = self._entry_from_payload(key, persistent_value)
+                        
+                        # Promover a L2 y L1
+                        await self._promote_to_l2(key, entry)
+                        await self._promote_to_l1(key, entry, "l3")
+                        
+                        self.metrics.hits += 1
+                        self.metrics.l3_hits += 1
+                        self._update_response_time(start_time, "l3", namespace)
+                        logger.debug(f"L3 cache hit for key: {key}")
+                        
+                        return entry
+                        
+                    except Exception as e:
+                        logger.warning(f"Error deserializing L3 cache for key {key}: {e}")
+            
+            except Exception as e:
+                logger.warning(f"L3 cache error for key {key}: {e}")
+                if probing:
+                    self.negative_cache.abort(key)
+                    probing = False
+            
+            # Cache miss - no encontrado en ningún nivel
+            self.metrics.misses += 1
+            self._update_response_time(start_time, "miss", namespace)
+            logger.debug(f"Cache miss for key: {key}")
+            confirmed_miss = True
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error in cache get for key {key}: {e}")
+            self.metrics.misses += 1
+            return None
         
-        return value
+        finally:
+            if probing:
+                self.negative_cache.finish(key, confirmed_miss)
+    
+    def _generate_cache_key(self, prefix: str, data: Dict[str, Any]) -> str:
+        """Generar clave de cache única (hash estructural, sin serializar a JSON)"""
+        return f"{prefix}:{stable_hash(data)}"
+    
+    def _ai_response_key(self, query_data: Dict[str, Any], context: Dict[str, Any]) -> str:
+        """Clave de respuesta AI; con usuario lleva su hash tag para compartir slot con sus datos"""
+        key = self._generate_cache_key("ai_response", query_data)
+        if context.get("user_id"):
+            return key.replace("ai_response:", f"ai_response:{user_hash_tag(context['user_id'])}:", 1)
+        return key
+    
+    def _hash_context(self, context: Dict[str, Any]) -> str:
+        """Crear hash del contexto para cache"""
+        # Solo incluir elementos relevantes del contexto; la tupla se repite mucho y se memoiza
+        return memoized_hash((
+            context.get("user_type"),
+            context.get("conversation_stage"),
+            context.get("last_intent")
+        ))
     
-    async def _set_l1(self, key: str, value: Any, ttl: int, compressed: bool, size_bytes: int) -> bool:
+    async def _set_l1(self, key: str, value: Any, ttl: int, size_bytes: Optional[int] = None,
+                      soft_ttl: Optional[int] = None, delta: float = 0.0,
+                      promoted: bool = False) -> bool:
         """Guardar en L1 (memoria)"""
         try:
+            namespace = self.memory_governor.namespace_of(key)
+            if size_bytes is None:
+                size_bytes = self.memory_governor.estimate_entry_size(key, value)
+            
+            # Reemplazar entrada previa para no contar sus bytes dos veces
+            if key in self.l1_cache:
+                await self._remove_from_l1(key, EVICTION_REPLACED)
+            
+            # Valores más grandes que la cuota del namespace quedan solo en L2/L3
+            if not self.memory_governor.fits(namespace, size_bytes):
+                self.memory_governor.namespaces[namespace].rejected_oversize += 1
+                logger.debug(f"Skipping L1 for {key}: {size_bytes} bytes exceeds {namespace} quota")
+                return True
+            
+            # Respetar la cuota del namespace antes que el límite global
+            await self._evict_namespace_entries(namespace, size_bytes)
+            
             # Verificar espacio disponible
             if (len(self.l1_cache) >= self.max_memory_cache_size or 
                 self.l1_size_bytes + size_bytes > self.max_memory_size_bytes):
@@ -520,12 +1094,18 @@ class MassiveCacheStrategy:
                 value=value,
                 created_at=time.time(),
                 ttl=ttl,
-                compressed=compressed,
-                size_bytes=size_bytes
+                size_bytes=size_bytes,
+                soft_ttl=soft_ttl,
+                delta=delta,
+                promoted=promoted
             )
             
             self.l1_cache[key] = entry
-            self._update_l1_access_order(key)
+            self.metrics.l1_insertions += 1
+            if key not in self.pinned_keys:
+                self.l1_policies[namespace].record_insert(key)  # Las fijadas no son candidatas a expulsión
+            self.memory_governor.charge(namespace, size_bytes)
+            self.l1_expiry_wheel.schedule(key, entry.created_at + ttl)
             self.l1_size_bytes += size_bytes
             
             return True
@@ -534,18 +1114,22 @@ class MassiveCacheStrategy:
             logger.error(f"Error setting L1 cache: {e}")
             return False
     
-    async def _set_l2(self, key: str, value: Any, ttl: int, compressed: bool) -> bool:
+    async def _set_l2(self, key: str, payload: bytes, ttl: int,
+                      tags: Optional[List[str]] = None) -> bool:
         """Guardar en L2 (Redis)"""
         try:
-            cache_data = {
-                "value": value,
-                "compressed": compressed,
-                "ttl": ttl,
-                "created_at": time.time()
-            }
-            
-            serialized_data = msgpack.packb(cache_data)
-            await self.redis_client.setex(f"robertai:l2:{key}", ttl, serialized_data)
+            replicated = key in self.replicated_keys
+            if tags or replicated:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.setex(f"robertai:l2:{key}", ttl, payload)
+                if tags:
+                    self._queue_tag_writes(pipe, key, tags, ttl)
+                if replicated:
+                    self._queue_replica_writes(pipe, key, payload, ttl)
+                await pipe.execute()
+            else:
+                await self.redis_client.setex(f"robertai:l2:{key}", ttl, payload)
+            self.instrumentation.record_write("l2", len(payload))
             
             return True
             
@@ -553,18 +1137,68 @@ class MassiveCacheStrategy:
             logger.error(f"Error setting L2 cache: {e}")
             return False
     
-    async def _set_l3(self, key: str, value: Any, ttl: int, compressed: bool) -> bool:
+    def _pending_write(self, payload: bytes, ttl: int, levels: List[CacheLevel],
+                       tags: Optional[List[str]]) -> PendingWrite:
+        return PendingWrite(
+            payload=payload,
+            ttl=ttl,
+            to_l2=CacheLevel.L2_REDIS in levels,
+            to_l3=CacheLevel.L3_PERSISTENT in levels,
+            tags=list(tags or [])
+        )
+    
+    def _buffered_entry(self, key: str) -> Optional[CacheEntry]:
+        """Entrada desde el buffer de write-behind si la clave no llegó aún a Redis"""
+        if not self.write_behind:
+            return None
+        write = self.write_behind.get(key)
+        if write is None:
+            return None
+        entry = self._entry_from_payload(key, write.payload)
+        return None if entry.is_expired else entry
+    
+    async def _flush_write_behind(self, batch: Dict[str, PendingWrite]):
+        """Escribir un lote diferido: un pipeline a L2 (con tags) y un lote a L3"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        queued = False
+        for key, write in batch.items():
+            if write.to_l2:
+                pipe.setex(f"robertai:l2:{key}", write.ttl, write.payload)
+                self.instrumentation.record_write("l2", len(write.payload))
+                if key in self.replicated_keys:
+                    self._queue_replica_writes(pipe, key, write.payload, write.ttl)
+                queued = True
+            if write.tags:
+                self._queue_tag_writes(pipe, key, write.tags, write.ttl)
+                queued = True
+        if queued:
+            await pipe.execute()
+        
+        l3_payloads = {key: (write.payload, write.ttl) for key, write in batch.items() if write.to_l3}
+        if l3_payloads and not await self._set_many_l3(l3_payloads):
+            raise RuntimeError(f"L3 batch write of {len(l3_payloads)} keys failed")
+        
+        # Recién ahora los demás nodos pueden releer el valor nuevo
+        self._publish_invalidation(batch.keys())
+    
+    async def _get_l2(self, key: str) -> Optional[bytes]:
+        """Leer de L2; las claves replicadas reparten lecturas entre sus copias"""
+        if key in self.replicated_keys:
+            replica = random.randrange(self.hot_key_replicas + 1)
+            if replica:
+                value = await self.redis_client.get(self._replica_key(key, replica))
+                if value:
+                    return value
+        return await self.redis_client.get(f"robertai:l2:{key}")
+    
+    async def _set_l3(self, key: str, payload: bytes, ttl: int) -> bool:
         """Guardar en L3 (persistente)"""
         try:
-            cache_data = {
-                "value": value,
-                "compressed": compressed,
-                "ttl": ttl,
-                "created_at": time.time()
-            }
-            
-            serialized_data = msgpack.packb(cache_data)
-            await self.persistent_client.setex(f"robertai:l3:{key}", ttl * 2, serialized_data)  # TTL extendido
+            if self.l3_store is not None:
+                self.l3_store.put(key, payload, ttl * 2)  # TTL extendido
+            else:
+                await self.persistent_client.setex(f"robertai:l3:{key}", ttl * 2, payload)
+            self.instrumentation.record_write("l3", len(payload))
             
             return True
             
@@ -572,45 +1206,772 @@ class MassiveCacheStrategy:
             logger.error(f"Error setting L3 cache: {e}")
             return False
     
-    async def _promote_to_l1(self, key: str, value: Any, compressed: bool):
-        """Promover entrada a L1"""
-        size_bytes = len(str(value).encode())
-        await self._set_l1(key, value, self.default_ttl, compressed, size_bytes)
+    async def _get_l3(self, key: str) -> Optional[Union[bytes, memoryview]]:
+        """Leer payload de L3; el store en disco devuelve un memoryview sin copiar"""
+        if self.l3_store is not None:
+            return self.l3_store.get(key)
+        return await self.persistent_client.get(f"robertai:l3:{key}")
+    
+    async def _get_many_l3(self, keys: List[str], raise_errors: bool = False) -> Dict[str, CacheEntry]:
+        """Leer varias claves de L3"""
+        if self.l3_store is None:
+            return await self._get_many_from_redis(self.persistent_client, "robertai:l3", keys,
+                                                   raise_errors=raise_errors)
+        
+        found: Dict[str, CacheEntry] = {}
+        for key in keys:
+            payload = self.l3_store.get(key)
+            if payload is None:
+                continue
+            self.instrumentation.record_read("l3", len(payload))
+            try:
+                found[key] = self._entry_from_payload(key, payload)
+            except Exception as e:
+                logger.warning(f"Error deserializing L3 cache for key {key}: {e}")
+        return found
+    
+    async def _set_many_l3(self, payloads: Dict[str, Tuple[bytes, int]]) -> bool:
+        """Escribir varias claves en L3 con TTL extendido"""
+        if self.l3_store is None:
+            return await self._set_many_redis(self.persistent_client, "robertai:l3", payloads, ttl_multiplier=2)
+        
+        try:
+            for key, (payload, ttl) in payloads.items():
+                self.l3_store.put(key, payload, ttl * 2)
+                self.instrumentation.record_write("l3", len(payload))
+            return True
+        except Exception as e:
+            logger.error(f"Error in batch set on L3: {e}")
+            return False
+    
+    async def _delete_l3(self, keys) -> bool:
+        """Eliminar claves de L3"""
+        try:
+            if self.l3_store is not None:
+                for key in keys:
+                    self.l3_store.delete(key)
+            else:
+                pipe = self.persistent_client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.unlink(f"robertai:l3:{key}")
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Error deleting {len(keys)} keys from L3: {e}")
+            return False
+    
+    def _entry_from_payload(self, key: str, payload: bytes) -> CacheEntry:
+        """Reconstruir CacheEntry desde el payload guardado en L2/L3"""
+        decoded = self.codec.decode(payload)
+        return CacheEntry(
+            key=key,
+            value=decoded.value,
+            created_at=decoded.created_at,
+            ttl=decoded.ttl or self.default_ttl,
+            size_bytes=len(payload),
+            soft_ttl=decoded.soft_ttl,
+            delta=decoded.delta
+        )
+    
+    def _encode_entry(self, entry: CacheEntry) -> bytes:
+        """Serializar entrada conservando sus metadatos"""
+        return self.codec.encode(entry.value, entry.created_at, entry.ttl, entry.soft_ttl, entry.delta)
+    
+    async def _get_many_from_redis(self, client, prefix: str, keys: List[str],
+                                   raise_errors: bool = False) -> Dict[str, CacheEntry]:
+        """Leer varias claves de un nivel Redis en un solo pipeline (raise_errors: propagar fallos de Redis)"""
+        found: Dict[str, CacheEntry] = {}
+        redis_keys = [f"{prefix}:{key}" for key in keys]
+        
+        # Un MGET por slot: en cluster el pipeline envía cada grupo a su nodo en paralelo
+        if isinstance(client, RedisCluster):
+            groups = group_by_slot(redis_keys)
+        else:
+            groups = [list(range(len(redis_keys)))]
+        
+        try:
+            pipe = client.pipeline(transaction=False)
+            for group in groups:
+                pipe.mget([redis_keys[index] for index in group])
+            results = await pipe.execute()
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.warning(f"Batch get error on {prefix}: {e}")
+            return found
+        
+        raw_values: List[Optional[bytes]] = [None] * len(keys)
+        for group, values in zip(groups, results):
+            for index, raw in zip(group, values):
+                raw_values[index] = raw
+        
+        level = prefix.rsplit(":", 1)[-1]
+        for key, raw in zip(keys, raw_values):
+            if not raw:
+                continue
+            self.instrumentation.record_read(level, len(raw))
+            try:
+                found[key] = self._entry_from_payload(key, raw)
+            except Exception as e:
+                logger.warning(f"Error deserializing {prefix} cache for key {key}: {e}")
+        
+        return found
+    
+    async def _set_many_redis(self, client, prefix: str, payloads: Dict[str, Tuple[bytes, int]],
+                              ttl_multiplier: int = 1) -> bool:
+        """Escribir varias claves en un nivel Redis en un solo pipeline"""
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, (payload, ttl) in payloads.items():
+                pipe.setex(f"{prefix}:{key}", ttl * ttl_multiplier, payload)
+                if prefix == "robertai:l2" and key in self.replicated_keys:
+                    self._queue_replica_writes(pipe, key, payload, ttl)
+            await pipe.execute()
+            written = sum(len(payload) for payload, _ in payloads.values())
+            self.instrumentation.record_write(prefix.rsplit(":", 1)[-1], written)
+            
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error in batch set on {prefix}: {e}")
+            return False
+    
+    async def _lead_computation(self, key: str, spec: "ComputeSpec") -> Any:
+        """Computar la clave como líder del single-flight"""
+        future = asyncio.get_running_loop().create_future()
+        # Evitar "exception was never retrieved" cuando nadie más espera
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.inflight_computations[key] = future
+        
+        try:
+            if spec.distributed:
+                computed_value = await self._compute_with_lease(key, spec)
+            else:
+                computed_value = await self._compute_and_store(key, spec)
+            future.set_result(computed_value)
+            return computed_value
+        
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        
+        finally:
+            self.inflight_computations.pop(key, None)
+    
+    async def _compute_and_store(self, key: str, spec: "ComputeSpec") -> Any:
+        """Computar valor y guardarlo en cache"""
+        start_time = time.time()
+        computed_value = spec.compute_func()
+        if inspect.isawaitable(computed_value):
+            computed_value = await computed_value
+        
+        self.metrics.computations += 1
+        await self.set(key, computed_value, ttl=spec.ttl, levels=spec.levels,
+                       hard_ttl=spec.hard_ttl, compute_time=time.time() - start_time)
+        
+        return computed_value
+    
+    async def _compute_with_lease(self, key: str, spec: "ComputeSpec") -> Any:
+        """Computar con un lease corto en Redis para que solo un nodo recompute"""
+        lease_key = f"robertai:lease:{key}"
+        token = uuid.uuid4().hex
+        
+        try:
+            acquired = await self.redis_client.set(
+                lease_key, token, nx=True, px=int(self.lease_ttl * 1000)
+            )
+        except Exception as e:
+            logger.warning(f"Lease error for key {key}, computing locally: {e}")
+            return await self._compute_and_store(key, spec)
+        
+        if acquired:
+            try:
+                return await self._compute_and_store(key, spec)
+            finally:
+                await self._release_lease(lease_key, token)
+        
+        # Otro nodo tiene el lease: esperar a que publique el valor en L2
+        deadline = time.time() + self.lease_ttl
+        while time.time() < deadline:
+            await asyncio.sleep(0.05)
+            try:
+                if await self.redis_client.exists(f"robertai:l2:{key}"):
+                    self._mark_known([key])  # Sin bus, un tombstone local taparía el valor recién publicado
+                    value = await self.get(key)
+                    if value is not None:
+                        return value
+                elif not await self.redis_client.exists(lease_key):
+                    break  # El lease se liberó sin valor (error en el otro nodo)
+            except Exception as e:
+                logger.warning(f"Error waiting for lease on key {key}: {e}")
+                break
+        
+        return await self._compute_and_store(key, spec)
+    
+    async def _release_lease(self, lease_key: str, token: str):
+        """Liberar el lease solo si todavía nos pertenece"""
+        try:
+            await self.redis_client.eval(RELEASE_LEASE_SCRIPT, 1, lease_key, token)
+        except Exception as e:
+            logger.warning(f"Error releasing lease {lease_key}: {e}")
+    
+    def _should_refresh_early(self, entry: CacheEntry) -> bool:
+        """XFetch: recomputar antes de expirar con probabilidad creciente"""
+        if entry.delta <= 0 or self.early_refresh_beta <= 0:
+            return False
+        
+        expires_at = entry.created_at + (entry.soft_ttl if entry.soft_ttl is not None else entry.ttl)
+        gap = -entry.delta * self.early_refresh_beta * math.log(1.0 - random.random())
+        return time.time() + gap >= expires_at
+    
+    def _schedule_refresh(self, key: str, spec: Optional["ComputeSpec"]):
+        """Lanzar recomputación en background si no hay una en curso"""
+        if spec is None or key in self.inflight_computations:
+            return
+        
+        self.metrics.background_refreshes += 1
+        task = asyncio.create_task(self._refresh_in_background(key, spec))
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+    
+    async def _refresh_in_background(self, key: str, spec: "ComputeSpec"):
+        """Recomputar clave stale sin bloquear a quien la pidió"""
+        try:
+            await self._lead_computation(key, spec)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Background refresh failed for key {key}: {e}")
     
-    async def _promote_to_l2(self, key: str, value: Any, compressed: bool, ttl: int):
-        """Promover entrada a L2"""
-        await self._set_l2(key, value, ttl, compressed)
+    def _remaining_ttls(self, entry: CacheEntry) -> Optional[Tuple[int, Optional[int]]]:
+        """TTL duro y blando que le quedan a la entrada según su payload; None si ya expiró"""
+        now = time.time()
+        ttl = int(entry.created_at + entry.ttl - now)
+        if ttl <= 0:
+            return None
+        
+        soft_ttl = None
+        if entry.soft_ttl is not None:
+            soft_ttl = max(1, int(entry.created_at + entry.soft_ttl - now))
+        return ttl, soft_ttl
     
-    def _update_l1_access_order(self, key: str):
-        """Actualizar orden de acceso para LRU"""
-        if key in self.l1_access_order:
-            self.l1_access_order.remove(key)
-        self.l1_access_order.append(key)
+    async def _promote_to_l1(self, key: str, entry: CacheEntry, source: str):
+        """Promover entrada a L1 si pasa la admisión, con el TTL que le queda"""
+        if entry.is_stale:
+            return  # No promover valores stale; el refresco escribirá el nuevo
+        
+        ttls = self._remaining_ttls(entry)
+        if ttls is None or not self.promotion_gate.should_promote(key):
+            return
+        
+        ttl, soft_ttl = ttls
+        await self._set_l1(key, entry.value, ttl, soft_ttl=soft_ttl,
+                           delta=entry.delta, promoted=True)
+        self.instrumentation.record_promotion(source, "l1")
     
-    async def _remove_from_l1(self, key: str):
-        """Remover entrada de L1"""
+    async def _promote_to_l2(self, key: str, entry: CacheEntry):
+        """Promover entrada a L2 sin extender su vida"""
+        ttls = self._remaining_ttls(entry)
+        if ttls is not None and await self._set_l2(key, self._encode_entry(entry), ttls[0]):
+            self.instrumentation.record_promotion("l3", "l2")
+    
+    def _l2_redis_keys(self, key: str) -> List[str]:
+        """Todas las claves de Redis que guardan la clave en L2 (valor, réplicas y deltas de contexto)"""
+        redis_keys = [f"robertai:l2:{key}", *self._replica_keys_for(key)]
+        if key.startswith("conversation:"):
+            redis_keys.extend(self._context_redis_keys(key))
+        return redis_keys
+    
+    def _context_redis_keys(self, key: str) -> Tuple[str, str]:
+        """Hash de campos y lista de turnos del contexto (mismo slot por el hash tag del usuario)"""
+        return f"robertai:ctx:{key}", f"robertai:ctx:{key}:turns"
+    
+    def _apply_context_patch(self, context: Dict[str, Any], patch: Dict[str, Any],
+                             turns: List[Any]) -> Dict[str, Any]:
+        """Aplicar el mismo delta que se envió a Redis sobre la copia de L1"""
+        updated = dict(context)
+        for field_name, value in patch.items():
+            if value is None:
+                updated.pop(field_name, None)
+            else:
+                updated[field_name] = value
+        
+        history = updated.get(CONTEXT_HISTORY_FIELD)
+        if turns:
+            history = list(history or []) + list(turns)
+        if history is not None:
+            updated[CONTEXT_HISTORY_FIELD] = list(history)[-self.max_context_turns:]
+        return updated
+    
+    async def _read_context(self, key: str) -> Optional[Dict[str, Any]]:
+        """Armar el contexto desde el hash de campos y la lista de turnos de L2"""
+        hash_key, turns_key = self._context_redis_keys(key)
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hgetall(hash_key)
+            pipe.lrange(turns_key, 0, -1)
+            pipe.pttl(hash_key)
+            fields, turns, pttl = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error reading conversation context {key}: {e}")
+            return None
+        
+        if not fields:
+            return None
+        
+        context: Dict[str, Any] = {}
+        for field_name, raw in fields.items():
+            field_name = field_name.decode() if isinstance(field_name, bytes) else field_name
+            if field_name.startswith("__"):
+                continue  # Metadatos del hash
+            context[field_name] = self.codec.decode(raw).value
+        if turns:
+            context[CONTEXT_HISTORY_FIELD] = [self.codec.decode(raw).value for raw in turns]
+        
+        self.metrics.total_requests += 1
+        self.metrics.hits += 1
+        self.metrics.l2_hits += 1
+        
+        ttl = pttl // 1000 if pttl and pttl > 0 else self.default_ttl
+        if ttl > 0:
+            await self._set_l1(key, context, ttl)
+        return context
+    
+    async def _write_context(self, user_id: str, ttl: int, patch: Optional[Dict[str, Any]] = None,
+                             turns: Optional[List[Any]] = None, replace: bool = False) -> bool:
+        """Enviar a L2 solo los campos y turnos que cambian, en un pipeline al slot del usuario
+        
+        No pasa por el write-behind: el buffer coalesce payloads completos por
+        clave y estos deltas (HSET/RPUSH) no se pueden reemplazar uno por otro.
+        """
+        key = user_key("conversation", user_id)
+        hash_key, turns_key = self._context_redis_keys(key)
+        patch = dict(patch or {})
+        turns = list(turns or [])
+        delta = dict(patch)
+        history = patch.pop(CONTEXT_HISTORY_FIELD, None)
+        
+        fields = {field_name: self.codec.encode(value, ttl=ttl)
+                  for field_name, value in patch.items() if value is not None}
+        removed = [field_name for field_name, value in patch.items() if value is None]
+        pushed = [self.codec.encode(turn, ttl=ttl) for turn in list(history or [])[-self.max_context_turns:] + turns]
+        bytes_written = (sum(len(name) + len(value) for name, value in fields.items())
+                         + sum(len(name) for name in removed) + sum(len(value) for value in pushed))
+        
+        self._mark_known([key])
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.exists(hash_key)
+            if replace:
+                pipe.unlink(hash_key, turns_key)
+            elif history is not None:
+                pipe.unlink(turns_key)
+            # __updated_at mantiene vivo el hash aunque el delta solo traiga turnos
+            pipe.hset(hash_key, mapping={**fields, "__updated_at": str(time.time())})
+            if removed:
+                pipe.hdel(hash_key, *removed)
+            if pushed:
+                pipe.rpush(turns_key, *pushed)
+                pipe.ltrim(turns_key, -self.max_context_turns, -1)  # Tope aplicado en el servidor
+            turn_count_index = len(pipe)
+            pipe.hincrby(hash_key, "__turns", len(turns))
+            pipe.expire(hash_key, ttl)
+            pipe.expire(turns_key, ttl)
+            self._queue_tag_writes(pipe, key, ["conversation", self._user_tag(user_id)], ttl)
+            results = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error writing conversation context for {key}: {e}")
+            return False
+        
+        existed, total_turns = results[0], results[turn_count_index]
+        entry = self.l1_cache.get(key)
+        current = entry.value if entry is not None and not entry.is_expired else None
+        
+        if not existed and not replace:
+            # Primer delta sobre un contexto completo (L1, blob anterior o checkpoint): sembrar el hash
+            base = current if current is not None else await self.get(key)
+            if base:
+                merged = self._apply_context_patch(base, delta, turns)
+                return await self._write_context(user_id, ttl, patch=merged, replace=True)
+        
+        if replace:
+            self.metrics.context_full_writes += 1
+            self.metrics.context_full_bytes_written += bytes_written
+        else:
+            self.metrics.context_writes += 1
+            self.metrics.context_bytes_written += bytes_written
+        self.metrics.last_context_write_bytes = bytes_written
+        
+        # L1 aplica el mismo delta; los demás nodos descartan su copia
+        if replace:
+            current = self._apply_context_patch({}, delta, turns)
+        elif current is not None:
+            current = self._apply_context_patch(current, delta, turns)
+        if current is not None:
+            await self._set_l1(key, current, ttl)
+            self._index_l1_tags(key, ["conversation", self._user_tag(user_id)])
+        self._publish_invalidation([key])
+        
+        # Checkpoint del contexto completo en L3 cada context_checkpoint_turns turnos
+        if replace or (turns and total_turns % self.context_checkpoint_turns < len(turns)):
+            full_context = current if current is not None else await self._read_context(key)
+            if full_context is not None:
+                await self._set_l3(key, self.codec.encode(full_context, time.time(), ttl), ttl)
+                self.metrics.context_checkpoints += 1
+        
+        return True
+    
+    def _user_tag(self, user_id: str) -> str:
+        # Mismo hash tag que las claves del usuario: el índice del tag queda en su slot
+        return f"user:{user_hash_tag(user_id)}"
+    
+    def _queue_tag_writes(self, pipe, key: str, tags: List[str], ttl: int):
+        """Agregar la clave al set de cada tag dentro de un pipeline"""
+        for tag in tags:
+            tag_key = f"robertai:tag:{tag}"
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, max(ttl * 2, self.tag_index_ttl))
+    
+    async def _add_tags(self, tagged_keys: Dict[str, Tuple[List[str], int]]) -> bool:
+        """Registrar tags en L2 para claves que no se escriben en L2"""
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, (tags, ttl) in tagged_keys.items():
+                self._queue_tag_writes(pipe, key, tags, ttl)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error indexing cache tags: {e}")
+            return False
+    
+    def _index_l1_tags(self, key: str, tags: Optional[List[str]]):
+        """Mantener el índice inverso tag -> claves de L1"""
+        if not tags or key not in self.l1_cache:
+            return
+        self.l1_key_tags.setdefault(key, set()).update(tags)
+        for tag in tags:
+            self.l1_tag_index.setdefault(tag, set()).add(key)
+    
+    def _unindex_l1_tags(self, key: str):
+        for tag in self.l1_key_tags.pop(key, ()):
+            tagged = self.l1_tag_index.get(tag)
+            if tagged is not None:
+                tagged.discard(key)
+                if not tagged:
+                    del self.l1_tag_index[tag]
+    
+    def _publish_invalidation(self, keys):
+        """Avisar a los demás nodos que descarten estas claves de su L1"""
+        if self.invalidation_bus:
+            self.invalidation_bus.publish(keys)
+    
+    async def _on_remote_invalidation(self, keys: List[str]):
+        """Aplicar invalidaciones recibidas de otro nodo"""
+        self._mark_known(keys)  # Llegan por sets remotos: la clave puede existir ahora
+        for key in keys:
+            if key in self.l1_cache:
+                await self._remove_from_l1(key)
+    
+    def _known_miss(self, key: str) -> bool:
+        """Miss que se resuelve sin ir a Redis: tombstone vigente o ausente del Bloom
+        
+        El Bloom solo descarta claves después de la primera sincronización:
+        antes no conoce las escritas por otros nodos ni las previas al filtro.
+        """
+        if self.negative_cache is not None and self.negative_cache.contains(key):
+            self.metrics.negative_hits += 1
+            return True
+        namespace = key.split(":", 1)[0]
+        bloom = self.bloom_filters.get(namespace)
+        if bloom is not None and namespace in self.bloom_ready and key not in bloom:
+            self.metrics.bloom_rejections += 1
+            return True
+        return False
+    
+    def _abort_probes(self, keys: List[str]):
+        """Cerrar búsquedas en curso sin dejar tombstone"""
+        for key in keys:
+            self.negative_cache.abort(key)
+    
+    def _mark_known(self, keys):
+        """La clave existe (o va a existir): borrar su tombstone y sumarla al Bloom"""
+        for key in keys:
+            if self.negative_cache is not None:
+                self.negative_cache.discard(key)
+            bloom = self.bloom_filters.get(key.split(":", 1)[0])
+            if bloom is not None:
+                bloom.add(key)
+    
+    async def _sync_bloom_filters(self):
+        """Combinar los filtros de Bloom con el bitmap compartido en Redis (BITOP OR)"""
+        self.last_bloom_sync = time.time()
+        for namespace, bloom in self.bloom_filters.items():
+            # El tamaño va en la clave: filtros con otra configuración no se mezclan
+            bloom_key = f"robertai:bloom:{{{namespace}}}:{bloom.num_bits}"
+            merge_key = f"{bloom_key}:merge:{uuid.uuid4().hex}"
+            dirty, bloom.dirty = bloom.dirty, False
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                if dirty:
+                    pipe.set(merge_key, bytes(bloom.bits), ex=60)
+                    pipe.bitop("OR", bloom_key, bloom_key, merge_key)
+                    pipe.delete(merge_key)
+                pipe.get(bloom_key)
+                pipe.exists(f"{bloom_key}:seeded")
+                results = await pipe.execute()
+                bloom.merge(results[-2])
+                if results[-1]:
+                    self.bloom_ready.add(namespace)
+                elif namespace not in self.bloom_ready:
+                    await self._seed_bloom_filter(namespace, bloom, bloom_key)
+            except Exception as e:
+                bloom.dirty = bloom.dirty or dirty
+                logger.warning(f"Error syncing Bloom filter for {namespace}: {e}")
+    
+    async def _seed_bloom_filter(self, namespace: str, bloom: BloomFilter, bloom_key: str):
+        """Primer nodo con filtro para el namespace: sumar las claves que ya existen en L2/L3"""
+        sources = [(self.redis_client, "robertai:l2")]
+        if self.persistent_client is not None:
+            sources.append((self.persistent_client, "robertai:l3"))
+        seeded = 0
+        for client, prefix in sources:
+            async for raw_key in client.scan_iter(match=f"{prefix}:{namespace}:*", count=1000):
+                if isinstance(raw_key, bytes):
+                    raw_key = raw_key.decode()
+                bloom.add(raw_key[len(prefix) + 1:])
+                seeded += 1
+        
+        # Las claves sembradas y la marca salen juntas: otro nodo no confía en un bitmap a medias
+        merge_key = f"{bloom_key}:merge:{uuid.uuid4().hex}"
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.set(merge_key, bytes(bloom.bits), ex=60)
+        pipe.bitop("OR", bloom_key, bloom_key, merge_key)
+        pipe.delete(merge_key)
+        pipe.set(f"{bloom_key}:seeded", 1)
+        await pipe.execute()
+        self.bloom_ready.add(namespace)
+        logger.info(f"Seeded Bloom filter for {namespace} with {seeded} existing keys")
+    
+    def _add_l3_keys_to_bloom(self):
+        """El L3 en disco es de este nodo: sus claves no están en el bitmap de otros"""
+        if self.l3_store is None:
+            return
+        for key in self.l3_store.keys():
+            bloom = self.bloom_filters.get(key.split(":", 1)[0])
+            if bloom is not None:
+                bloom.add(key)
+    
+    def _get_context_write_stats(self) -> Dict[str, Any]:
+        """Bytes enviados a Redis por escritura de contexto (deltas frente a reemplazos completos)"""
+        return {
+            "delta_writes": self.metrics.context_writes,
+            "delta_bytes_written": self.metrics.context_bytes_written,
+            "avg_bytes_per_delta": self.metrics.context_bytes_written / self.metrics.context_writes if self.metrics.context_writes else 0.0,
+            "last_write_bytes": self.metrics.last_context_write_bytes,
+            "full_writes": self.metrics.context_full_writes,
+            "avg_bytes_per_full_write": self.metrics.context_full_bytes_written / self.metrics.context_full_writes if self.metrics.context_full_writes else 0.0,
+            "checkpoints": self.metrics.context_checkpoints,
+            "max_turns": self.max_context_turns
+        }
+    
+    def _get_instrumentation_stats(self) -> Dict[str, Any]:
+        stats = self.instrumentation.get_stats()
+        codec_stats = getattr(self.codec, "get_stats", None)
+        stats["codec"] = codec_stats() if codec_stats else None
+        return stats
+    
+    def _get_negative_cache_stats(self) -> Dict[str, Any]:
+        return {
+            "negative_hits": self.metrics.negative_hits,
+            "bloom_rejections": self.metrics.bloom_rejections,
+            "tombstones": self.negative_cache.get_stats() if self.negative_cache is not None else None,
+            "bloom_filters": {namespace: bloom.get_stats() for namespace, bloom in self.bloom_filters.items()}
+        }
+    
+    async def _remove_from_l1(self, key: str, reason: str = EVICTION_INVALIDATED):
+        """Remover entrada de L1 registrando el motivo"""
+        namespace = self.memory_governor.namespace_of(key)
         if key in self.l1_cache:
             entry = self.l1_cache.pop(key)
+            self.instrumentation.record_eviction(reason, namespace)
             self.l1_size_bytes -= entry.size_bytes
+            if entry.promoted and entry.access_count == 0:
+                self.metrics.wasted_promotions += 1
+            self.memory_governor.release(namespace, entry.size_bytes)
+        
+        self.l1_policies[namespace].remove(key)
+        self.l1_expiry_wheel.cancel(key)
+        self._unindex_l1_tags(key)
+    
+    def _pin_l1(self, key: str):
+        """Sacar la clave del orden de expulsión mientras siga caliente"""
+        if key not in self.pinned_keys:
+            self.pinned_keys.add(key)
+            self._l1_policy(key).remove(key)
+    
+    def _unpin_l1(self, key: str):
+        self.pinned_keys.discard(key)
+        if key in self.l1_cache:
+            self._l1_policy(key).record_insert(key)
+    
+    def _replica_key(self, key: str, replica: int) -> str:
+        # Hash tag propio por réplica para que caigan en slots distintos del cluster
+        digest = hashlib.blake2b(key.encode(), digest_size=4).hexdigest()
+        return f"robertai:l2:hot:{{r{replica}-{digest}}}:{key}"
+    
+    def _replica_keys_for(self, key: str) -> List[str]:
+        if key not in self.replicated_keys:
+            return []
+        return [self._replica_key(key, i) for i in range(1, self.hot_key_replicas + 1)]
+    
+    def _queue_replica_writes(self, pipe, key: str, payload: bytes, ttl: int):
+        # TTL corto: si la clave deja de estar caliente, las copias desaparecen solas
+        replica_ttl_ms = max(1, int(min(ttl, self.hot_key_refresh_interval * 3) * 1000))
+        for i in range(1, self.hot_key_replicas + 1):
+            pipe.psetex(self._replica_key(key, i), replica_ttl_ms, payload)
+        self.instrumentation.record_write("l2", len(payload) * self.hot_key_replicas)
+    
+    async def _share_hot_keys(self) -> List[str]:
+        """Sumar lecturas locales del top-K en Redis y devolver el top-K global"""
+        detector = self.hot_key_detector
+        bucket = int(time.time() // detector.decay_interval)
+        current_key = f"robertai:hotkeys:{bucket}"
+        previous_key = f"robertai:hotkeys:{bucket - 1}"
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key, count in detector.drain_window_counts().items():
+            pipe.zincrby(current_key, count, key)
+        pipe.expire(current_key, int(detector.decay_interval * 3))
+        pipe.zrevrange(current_key, 0, detector.k - 1, withscores=True)
+        pipe.zrevrange(previous_key, 0, detector.k - 1, withscores=True)
+        results = await pipe.execute()
+        
+        # Ventana actual completa + la anterior a medias (mismo decaimiento que el sketch local)
+        scores: Dict[str, float] = {}
+        for weight, ranked in ((1.0, results[-2]), (0.5, results[-1])):
+            for member, score in ranked:
+                member = member.decode() if isinstance(member, bytes) else member
+                scores[member] = scores.get(member, 0.0) + score * weight
+        
+        ranked_keys = sorted(scores, key=scores.get, reverse=True)[:detector.k]
+        return [key for key in ranked_keys if scores[key] >= detector.min_count]
+    
+    async def _refresh_hot_keys(self):
+        """Fijar en L1 el top-K caliente y refrescar su valor desde L2"""
+        hot = set(self.hot_key_detector.hot_keys())
+        try:
+            hot.update(await self._share_hot_keys())
+        except Exception as e:
+            logger.warning(f"Error sharing hot keys: {e}")
+        
+        for key in self.pinned_keys - hot:
+            self._unpin_l1(key)
+        
+        if not hot:
+            if self.hot_key_replicas:
+                await self._sync_replicated_keys({})
+            return
+        
+        entries = await self._get_many_from_redis(self.redis_client, "robertai:l2", list(hot))
+        for key, entry in entries.items():
+            ttls = self._remaining_ttls(entry)
+            if ttls is None:
+                continue
+            remaining, soft_ttl = ttls
             
-        if key in self.l1_access_order:
-            self.l1_access_order.remove(key)
+            self._pin_l1(key)
+            await self._set_l1(key, entry.value, remaining, soft_ttl=soft_ttl, delta=entry.delta)
+            self.metrics.hot_key_refreshes += 1
+        
+        # Claves solo en L1 (sin copia en L2) siguen fijadas mientras existan
+        for key in hot - set(entries):
+            if key in self.l1_cache:
+                self._pin_l1(key)
+        
+        if self.hot_key_replicas:
+            await self._sync_replicated_keys(entries)
+    
+    async def _sync_replicated_keys(self, entries: Dict[str, CacheEntry]):
+        """Anunciar en Redis las claves calientes de este nodo y traer las de todos
+        
+        Cualquier nodo que escriba o borre una clave anunciada actualiza sus
+        réplicas, aunque él no la vea caliente. Las copias se escriben recién
+        cuando la clave ya estaba anunciada en el ciclo anterior: para entonces
+        los demás nodos ya la conocen.
+        """
+        now = time.time()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(REPLICATED_KEYS_KEY, "-inf", now)
+        pipe.zrange(REPLICATED_KEYS_KEY, 0, -1)
+        if entries:
+            replicas_until = now + self.hot_key_refresh_interval * 3  # Mismo TTL que las copias
+            pipe.zadd(REPLICATED_KEYS_KEY, {key: replicas_until for key in entries})
+            pipe.expire(REPLICATED_KEYS_KEY, int(self.hot_key_refresh_interval * 3) + 1)
+        results = await pipe.execute()
+        
+        announced = {member.decode() if isinstance(member, bytes) else member for member in results[1]}
+        self.replicated_keys = announced | set(entries)
+        
+        ready = [key for key in entries if key in announced]
+        if not ready:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in ready:
+            entry = entries[key]
+            self._queue_replica_writes(pipe, key, self._encode_entry(entry),
+                                       max(1, int(entry.created_at + entry.ttl - now)))
+        await pipe.execute()
+    
+    async def _hot_key_loop(self):
+        """Loop de detección y refresco de claves calientes"""
+        while True:
+            try:
+                await asyncio.sleep(self.hot_key_refresh_interval)
+                await self._refresh_hot_keys()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in hot key loop: {e}")
+    
+    def _l1_policy(self, key: str) -> L1EvictionEngine:
+        return self.l1_policies[self.memory_governor.namespace_of(key)]
+    
+    async def _evict_namespace_entries(self, namespace: str, incoming_bytes: int):
+        """Expulsar entradas del namespace hasta que la nueva quepa en su cuota"""
+        policy = self.l1_policies[namespace]
+        while self.memory_governor.over_quota(namespace, incoming_bytes):
+            victim_key = policy.select_victim()
+            if victim_key is None:
+                break
+            
+            await self._remove_from_l1(victim_key, EVICTION_NAMESPACE_QUOTA)
+            self.memory_governor.namespaces[namespace].quota_evictions += 1
+            self.metrics.l1_evictions += 1
     
     async def _evict_l1_entries(self):
-        """Expulsar entradas de L1 usando LRU"""
+        """Expulsar entradas de L1 según la política configurada"""
         while (len(self.l1_cache) >= self.max_memory_cache_size * 0.9 or
                self.l1_size_bytes >= self.max_memory_size_bytes * 0.9):
             
-            if not self.l1_access_order:
+            # El namespace más cargado respecto a su cuota cede primero
+            namespace = self.memory_governor.most_over_quota(self.l1_policies)
+            if namespace is None:
                 break
-                
-            # Remover entrada menos recientemente usada
-            lru_key = self.l1_access_order[0]
-            await self._remove_from_l1(lru_key)
+            
+            victim_key = self.l1_policies[namespace].select_victim()
+            if victim_key is None:
+                break
+            
+            await self._remove_from_l1(victim_key, EVICTION_CAPACITY)
+            self.metrics.l1_evictions += 1
     
-    def _update_response_time(self, start_time: float):
-        """Actualizar tiempo de respuesta promedio"""
-        response_time = time.time() - start_time
+    def _update_response_time(self, start_time: float, level: str, namespace: str):
+        """Actualizar tiempo de respuesta promedio y el histograma del nivel/namespace"""
+        response_time = time.perf_counter() - start_time
+        self.instrumentation.record_latency(level, namespace, response_time)
         if self.metrics.avg_response_time == 0:
             self.metrics.avg_response_time = response_time
         else:
@@ -637,12 +1998,19 @@ class MassiveCacheStrategy:
             }
         }
         
+        levels = [CacheLevel.L1_MEMORY, CacheLevel.L2_REDIS]
         for key, response in common_responses.items():
+            cache_key = f"common_response:{key}"
+            
+            # Al quedar stale se re-siembran en background en vez de expirar
+            self.register_refresher(cache_key, lambda response=response: response,
+                                    ttl=86400, levels=levels, hard_ttl=2 * 86400)
             await self.set(
-                f"common_response:{key}",
+                cache_key,
                 response,
                 ttl=86400,  # 24 horas
-                levels=[CacheLevel.L1_MEMORY, CacheLevel.L2_REDIS]
+                levels=levels,
+                hard_ttl=2 * 86400
             )
         
         logger.info(f"Cache warmed up with {len(common_responses)} common responses")
@@ -651,13 +2019,111 @@ class MassiveCacheStrategy:
         """Loop de limpieza periódica"""
         while True:
             try:
-                await asyncio.sleep(300)  # Cada 5 minutos
+                await asyncio.sleep(self.expiry_granularity)
                 await self._cleanup_expired_entries()
+                if self.negative_cache is not None:
+                    self.negative_cache.expire()
+                if self.bloom_filters and time.time() - self.last_bloom_sync >= self.bloom_sync_interval:
+                    await self._sync_bloom_filters()
+                if self.l3_store is not None and self.l3_store.needs_compaction():
+                    reclaimed = await self._compact_l3()
+                    logger.debug(f"L3 compaction reclaimed {reclaimed} bytes")
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Error in cleanup loop: {e}")
     
+    async def _compact_l3(self, record_budget: int = 512) -> int:
+        """Compactar un segmento del L3 en disco por tramos, cediendo el event loop entre tramos"""
+        reclaimed = self.l3_store.compact_step(record_budget)
+        while self.l3_store.compacting:
+            await asyncio.sleep(0)
+            reclaimed += self.l3_store.compact_step(record_budget)
+        return reclaimed
+    
+    async def _snapshot_loop(self):
+        """Loop de snapshots periódicos del L1"""
+        while True:
+            try:
+                await asyncio.sleep(self.snapshot_interval)
+                await self._save_l1_snapshot()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in snapshot loop: {e}")
+    
+    async def _save_l1_snapshot(self) -> int:
+        """Guardar las entradas más calientes de L1 hasta snapshot_max_bytes"""
+        start_time = time.time()
+        
+        # Fijadas primero, luego por lecturas y recencia; así el tope de bytes recorta las frías
+        ranked = sorted(
+            (entry for entry in self.l1_cache.values() if not entry.is_expired),
+            key=lambda entry: (entry.key in self.pinned_keys, entry.access_count, entry.last_access),
+            reverse=True
+        )
+        
+        records: List[Tuple[str, bytes]] = []
+        total_bytes = 0
+        for entry in ranked:
+            try:
+                payload = self._encode_entry(entry)  # Guarda created_at y TTL: al recargar se usa lo que queda
+            except CodecError:
+                continue  # Valor solo de L1 que el codec no soporta
+            if total_bytes + len(payload) > self.snapshot_max_bytes:
+                break
+            records.append((entry.key, payload))
+            total_bytes += len(payload)
+        
+        try:
+            # La escritura a disco (con fsync) no bloquea el event loop
+            count, size = await asyncio.to_thread(write_snapshot, self.snapshot_path, records)
+        except OSError as e:
+            logger.error(f"Failed to write L1 snapshot to {self.snapshot_path}: {e}")
+            return 0
+        
+        self.snapshot_stats.update({
+            "last_saved_entries": count,
+            "last_saved_bytes": size,
+            "last_save_ms": (time.time() - start_time) * 1000,
+            "last_saved_at": time.time()
+        })
+        logger.debug(f"L1 snapshot saved: {count} entries, {size} bytes")
+        return count
+    
+    async def _load_l1_snapshot(self) -> int:
+        """Recargar L1 desde el snapshot mapeado en memoria con los TTL restantes"""
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        
+        start_time = time.time()
+        loaded = 0
+        try:
+            with open_snapshot(self.snapshot_path) as (written_at, records):
+                if time.time() - written_at > self.snapshot_max_age:
+                    logger.info(f"Ignoring L1 snapshot older than {self.snapshot_max_age}s")
+                    return 0
+                
+                # De la más fría a la más caliente para que las calientes queden al final del orden de expulsión
+                for key, payload in reversed(records):
+                    entry = self._entry_from_payload(key, payload)
+                    ttls = self._remaining_ttls(entry)
+                    if ttls is None:
+                        continue
+                    ttl, soft_ttl = ttls
+                    if await self._set_l1(key, entry.value, ttl, soft_ttl=soft_ttl, delta=entry.delta):
+                        loaded += 1
+        except (OSError, SnapshotError) as e:
+            logger.warning(f"Could not load L1 snapshot {self.snapshot_path}: {e}")
+            return 0
+        
+        self.snapshot_stats.update({
+            "last_loaded_entries": loaded,
+            "last_load_ms": (time.time() - start_time) * 1000
+        })
+        logger.info(f"L1 restored {loaded} entries from snapshot")
+        return loaded
+    
     async def _metrics_loop(self):
         """Loop de métricas periódicas"""
         while True:
@@ -671,56 +2137,94 @@ class MassiveCacheStrategy:
                 logger.error(f"Error in metrics loop: {e}")
     
     async def _cleanup_expired_entries(self):
-        """Limpiar entradas expiradas de L1"""
-        current_time = time.time()
-        expired_keys = []
-        
-        for key, entry in self.l1_cache.items():
-            if entry.is_expired:
-                expired_keys.append(key)
+        """Reclamar entradas de L1 que vencieron desde el último tick"""
+        now = time.time()
+        expired_keys = self.l1_expiry_wheel.advance(now)
         
+        reclaimed_bytes = 0
         for key in expired_keys:
-            await self._remove_from_l1(key)
+            entry = self.l1_cache.get(key)
+            if entry is None:
+                continue
+            
+            # Tiempo que la entrada ocupó memoria ya expirada
+            lag = max(0.0, now - (entry.created_at + entry.ttl))
+            self.metrics.dead_byte_seconds += entry.size_bytes * lag
+            self.metrics.max_expiry_lag = max(self.metrics.max_expiry_lag, lag)
+            reclaimed_bytes += entry.size_bytes
+            
+            await self._remove_from_l1(key, EVICTION_EXPIRED)
         
         if expired_keys:
-            logger.info(f"Cleaned up {len(expired_keys)} expired L1 cache entries")
+            self.metrics.expired_entries_reclaimed += len(expired_keys)
+            self.metrics.expired_bytes_reclaimed += reclaimed_bytes
+            logger.debug(f"Reclaimed {len(expired_keys)} expired L1 entries ({reclaimed_bytes} bytes)")
+    
+    def _get_promotion_stats(self) -> Dict[str, Any]:
+        """Efectividad de la política de promoción: admisión, hit rate y churn de L1"""
+        gate = self.promotion_gate
+        remote_reads = gate.promoted + gate.rejected
+        return {
+            "policy": gate.policy.value,
+            "min_hits": gate.min_hits,
+            "promoted": gate.promoted,
+            "rejected": gate.rejected,
+            "admission_rate": gate.promoted / remote_reads if remote_reads else 0.0,
+            "l1_hit_rate": self.metrics.l1_hit_rate,
+            "l1_insertions": self.metrics.l1_insertions,
+            "l1_evictions": self.metrics.l1_evictions,
+            "churn_rate": self.metrics.l1_evictions / self.metrics.l1_insertions if self.metrics.l1_insertions else 0.0,
+            "wasted_promotions": self.metrics.wasted_promotions,
+            "wasted_promotion_rate": self.metrics.wasted_promotions / gate.promoted if gate.promoted else 0.0
+        }
+    
+    def _get_l1_memory_footprint(self) -> Dict[str, Any]:
+        """Memoria de L1 y datos muertos (expirados aún retenidos)"""
+        uptime = max(time.time() - self.started_at, 1e-9)
+        return {
+            "pending_expirations": len(self.l1_expiry_wheel),
+            "expired_entries_reclaimed": self.metrics.expired_entries_reclaimed,
+            "expired_bytes_reclaimed": self.metrics.expired_bytes_reclaimed,
+            "avg_dead_bytes": self.metrics.dead_byte_seconds / uptime,
+            "max_expiry_lag_ms": self.metrics.max_expiry_lag * 1000,
+            **self.memory_governor.get_stats()
+        }
 
 # Singleton instance
 massive_cache = MassiveCacheStrategy()
 
 # Funciones de utilidad
 async def get_or_compute(key: str, compute_func, ttl: int = 3600, 
-                        levels: List[CacheLevel] = None) -> Any:
-    """Obtener del cache o computar si no existe"""
-    
-    # Intentar obtener del cache
-    cached_value = await massive_cache.get(key)
-    if cached_value is not None:
-        return cached_value
-    
-    # Computar valor
-    computed_value = await compute_func() if asyncio.iscoroutinefunction(compute_func) else compute_func()
-    
-    # Guardar en cache
-    await massive_cache.set(key, computed_value, ttl=ttl, levels=levels)
-    
-    return computed_value
+                        levels: List[CacheLevel] = None, distributed: bool = False,
+                        hard_ttl: Optional[int] = None) -> Any:
+    """Obtener del cache o computar si no existe (una computación por clave)"""
+    return await massive_cache.get_or_compute(
+        key, compute_func, ttl=ttl, levels=levels, distributed=distributed, hard_ttl=hard_ttl
+    )
 
 # Decorador para cache automático
-def cache_result(ttl: int = 3600, levels: List[CacheLevel] = None):
-    """Decorador para cachear automáticamente resultados de funciones"""
+def cache_result(ttl: int = 3600, levels: List[CacheLevel] = None, distributed: bool = False,
+                 hard_ttl: Optional[int] = None, key_template: Optional[str] = None,
+                 ignore_args: Tuple[str, ...] = ()):
+    """Decorador para cachear automáticamente resultados de funciones
+    
+    La clave sale del hash estructural de los argumentos normalizados por la
+    firma; key_template (p. ej. "user:{user_id}") la arma con los argumentos.
+    """
     def decorator(func):
+        key_builder = FunctionKeyBuilder(func, template=key_template, ignore=ignore_args)
+        
         async def wrapper(*args, **kwargs):
             # Crear clave de cache basada en función y argumentos
-            func_name = func.__name__
-            args_str = str(args) + str(sorted(kwargs.items()))
-            cache_key = f"func:{func_name}:{hashlib.md5(args_str.encode()).hexdigest()}"
+            cache_key = key_builder.build(args, kwargs)
             
             return await get_or_compute(
                 cache_key,
                 lambda: func(*args, **kwargs),
                 ttl=ttl,
-                levels=levels
+                levels=levels,
+                distributed=distributed,
+                hard_ttl=hard_ttl
             )
         
         return wrapper
@@ -17,7 +17,11 @@ from redis.asyncio import Redis
 import uuid
 import msgpack
 from concurrent.futures import ThreadPoolExecutor
-import heapq
+
+from queue_dispatch import WAIT_FOR_RELEASE, FairLanes, ReadyQueue
+from queue_rate_limit import GCRARateLimiter, RateLimit, RateLimitPolicy, TokenBucketLimiter
+from queue_retry import RetryPolicy, RetryScheduler
+from queue_scheduler import ScheduledDelivery
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -47,6 +51,35 @@ class ProcessingStatus(Enum):
     RETRY = "retry"
     DEAD_LETTER = "dead_letter"
 
+# Token bucket por tipo de mensaje (tokens por segundo, ráfaga); None = sin límite
+DEFAULT_RATE_LIMITS: Dict[MessageType, Optional[RateLimit]] = {
+    MessageType.TEXT: RateLimit(rate=1.0, burst=5.0),
+    MessageType.INTERACTIVE: RateLimit(rate=2.0, burst=5.0),
+    MessageType.TEMPLATE: RateLimit(rate=1.0, burst=5.0),
+    MessageType.IMAGE: RateLimit(rate=0.2, burst=3.0),
+    MessageType.AUDIO: RateLimit(rate=0.2, burst=3.0),
+    MessageType.DOCUMENT: RateLimit(rate=0.2, burst=3.0),
+    MessageType.VIDEO: RateLimit(rate=0.1, burst=2.0),
+    MessageType.SYSTEM: None
+}
+
+# Multiplicador de ráfaga y recarga según metadata["user_tier"]
+DEFAULT_TIER_MULTIPLIERS = {
+    "free": 1.0,
+    "premium": 3.0,
+    "enterprise": 10.0
+}
+
+# Backoff de reintentos por tipo de mensaje; el resto usa RetryPolicy() (2s, 4s, 8s... hasta 60s)
+DEFAULT_RETRY_POLICIES: Dict[MessageType, RetryPolicy] = {
+    MessageType.INTERACTIVE: RetryPolicy(base_delay=0.5, max_delay=10.0),
+    MessageType.SYSTEM: RetryPolicy(base_delay=0.5, max_delay=10.0),
+    MessageType.IMAGE: RetryPolicy(base_delay=5.0, max_delay=300.0),
+    MessageType.AUDIO: RetryPolicy(base_delay=5.0, max_delay=300.0),
+    MessageType.VIDEO: RetryPolicy(base_delay=10.0, max_delay=600.0),
+    MessageType.DOCUMENT: RetryPolicy(base_delay=5.0, max_delay=300.0)
+}
+
 @dataclass
 class QueuedMessage:
     """Mensaje en cola con metadatos completos"""
@@ -121,7 +154,12 @@ class MassiveQueueProcessor:
                  redis_url: str = "redis://localhost:6379",
                  max_workers: int = 100,
                  max_concurrent_per_user: int = 3,
-                 batch_size: int = 50):
+                 batch_size: int = 50,
+                 max_ready_messages: int = 100000,  # Tope en memoria; enqueue_message espera lugar
+                 rate_limits: Optional[Dict[MessageType, Optional[RateLimit]]] = None,
+                 tier_multipliers: Optional[Dict[str, float]] = None,
+                 distributed_rate_limit: bool = False,  # GCRA en Redis: el límite vale entre pods
+                 retry_policies: Optional[Dict[MessageType, RetryPolicy]] = None):
         
         self.redis_url = redis_url
         self.max_workers = max_workers
@@ -131,10 +169,11 @@ class MassiveQueueProcessor:
         # Redis clients
         self.redis_client: Optional[Redis] = None
         
-        # Colas en memoria por prioridad
-        self.priority_queues: Dict[MessagePriority, List[QueuedMessage]] = {
-            priority: [] for priority in MessagePriority
-        }
+        # Colas en memoria por prioridad, con un carril por usuario (DRR); los workers
+        # esperan ahí sin polling y un usuario en su límite simplemente no se elige
+        self.ready_queue = ReadyQueue(MessagePriority, max_size=max_ready_messages,
+                                      admit=self._admit_message)
+        self.priority_queues: Dict[MessagePriority, FairLanes] = self.ready_queue.queues
         
         # Control de concurrencia por usuario
         self.user_processing_count: Dict[str, int] = {}
@@ -153,12 +192,28 @@ class MassiveQueueProcessor:
         # Thread pool para procesamiento CPU-intensive
         self.thread_pool = ThreadPoolExecutor(max_workers=20)
         
-        # Colas de retry y dead letter
-        self.retry_queue: List[QueuedMessage] = []
+        # Retries en un heap por hora del próximo intento y dead letter
+        self.retry_queue = RetryScheduler(
+            DEFAULT_RETRY_POLICIES if retry_policies is None else retry_policies
+        )
         self.dead_letter_queue: List[QueuedMessage] = []
         
-        # Control de rate limiting
-        self.rate_limiter = {}  # user_id -> última vez que procesó mensaje
+        # Control de rate limiting: token buckets locales o GCRA compartido en Redis
+        self.rate_limit_policy = RateLimitPolicy(
+            DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits,
+            tier_multipliers=DEFAULT_TIER_MULTIPLIERS if tier_multipliers is None else tier_multipliers
+        )
+        self.rate_limiter = TokenBucketLimiter(self.rate_limit_policy)
+        self.shared_rate_limiter: Optional[GCRARateLimiter] = None
+        if distributed_rate_limit:
+            self.shared_rate_limiter = GCRARateLimiter(self.rate_limit_policy)
+        
+        # Mensajes programados: ZSET en Redis y rueda de tiempo local para los próximos segundos
+        self.scheduled_delivery = ScheduledDelivery(
+            encode=self._pack_scheduled_message,
+            decode=self._unpack_scheduled_message,
+            activate=self._activate_scheduled_messages
+        )
         
         # Tasks de background
         self.monitoring_task: Optional[asyncio.Task] = None
@@ -174,6 +229,9 @@ class MassiveQueueProcessor:
             encoding="utf-8",
             decode_responses=False
         )
+        if self.shared_rate_limiter is not None:
+            self.shared_rate_limiter.redis_client = self.redis_client
+        self.scheduled_delivery.redis_client = self.redis_client
         
         # Registrar procesadores por defecto
         self._register_default_processors()
@@ -181,6 +239,14 @@ class MassiveQueueProcessor:
         # Cargar mensajes persistentes desde Redis
         await self._load_persistent_queues()
         
+        # Mensajes programados con el formato anterior (una clave por mensaje)
+        try:
+            migrated = await self.scheduled_delivery.migrate_legacy_keys()
+            if migrated:
+                logger.info(f"Migrated {migrated} scheduled messages to sorted set")
+        except Exception as e:
+            logger.error(f"Error migrating scheduled messages: {e}")
+        
         logger.info(f"Queue processor initialized with {self.max_workers} workers")
     
     async def start(self):
@@ -232,6 +298,12 @@ class MassiveQueueProcessor:
         all_tasks = self.workers + [t for t in tasks_to_cancel if t]
         await asyncio.gather(*all_tasks, return_exceptions=True)
         
+        # Devolver a Redis los programados reclamados que no llegaron a activarse
+        try:
+            await self.scheduled_delivery.release_pending()
+        except Exception as e:
+            logger.error(f"Error releasing scheduled messages: {e}")
+        
         # Persistir colas pendientes
         await self._persist_queues()
         
@@ -275,8 +347,8 @@ class MassiveQueueProcessor:
         if scheduled_at and scheduled_at > time.time():
             await self._enqueue_scheduled_message(queued_message)
         else:
-            # Encolarlo inmediatamente
-            heapq.heappush(self.priority_queues[priority], queued_message)
+            # Encolarlo inmediatamente; despierta a un worker estacionado
+            await self.ready_queue.put(queued_message)
             
             # Actualizar estadísticas
             self.stats.queue_sizes[priority] = len(self.priority_queues[priority])
@@ -292,11 +364,11 @@ class MassiveQueueProcessor:
     async def get_queue_status(self) -> Dict[str, Any]:
         """Obtener estado actual de las colas"""
         
-        total_pending = sum(len(queue) for queue in self.priority_queues.values())
+        total_pending = self.ready_queue.size
         
         queue_sizes = {}
-        for priority, queue in self.priority_queues.items():
-            queue_sizes[priority.value] = len(queue)
+        for priority, size in self.ready_queue.sizes().items():
+            queue_sizes[priority.value] = size
         
         return {
             "total_pending_messages": total_pending,
@@ -306,6 +378,10 @@ class MassiveQueueProcessor:
             "retry_queue_size": len(self.retry_queue),
             "dead_letter_queue_size": len(self.dead_letter_queue),
             "users_processing": len(self.user_processing_count),
+            "dispatch": self.ready_queue.get_stats(),
+            "rate_limit": (self.shared_rate_limiter or self.rate_limiter).get_stats(),
+            "scheduled": self.scheduled_delivery.get_stats(),
+            "retry": self.retry_queue.get_stats(),
             "stats": {
                 "total_processed": self.stats.total_messages_processed,
                 "total_failed": self.stats.total_messages_failed,
@@ -323,26 +399,23 @@ class MassiveQueueProcessor:
         
         while self.running:
             try:
+                # Estacionado hasta que haya un mensaje de un usuario elegible; la
+                # admisión (concurrencia y rate limit) ya reservó su lugar
                 message = await self._get_next_message()
                 
-                if not message:
-                    await asyncio.sleep(0.1)  # Breve pausa si no hay mensajes
-                    continue
-                
-                # Verificar rate limiting por usuario
-                if not self._check_user_rate_limit(message.user_id):
-                    # Reencolar el mensaje con delay
-                    await asyncio.sleep(0.1)
-                    heapq.heappush(self.priority_queues[message.priority], message)
-                    continue
-                
-                # Verificar concurrencia por usuario
-                user_concurrent = self.user_processing_count.get(message.user_id, 0)
-                if user_concurrent >= self.max_concurrent_per_user:
-                    # Reencolar y esperar
-                    heapq.heappush(self.priority_queues[message.priority], message)
-                    await asyncio.sleep(0.2)
-                    continue
+                # Límite compartido entre pods: si Redis lo rechaza, el mensaje vuelve a su
+                # carril y el usuario no se elige hasta que le toque
+                if self.shared_rate_limiter is not None:
+                    wait = await self.shared_rate_limiter.acquire(
+                        message.user_id, message.message_type, message.metadata.get("user_tier")
+                    )
+                    if wait > 0:
+                        self.ready_queue.defer(message, wait)
+                        self._release_user_slot(message.user_id)
+                        # Otro worker pudo bloquear al usuario por concurrencia mientras
+                        # esperábamos a Redis; sin mensaje en vuelo nadie más lo libera
+                        self.ready_queue.release(message.user_id)
+                        continue
                 
                 # Procesar mensaje
                 await self._process_message(message, worker_name)
@@ -355,15 +428,9 @@ class MassiveQueueProcessor:
         
         logger.info(f"{worker_name} stopped")
     
-    async def _get_next_message(self) -> Optional[QueuedMessage]:
-        """Obtener próximo mensaje para procesar (por prioridad)"""
-        
-        # Revisar colas por orden de prioridad
-        for priority in MessagePriority:
-            if self.priority_queues[priority]:
-                return heapq.heappop(self.priority_queues[priority])
-        
-        return None
+    async def _get_next_message(self) -> QueuedMessage:
+        """Obtener próximo mensaje para procesar (por prioridad), esperando si no hay"""
+        return await self.ready_queue.get()
     
     async def _process_message(self, message: QueuedMessage, worker_name: str):
         """Procesar mensaje individual"""
@@ -371,13 +438,9 @@ class MassiveQueueProcessor:
         start_time = time.time()
         
         try:
-            # Marcar como procesando
+            # Marcar como procesando (el contador del usuario lo incrementó _admit_message)
             message.mark_processing()
             
-            # Incrementar contador de concurrencia del usuario
-            self.user_processing_count[message.user_id] = \
-                self.user_processing_count.get(message.user_id, 0) + 1
-            
             # Obtener procesador para el tipo de mensaje
             processor = self.message_processors.get(
                 message.message_type, 
@@ -411,30 +474,41 @@ class MassiveQueueProcessor:
             
             logger.error(f"Error processing message {message.id}: {e}")
             
-            # Enviar a cola de retry si aplica
-            if message.should_retry:
-                self.retry_queue.append(message)
-            else:
+            # Enviar a cola de retry si le quedan intentos (la política del tipo fija el backoff)
+            if not self.retry_queue.schedule(message):
                 self.dead_letter_queue.append(message)
         
         finally:
             # Decrementar contador de concurrencia del usuario
-            if message.user_id in self.user_processing_count:
-                self.user_processing_count[message.user_id] -= 1
-                if self.user_processing_count[message.user_id] <= 0:
-                    del self.user_processing_count[message.user_id]
-    
-    def _check_user_rate_limit(self, user_id: str) -> bool:
-        """Verificar rate limiting por usuario"""
-        current_time = time.time()
-        last_processed = self.rate_limiter.get(user_id, 0)
-        
-        # Permitir máximo 1 mensaje por segundo por usuario
-        if current_time - last_processed < 1.0:
-            return False
-        
-        self.rate_limiter[user_id] = current_time
-        return True
+            self._release_user_slot(message.user_id)
+            
+            # Sus mensajes pendientes vuelven a ser elegibles
+            self.ready_queue.release(message.user_id)
+    
+    def _admit_message(self, message: QueuedMessage) -> float:
+        """Admisión de la cola: 0 si el mensaje puede procesarse ahora (y reserva el lugar
+        del usuario), si no, segundos a esperar o WAIT_FOR_RELEASE hasta que termine otro"""
+        
+        # Verificar concurrencia por usuario
+        user_concurrent = self.user_processing_count.get(message.user_id, 0)
+        if user_concurrent >= self.max_concurrent_per_user:
+            return WAIT_FOR_RELEASE
+        
+        # Verificar rate limiting local (el compartido se consulta en el worker)
+        if self.shared_rate_limiter is None:
+            wait = self.rate_limiter.acquire(message.user_id, message.message_type,
+                                             message.metadata.get("user_tier"))
+            if wait > 0:
+                return wait
+        
+        self.user_processing_count[message.user_id] = user_concurrent + 1
+        return 0.0
+    
+    def _release_user_slot(self, user_id: str):
+        if user_id in self.user_processing_count:
+            self.user_processing_count[user_id] -= 1
+            if self.user_processing_count[user_id] <= 0:
+                del self.user_processing_count[user_id]
     
     def _update_avg_processing_time(self, processing_time: float):
         """Actualizar tiempo promedio de procesamiento"""
@@ -600,8 +674,10 @@ class MassiveQueueProcessor:
                 last_processed = current_processed
                 
                 # Actualizar tamaños de cola
-                for priority, queue in self.priority_queues.items():
-                    self.stats.queue_sizes[priority] = len(queue)
+                self.stats.queue_sizes.update(self.ready_queue.sizes())
+                
+                # Buckets de usuarios inactivos (ya recargados)
+                self.rate_limiter.evict_idle()
                 
                 self.stats.retry_queue_size = len(self.retry_queue)
                 self.stats.dead_letter_queue_size = len(self.dead_letter_queue)
@@ -618,49 +694,45 @@ class MassiveQueueProcessor:
                 logger.error(f"Error in monitoring loop: {e}")
     
     async def _retry_processor_loop(self):
-        """Loop para procesar mensajes de retry"""
+        """Loop para reencolar en bloque los retries apenas vence su backoff"""
         while self.running:
             try:
-                if self.retry_queue:
-                    message = self.retry_queue.pop(0)
-                    
-                    # Calcular delay exponencial
-                    delay = min(2 ** message.retry_count, 60)  # Máximo 60 segundos
-                    await asyncio.sleep(delay)
-                    
+                due = self.retry_queue.pop_due()
+                for message in due:
                     # Reencolar con prioridad normal
                     message.status = ProcessingStatus.PENDING
-                    heapq.heappush(self.priority_queues[MessagePriority.NORMAL], message)
-                    
-                    logger.info(f"Requeued message {message.id} after {delay}s delay (attempt {message.retry_count})")
+                    message.priority = MessagePriority.NORMAL
+                    self.ready_queue.put_nowait(message)
                 
-                await asyncio.sleep(1)
+                if due:
+                    logger.info(f"Requeued {len(due)} messages for retry")
+                
+                await self.retry_queue.wait_next()
                 
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Error in retry processor: {e}")
+                await asyncio.sleep(1)
     
     async def _scheduled_processor_loop(self):
-        """Loop para procesar mensajes programados"""
+        """Loop para activar mensajes programados al vencer (sin recorrer el keyspace)"""
         while self.running:
             try:
-                current_time = time.time()
-                
-                # Buscar mensajes programados listos
-                scheduled_messages = await self._get_due_scheduled_messages(current_time)
-                
-                for message in scheduled_messages:
-                    # Mover a cola de procesamiento
-                    heapq.heappush(self.priority_queues[message.priority], message)
-                    logger.info(f"Activated scheduled message {message.id}")
-                
-                await asyncio.sleep(5)  # Revisar cada 5 segundos
+                await self.scheduled_delivery.run_once()
+                await self.scheduled_delivery.wait_next()
                 
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Error in scheduled processor: {e}")
+                await asyncio.sleep(1)
+    
+    def _activate_scheduled_messages(self, messages: List[QueuedMessage]):
+        """Mover en bloque a las colas los programados que vencieron"""
+        for message in messages:
+            self.ready_queue.put_nowait(message)
+        logger.debug(f"Activated {len(messages)} scheduled messages")
     
     # Persistencia en Redis
     
@@ -710,7 +782,7 @@ class MassiveQueueProcessor:
                         )
                         
                         # Agregar a cola apropiada
-                        heapq.heappush(self.priority_queues[message.priority], message)
+                        self.ready_queue.put_nowait(message)
                         
                         # Eliminar de Redis
                         await self.redis_client.delete(key)
@@ -742,64 +814,37 @@ class MassiveQueueProcessor:
             logger.error(f"Error persisting queues: {e}")
     
     async def _enqueue_scheduled_message(self, message: QueuedMessage):
-        """Encolar mensaje programado en Redis"""
+        """Encolar mensaje programado (Redis o rueda local si vence pronto)"""
         try:
-            key = f"robertai:scheduled:{message.scheduled_at}:{message.id}"
-            data = msgpack.packb({
-                "id": message.id,
-                "user_id": message.user_id,
-                "message_type": message.message_type.value,
-                "priority": message.priority.value,
-                "content": message.content,
-                "scheduled_at": message.scheduled_at,
-                "metadata": message.metadata
-            })
-            
-            await self.redis_client.setex(key, int(message.scheduled_at - time.time()) + 3600, data)
+            await self.scheduled_delivery.schedule(message)
             
         except Exception as e:
             logger.error(f"Error enqueuing scheduled message: {e}")
     
-    async def _get_due_scheduled_messages(self, current_time: float) -> List[QueuedMessage]:
-        """Obtener mensajes programados que ya deben ejecutarse"""
-        messages = []
-        
-        try:
-            pattern = "robertai:scheduled:*"
-            
-            async for key in self.redis_client.scan_iter(match=pattern):
-                try:
-                    # Extraer timestamp del key
-                    key_parts = key.decode().split(":")
-                    scheduled_time = float(key_parts[2])
-                    
-                    if scheduled_time <= current_time:
-                        data = await self.redis_client.get(key)
-                        if data:
-                            message_data = msgpack.unpackb(data)
-                            
-                            message = QueuedMessage(
-                                id=message_data["id"],
-                                user_id=message_data["user_id"],
-                                message_type=MessageType(message_data["message_type"]),
-                                priority=MessagePriority(message_data["priority"]),
-                                content=message_data["content"],
-                                scheduled_at=message_data["scheduled_at"],
-                                metadata=message_data.get("metadata", {})
-                            )
-                            
-                            messages.append(message)
-                            
-                            # Eliminar de scheduled messages
-                            await self.redis_client.delete(key)
-                
-                except Exception as e:
-                    logger.warning(f"Error processing scheduled message {key}: {e}")
-        
-        except Exception as e:
-            logger.error(f"Error getting due scheduled messages: {e}")
-        
-        return messages
+    def _pack_scheduled_message(self, message: QueuedMessage) -> bytes:
+        return msgpack.packb({
+            "id": message.id,
+            "user_id": message.user_id,
+            "message_type": message.message_type.value,
+            "priority": message.priority.value,
+            "content": message.content,
+            "created_at": message.created_at,
+            "scheduled_at": message.scheduled_at,
+            "metadata": message.metadata
+        })
+    
+    def _unpack_scheduled_message(self, data: bytes) -> QueuedMessage:
+        message_data = msgpack.unpackb(data)
+        return QueuedMessage(
+            id=message_data["id"],
+            user_id=message_data["user_id"],
+            message_type=MessageType(message_data["message_type"]),
+            priority=MessagePriority(message_data["priority"]),
+            content=message_data["content"],
+            created_at=message_data.get("created_at", message_data["scheduled_at"]),
+            scheduled_at=message_data["scheduled_at"],
+            metadata=message_data.get("metadata", {})
+        )
 
 # Singleton instance
 massive_queue = MassiveQueueProcessor()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Queue Dispatch for RobertAI
+Carriles justos por usuario (deficit round robin) y workers estacionados hasta que haya trabajo elegible
+"""
+
+import asyncio
+import math
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, Iterator, Optional, Set
+
+# Espera devuelta por la admisión cuando el usuario se libera con release() y no por tiempo
+WAIT_FOR_RELEASE = math.inf
+
+class FairLanes:
+    """Un carril FIFO por usuario y deficit round robin entre usuarios
+    
+    Cada vuelta un usuario suma quantum × peso de crédito y cada mensaje
+    cuesta 1, así un usuario con mucho backlog no desplaza a los demás. Un
+    usuario sale del anillo al llegar a la cabeza si está bloqueado entero
+    (user_id en blocked) o lo está el tipo de su primer mensaje
+    ((user_id, message_type) en blocked), sin volver a revisarlo, y vuelve
+    con activate().
+    """
+    
+    def __init__(self, blocked: Set[Hashable], quantum: float = 1.0,
+                 weight: Optional[Callable[[str], float]] = None):
+        self.blocked = blocked  # Compartido entre prioridades
+        self.quantum = quantum
+        self.weight = weight
+        self.lanes: Dict[str, Deque[Any]] = {}
+        self.ring: Deque[str] = deque()
+        self.in_ring: Set[str] = set()
+        self.deficit: Dict[str, float] = {}
+        self.size = 0
+    
+    def push(self, message: Any):
+        user_id = message.user_id
+        lane = self.lanes.get(user_id)
+        if lane is None:
+            lane = self.lanes[user_id] = deque()
+            self.deficit[user_id] = 0.0
+        lane.append(message)
+        self.size += 1
+        if not self.is_blocked(user_id):
+            self.activate(user_id)
+    
+    def is_blocked(self, user_id: str) -> bool:
+        """Usuario bloqueado entero o por el tipo del mensaje al frente de su carril"""
+        if user_id in self.blocked:
+            return True
+        lane = self.lanes.get(user_id)
+        return bool(lane) and (user_id, lane[0].message_type) in self.blocked
+    
+    def activate(self, user_id: str) -> bool:
+        """Volver a poner al usuario en el anillo; True si tiene mensajes"""
+        if user_id not in self.lanes:
+            return False
+        if user_id not in self.in_ring:
+            self.ring.append(user_id)
+            self.in_ring.add(user_id)
+        return True
+    
+    def next_user(self) -> Optional[str]:
+        """Usuario al que le toca según DRR (queda en la cabeza del anillo)"""
+        ring = self.ring
+        while ring:
+            user_id = ring[0]
+            if self.is_blocked(user_id):
+                ring.popleft()
+                self.in_ring.discard(user_id)
+                continue
+            if self.deficit[user_id] >= 1:
+                return user_id
+            # Empieza su turno: suma crédito; si no alcanza para un mensaje, pasa al final
+            weight = self.weight(user_id) if self.weight else 1.0
+            self.deficit[user_id] += self.quantum * weight
+            if self.deficit[user_id] < 1:
+                ring.rotate(-1)
+        return None
+    
+    def peek(self, user_id: str) -> Any:
+        return self.lanes[user_id][0]
+    
+    def push_front(self, message: Any):
+        """Devolver un mensaje ya tomado a su carril, delante de los que llegaron después"""
+        lane = self.lanes.get(message.user_id)
+        if lane is None:
+            self.push(message)
+            return
+        # Varios devueltos seguidos mantienen su orden de llegada
+        index = 0
+        for queued in lane:
+            if queued.created_at > message.created_at:
+                break
+            index += 1
+        lane.insert(index, message)
+        self.size += 1
+        if not self.is_blocked(message.user_id):
+            self.activate(message.user_id)
+    
+    def pop(self, user_id: str) -> Any:
+        """Sacar el próximo mensaje del usuario devuelto por next_user"""
+        lane = self.lanes[user_id]
+        message = lane.popleft()
+        self.size -= 1
+        self.deficit[user_id] -= 1
+        if not lane:
+            # Sin backlog no acumula crédito
+            del self.lanes[user_id]
+            del self.deficit[user_id]
+            self.ring.popleft()
+            self.in_ring.discard(user_id)
+        elif self.deficit[user_id] < 1:
+            self.ring.rotate(-1)  # Terminó su turno
+        return message
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __iter__(self) -> Iterator[Any]:
+        for lane in self.lanes.values():
+            yield from lane
+
+class ReadyQueue:
+    """Mensajes listos por prioridad, con despertar por evento en vez de polling
+    
+    Un worker sin trabajo espera un future y no consume CPU; cada put despierta
+    a un solo worker (sin estampida). Dentro de cada prioridad los usuarios se
+    atienden por DRR; admit(mensaje) decide si el primer mensaje del usuario
+    puede salir ahora (0) o cuántos segundos debe esperar, y mientras tanto
+    no se lo elige. Una espera por rate limit bloquea solo (usuario, tipo):
+    un video limitado no frena los textos del mismo usuario en otra
+    prioridad; WAIT_FOR_RELEASE (concurrencia) bloquea al usuario entero
+    hasta release(). Con max_size lleno, put espera lugar (backpressure hacia quien
+    encola); los reencolados internos usan put_nowait para no bloquear a los
+    workers.
+    """
+    
+    def __init__(self, priorities: Iterable[Any], max_size: int = 0,
+                 admit: Optional[Callable[[Any], float]] = None,
+                 quantum: float = 1.0, weight: Optional[Callable[[str], float]] = None):
+        self.blocked: Set[Hashable] = set()  # user_id o (user_id, message_type)
+        self.unblock_timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        # Orden de inserción = orden de prioridad al buscar el próximo mensaje
+        self.queues: Dict[Any, FairLanes] = {
+            priority: FairLanes(self.blocked, quantum, weight) for priority in priorities
+        }
+        self.admit = admit
+        self.max_size = max_size
+        self.size = 0
+        self.getters: Deque[asyncio.Future] = deque()  # Workers estacionados
+        self.putters: Deque[asyncio.Future] = deque()  # Productores esperando lugar
+        
+        self.wakeups = 0
+        self.parks = 0
+        self.user_blocks = 0
+    
+    def put_nowait(self, message: Any):
+        """Encolar sin esperar lugar (reencolados, retries y programados)"""
+        lanes = self.queues[message.priority]
+        lanes.push(message)
+        self.size += 1
+        if not lanes.is_blocked(message.user_id):
+            self._wake(self.getters)
+    
+    async def put(self, message: Any):
+        """Encolar respetando max_size"""
+        while self.max_size and self.size >= self.max_size:
+            waiter = asyncio.get_running_loop().create_future()
+            self.putters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                self._abandon(waiter, self.putters, self.size < self.max_size)
+                raise
+        self.put_nowait(message)
+    
+    def get_nowait(self) -> Optional[Any]:
+        """Próximo mensaje elegible de la prioridad más alta, o None si no hay"""
+        for lanes in self.queues.values():
+            while True:
+                user_id = lanes.next_user()
+                if user_id is None:
+                    break
+                message = lanes.peek(user_id)
+                wait = self.admit(message) if self.admit else 0.0
+                if wait > 0:
+                    self._block(self._block_key(message, wait), wait)
+                    continue
+                
+                message = lanes.pop(user_id)
+                self.size -= 1
+                self._wake(self.putters)
+                return message
+        return None
+    
+    def defer(self, message: Any, wait: float):
+        """Devolver un mensaje ya tomado y no elegir a su usuario (o solo ese tipo) durante wait segundos"""
+        self.queues[message.priority].push_front(message)
+        self.size += 1
+        self._block(self._block_key(message, wait), wait)
+    
+    def release(self, key: Hashable):
+        """Desbloquear un usuario (terminó un mensaje) o un (usuario, tipo) (venció su espera)"""
+        if key not in self.blocked:
+            return
+        self.blocked.discard(key)
+        timer = self.unblock_timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        
+        user_id = key[0] if isinstance(key, tuple) else key
+        pending = False
+        for lanes in self.queues.values():
+            pending = lanes.activate(user_id) or pending
+        if pending:
+            self._wake(self.getters)
+    
+    @staticmethod
+    def _block_key(message: Any, wait: float) -> Hashable:
+        # Concurrencia: el usuario entero; rate limit: solo el bucket (usuario, tipo)
+        if wait == WAIT_FOR_RELEASE:
+            return message.user_id
+        return (message.user_id, message.message_type)
+    
+    def _block(self, key: Hashable, wait: float):
+        # Los carriles lo sacan del anillo la próxima vez que llegue a la cabeza
+        self.blocked.add(key)
+        self.user_blocks += 1
+        if wait != WAIT_FOR_RELEASE and key not in self.unblock_timers:
+            self.unblock_timers[key] = asyncio.get_running_loop().call_later(
+                wait, self._unblock_after_wait, key
+            )
+    
+    def _unblock_after_wait(self, key: Hashable):
+        self.unblock_timers.pop(key, None)
+        self.release(key)
+    
+    async def get(self) -> Any:
+        """Esperar el próximo mensaje sin polling"""
+        while True:
+            message = self.get_nowait()
+            if message is not None:
+                # Puede quedar más trabajo elegible (p. ej. tras un release): pasar la posta
+                if self.size:
+                    self._wake(self.getters)
+                return message
+            
+            waiter = asyncio.get_running_loop().create_future()
+            self.getters.append(waiter)
+            self.parks += 1
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                self._abandon(waiter, self.getters, self.size > 0)
+                raise
+            # Otro worker pudo tomar el mensaje antes; se vuelve a estacionar
+    
+    def _wake(self, waiters: Deque[asyncio.Future]):
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.wakeups += 1
+                return
+    
+    def _abandon(self, waiter: asyncio.Future, waiters: Deque[asyncio.Future], pending: bool):
+        # Si ya lo habían despertado, pasar el aviso a otro para no perderlo
+        woken = waiter.done() and not waiter.cancelled()
+        waiter.cancel()
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if woken and pending:
+            self._wake(waiters)
+    
+    def sizes(self) -> Dict[Any, int]:
+        return {priority: lanes.size for priority, lanes in self.queues.items()}
+    
+    def get_stats(self) -> dict:
+        return {
+            "ready": self.size,
+            "max_size": self.max_size,
+            "idle_workers": sum(1 for waiter in self.getters if not waiter.done()),
+            "blocked_producers": sum(1 for waiter in self.putters if not waiter.done()),
+            "users_with_backlog": len({user_id for lanes in self.queues.values() for user_id in lanes.lanes}),
+            "blocked_users": sum(1 for key in self.blocked if not isinstance(key, tuple)),
+            "rate_limited_types": sum(1 for key in self.blocked if isinstance(key, tuple)),
+            "user_blocks": self.user_blocks,
+            "wakeups": self.wakeups,
+            "parks": self.parks
+        }
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Queue Rate Limiting for RobertAI
+Token bucket por usuario y tipo de mensaje, con modo GCRA en Redis para límites entre pods
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from cache_cluster import user_hash_tag
+
+logger = logging.getLogger(__name__)
+
+# GCRA: un solo valor por clave (TAT, theoretical arrival time) y reloj del servidor
+# ARGV: intervalo de emisión (µs), tolerancia de ráfaga (µs), costo
+GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval * tonumber(ARGV[3])
+local allow_at = new_tat - tolerance
+if allow_at > now then
+    return allow_at - now
+end
+redis.call('SET', KEYS[1], string.format('%d', new_tat), 'PX', math.ceil((new_tat - now) / 1000))
+return 0
+"""
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Límite de un token bucket: ráfaga máxima y tokens recargados por segundo"""
+    rate: float
+    burst: float
+
+class RateLimitPolicy:
+    """Límite por tipo de mensaje escalado según el tier del usuario"""
+    
+    def __init__(self, limits: Optional[Dict[Hashable, Optional[RateLimit]]] = None,
+                 default: Optional[RateLimit] = RateLimit(rate=1.0, burst=1.0),
+                 tier_multipliers: Optional[Dict[str, float]] = None):
+        self.limits = dict(limits or {})  # Tipo -> límite; None = sin límite
+        self.default = default
+        self.tier_multipliers = dict(tier_multipliers or {})
+        self._scaled: Dict[Tuple[Hashable, Optional[str]], Optional[RateLimit]] = {}
+    
+    def limit_for(self, message_type: Hashable, tier: Optional[str] = None) -> Optional[RateLimit]:
+        key = (message_type, tier)
+        if key not in self._scaled:
+            limit = self.limits.get(message_type, self.default)
+            multiplier = self.tier_multipliers.get(tier, 1.0) if tier else 1.0
+            if limit is not None and multiplier != 1.0:
+                limit = RateLimit(rate=limit.rate * multiplier, burst=limit.burst * multiplier)
+            self._scaled[key] = limit
+        return self._scaled[key]
+    
+    def refill_horizon(self) -> float:
+        """Segundos que tarda en llenarse el bucket más lento (olvidarlo después es exacto)"""
+        limits = [limit for limit in [self.default, *self.limits.values()] if limit is not None]
+        multiplier = min([1.0, *self.tier_multipliers.values()])
+        return max((limit.burst / limit.rate / multiplier for limit in limits), default=0.0)
+
+class TokenBucketLimiter:
+    """Token buckets en memoria por (usuario, tipo de mensaje)
+    
+    Cada bucket son dos floats. Un bucket que lleva idle_ttl sin uso está
+    lleno otra vez, así que se descarta sin cambiar ninguna decisión; los
+    buckets se ordenan por último uso y la limpieza solo mira el frente.
+    """
+    
+    def __init__(self, policy: RateLimitPolicy, idle_ttl: Optional[float] = None):
+        self.policy = policy
+        self.idle_ttl = idle_ttl if idle_ttl is not None else policy.refill_horizon()
+        self.buckets: "OrderedDict[Tuple[str, Hashable], List[float]]" = OrderedDict()  # [tokens, actualizado en]
+        
+        self.allowed = 0
+        self.throttled = 0
+        self.evicted = 0
+    
+    def acquire(self, user_id: str, message_type: Hashable, tier: Optional[str] = None,
+                cost: float = 1.0) -> float:
+        """Consumir tokens; 0 si se admite, si no segundos hasta que alcancen (sin consumir)"""
+        limit = self.policy.limit_for(message_type, tier)
+        if limit is None:
+            self.allowed += 1
+            return 0.0
+        
+        now = time.monotonic()
+        self.evict_idle(now, max_entries=2)  # Amortizado: O(1) por llamada
+        
+        key = (user_id, message_type)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [limit.burst, now]
+        else:
+            bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+            self.buckets.move_to_end(key)
+        
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.allowed += 1
+            return 0.0
+        
+        self.throttled += 1
+        return (cost - bucket[0]) / limit.rate
+    
+    def evict_idle(self, now: Optional[float] = None, max_entries: Optional[int] = None) -> int:
+        """Descartar buckets sin uso desde hace idle_ttl (ya recargados por completo)"""
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        while self.buckets and (max_entries is None or evicted < max_entries):
+            key, (_, updated_at) = next(iter(self.buckets.items()))
+            if now - updated_at < self.idle_ttl:
+                break
+            del self.buckets[key]
+            evicted += 1
+        self.evicted += evicted
+        return evicted
+    
+    def get_stats(self) -> dict:
+        return {
+            "mode": "local",
+            "buckets": len(self.buckets),
+            "idle_ttl": self.idle_ttl,
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "evicted": self.evicted
+        }
+
+class GCRARateLimiter:
+    """Mismo límite aplicado en Redis con GCRA, compartido por todos los pods
+    
+    Una clave por (usuario, tipo) que vence sola cuando el bucket se llena.
+    Si Redis falla se admite el mensaje (fail-open) y se registra el error.
+    """
+    
+    def __init__(self, policy: RateLimitPolicy, redis_client: Any = None,
+                 key_prefix: str = "robertai:ratelimit"):
+        self.policy = policy
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self._script_sha: Optional[str] = None
+        
+        self.allowed = 0
+        self.throttled = 0
+        self.errors = 0
+    
+    def _key(self, user_id: str, message_type: Hashable) -> str:
+        # Hash tag por usuario: todas sus claves en el mismo slot del cluster
+        type_name = getattr(message_type, "value", message_type)
+        return f"{self.key_prefix}:{user_hash_tag(user_id)}:{type_name}"
+    
+    async def acquire(self, user_id: str, message_type: Hashable, tier: Optional[str] = None,
+                      cost: float = 1.0) -> float:
+        """Consumir en Redis; 0 si se admite, si no segundos a esperar"""
+        limit = self.policy.limit_for(message_type, tier)
+        if limit is None or self.redis_client is None:
+            self.allowed += 1
+            return 0.0
+        
+        interval_us = 1_000_000 / limit.rate
+        args = (int(interval_us), int(interval_us * limit.burst), cost)
+        key = self._key(user_id, message_type)
+        try:
+            if self._script_sha is None:
+                self._script_sha = await self.redis_client.script_load(GCRA_SCRIPT)
+            try:
+                wait_us = await self.redis_client.evalsha(self._script_sha, 1, key, *args)
+            except Exception as e:
+                if "NOSCRIPT" not in str(e):
+                    raise
+                wait_us = await self.redis_client.eval(GCRA_SCRIPT, 1, key, *args)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Distributed rate limit check failed for {user_id}: {e}")
+            return 0.0
+        
+        wait = int(wait_us) / 1_000_000
+        if wait > 0:
+            self.throttled += 1
+            return wait
+        self.allowed += 1
+        return 0.0
+    
+    def get_stats(self) -> dict:
+        return {
+            "mode": "redis_gcra",
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "errors": self.errors
+        }
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Retry Scheduling for RobertAI
+Reintentos en un heap por hora del próximo intento, con backoff exponencial con jitter por tipo de mensaje
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from cache_instrumentation import LatencyHistogram
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Backoff de un tipo de mensaje: base × multiplier^(intento-1), acotado a max_delay
+    
+    jitter es la fracción del delay que se sortea (0.5 = entre la mitad y el
+    total), para que una ráfaga de fallos no vuelva toda junta.
+    max_retries None respeta el max_retries de cada mensaje.
+    """
+    base_delay: float = 2.0
+    max_delay: float = 60.0
+    multiplier: float = 2.0
+    jitter: float = 0.5
+    max_retries: Optional[int] = None
+
+class RetryScheduler:
+    """Mensajes fallidos ordenados por hora del próximo intento
+    
+    Un heap en vez de una lista con sleep inline: un backoff largo no demora
+    a los demás, y todo lo vencido sale en bloque apenas vence. Retry lag es
+    el atraso entre la hora prevista y la real del reencolado.
+    """
+    
+    def __init__(self, policies: Optional[Dict[Hashable, RetryPolicy]] = None,
+                 default: RetryPolicy = RetryPolicy(), rng: Optional[random.Random] = None):
+        self.policies = dict(policies or {})
+        self.default = default
+        self.rng = rng or random.Random()
+        self.heap: List[Tuple[float, int, Any]] = []  # (próximo intento, orden, mensaje)
+        self._sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+        
+        self.lag = LatencyHistogram()
+        self.scheduled = 0
+        self.requeued = 0
+        self.exhausted = 0
+        self.total_backoff = 0.0
+    
+    def policy_for(self, message_type: Hashable) -> RetryPolicy:
+        return self.policies.get(message_type, self.default)
+    
+    def backoff(self, message: Any) -> float:
+        """Segundos hasta el próximo intento (retry_count ya cuenta el fallo actual)"""
+        policy = self.policy_for(message.message_type)
+        attempt = max(1, message.retry_count)
+        delay = min(policy.max_delay, policy.base_delay * policy.multiplier ** (attempt - 1))
+        return delay * (1 - policy.jitter * self.rng.random())
+    
+    def schedule(self, message: Any, now: Optional[float] = None) -> bool:
+        """Programar el reintento; False si el mensaje agotó sus intentos"""
+        policy = self.policy_for(message.message_type)
+        max_retries = message.max_retries if policy.max_retries is None else policy.max_retries
+        if message.retry_count >= max_retries:
+            self.exhausted += 1
+            return False
+        
+        now = time.time() if now is None else now
+        delay = self.backoff(message)
+        due_at = now + delay
+        
+        # Solo hace falta despertar al loop si pasa a ser el primero en vencer
+        if not self.heap or due_at < self.heap[0][0]:
+            self.wakeup.set()
+        heapq.heappush(self.heap, (due_at, next(self._sequence), message))
+        self.scheduled += 1
+        self.total_backoff += delay
+        return True
+    
+    def pop_due(self, now: Optional[float] = None) -> List[Any]:
+        """Sacar en bloque todos los mensajes cuyo próximo intento ya venció"""
+        now = time.time() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due_at, _, message = heapq.heappop(self.heap)
+            self.lag.record(now - due_at)
+            due.append(message)
+        self.requeued += len(due)
+        return due
+    
+    def next_due(self) -> Optional[float]:
+        return self.heap[0][0] if self.heap else None
+    
+    async def wait_next(self, max_wait: Optional[float] = None):
+        """Dormir hasta el próximo vencimiento o hasta que llegue uno más urgente"""
+        timeout = max_wait
+        if self.heap:
+            timeout = self.heap[0][0] - time.time()
+            if max_wait is not None:
+                timeout = min(timeout, max_wait)
+            if timeout <= 0:
+                return
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.wakeup.clear()
+    
+    def __len__(self) -> int:
+        return len(self.heap)
+    
+    def __iter__(self):
+        for _, _, message in self.heap:
+            yield message
+    
+    def get_stats(self) -> dict:
+        next_due = self.next_due()
+        return {
+            "pending": len(self.heap),
+            "scheduled": self.scheduled,
+            "requeued": self.requeued,
+            "exhausted": self.exhausted,
+            "avg_backoff_s": self.total_backoff / self.scheduled if self.scheduled else 0.0,
+            "next_due_in_s": max(0.0, next_due - time.time()) if next_due is not None else None,
+            "lag": self.lag.get_stats()
+        }
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Scheduled Delivery for RobertAI
+Mensajes programados en un sorted set de Redis y rueda de tiempo en memoria para el futuro cercano
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from timing_wheel import HierarchicalTimingWheel
+
+logger = logging.getLogger(__name__)
+
+# Reclamar en bloque lo que vence hasta ARGV[1]: un solo pod se lleva cada mensaje.
+# Lo reclamado pasa al ZSET de procesamiento con un lease (score = vence el lease);
+# los leases vencidos (pod caído) se reclaman primero. El payload queda hasta el ack.
+# KEYS: due (score = scheduled_at), hash id -> payload, processing
+# ARGV: hasta, límite, duración del lease, ahora
+# Devuelve {leases vencidos reclamados, payloads...}
+CLAIM_DUE_SCRIPT = """
+local limit = tonumber(ARGV[2])
+local lease = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local ids = {}
+local leases = {}
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now, 'LIMIT', 0, limit)
+for _, id in ipairs(expired) do
+    table.insert(ids, id)
+    table.insert(leases, now + lease)
+end
+if #ids < limit then
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, limit - #ids)
+    for i = 1, #due, 2 do
+        table.insert(ids, due[i])
+        table.insert(leases, math.max(tonumber(due[i + 1]), now) + lease)
+        redis.call('ZREM', KEYS[1], due[i])
+    end
+end
+if #ids == 0 then
+    return {0}
+end
+local payloads = redis.call('HMGET', KEYS[2], unpack(ids))
+local result = {#expired}
+for i, id in ipairs(ids) do
+    if payloads[i] then
+        redis.call('ZADD', KEYS[3], leases[i], id)
+        table.insert(result, payloads[i])
+    else
+        redis.call('ZREM', KEYS[3], id)
+    end
+end
+return result
+"""
+
+class ScheduledDelivery:
+    """Entrega de mensajes programados sin recorrer el keyspace
+    
+    Todo mensaje programado se guarda en Redis (hash de payloads + ZSET, con
+    el mismo hash tag para que el script sea atómico en cluster). Los lejanos
+    esperan en el ZSET `due` por scheduled_at; cada poll_interval se reclama
+    en bloque lo que vence dentro de horizon y se pasa a una rueda de tiempo
+    local de `tick` segundos, que los activa en bloque al vencer. Lo
+    programado dentro del horizonte va directo a la rueda.
+    
+    Lo que está en la rueda figura en el ZSET `processing` con un lease que
+    vence lease_ttl segundos después de scheduled_at, y se borra de Redis
+    recién después de activarse (ack). Si el pod cae, otro lo reclama al
+    vencer el lease: la entrega es al menos una vez.
+    """
+    
+    def __init__(self,
+                 encode: Callable[[Any], bytes],
+                 decode: Callable[[bytes], Any],
+                 activate: Callable[[List[Any]], None],
+                 key_prefix: str = "robertai:{scheduled}",
+                 horizon: float = 2.0,
+                 poll_interval: float = 1.0,
+                 tick: float = 0.01,
+                 batch_size: int = 500,
+                 lease_ttl: float = 30.0):  # Gracia tras scheduled_at antes de que otro pod lo reclame
+        self.encode = encode
+        self.decode = decode
+        self.activate = activate
+        self.due_key = f"{key_prefix}:due"
+        self.payloads_key = f"{key_prefix}:payloads"
+        self.processing_key = f"{key_prefix}:processing"
+        self.horizon = horizon
+        self.poll_interval = min(poll_interval, horizon / 2)  # Reclamar antes de que venzan
+        self.batch_size = batch_size
+        self.lease_ttl = lease_ttl
+        self.redis_client = None
+        self._script_sha: Optional[str] = None
+        
+        level0 = int(horizon / tick) + 2  # El horizonte entero en el primer nivel
+        self.wheel = HierarchicalTimingWheel(tick=tick, wheel_sizes=(level0, 64, 64), start_time=time.time())
+        self.pending: Dict[str, Any] = {}  # id -> mensaje reclamado esperando en la rueda
+        self.unacked: List[str] = []  # Activados que todavía figuran en Redis
+        self.wakeup = asyncio.Event()
+        self.next_poll = 0.0
+        
+        self.stored = 0
+        self.claimed = 0
+        self.reclaimed = 0
+        self.activated = 0
+        self.acked = 0
+        self.max_activation_lag = 0.0
+        self.total_activation_lag = 0.0
+    
+    async def schedule(self, message: Any):
+        """Programar un mensaje (message.id, message.scheduled_at)"""
+        near = message.scheduled_at <= time.time() + self.horizon
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(self.payloads_key, message.id, self.encode(message))
+        if near:
+            # Ya reclamado por este pod: otro no lo toma salvo que venza el lease
+            pipe.zadd(self.processing_key, {message.id: self._lease_until(message)})
+        else:
+            pipe.zadd(self.due_key, {message.id: message.scheduled_at})
+        await pipe.execute()
+        self.stored += 1
+        
+        if near:
+            self._hold(message)
+            self.wakeup.set()
+    
+    async def run_once(self):
+        """Reclamar de Redis si toca, activar lo vencido en la rueda y confirmarlo"""
+        now = time.time()
+        if now >= self.next_poll:
+            await self.claim_due(now + self.horizon)
+            self.next_poll = now + self.poll_interval
+        self.activate_due(time.time())
+        await self.ack_activated()
+    
+    async def wait_next(self):
+        """Dormir hasta el próximo vencimiento, el próximo poll o un mensaje cercano nuevo"""
+        wake_at = self.next_poll
+        next_expiration = self.wheel.next_expiration()
+        if next_expiration is not None:
+            wake_at = min(wake_at, next_expiration)
+        timeout = wake_at - time.time()
+        if timeout <= 0:
+            await asyncio.sleep(0)
+            return
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.wakeup.clear()
+    
+    async def claim_due(self, until: float) -> int:
+        """Mover a la rueda todo lo que vence hasta `until` (y los leases vencidos), en lotes"""
+        claimed = 0
+        while True:
+            reclaimed, *payloads = await self._claim_batch(until)
+            self.reclaimed += reclaimed
+            for payload in payloads:
+                try:
+                    message = self.decode(payload)
+                except Exception as e:
+                    logger.warning(f"Dropping undecodable scheduled message: {e}")
+                    continue
+                if message.id in self.pending:
+                    continue  # Su lease venció mientras seguía en nuestra rueda
+                self._hold(message)
+                claimed += 1
+            if len(payloads) < self.batch_size:
+                break
+        self.claimed += claimed
+        return claimed
+    
+    def activate_due(self, now: float) -> int:
+        """Activar en bloque los mensajes vencidos en la rueda (el ack va en ack_activated)"""
+        due_ids = self.wheel.advance(now)
+        if not due_ids:
+            return 0
+        messages = [self.pending.pop(message_id) for message_id in due_ids]
+        for message in messages:
+            lag = max(0.0, now - message.scheduled_at)
+            self.total_activation_lag += lag
+            self.max_activation_lag = max(self.max_activation_lag, lag)
+        self.activate(messages)
+        self.unacked.extend(due_ids)
+        self.activated += len(messages)
+        return len(messages)
+    
+    async def ack_activated(self) -> int:
+        """Borrar de Redis los mensajes ya activados; si falla, se reintenta en la próxima vuelta"""
+        if not self.unacked:
+            return 0
+        ids, self.unacked = self.unacked, []
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.zrem(self.processing_key, *ids)
+            pipe.hdel(self.payloads_key, *ids)
+            await pipe.execute()
+        except Exception:
+            self.unacked = ids + self.unacked
+            raise
+        self.acked += len(ids)
+        return len(ids)
+    
+    async def release_pending(self) -> int:
+        """Devolver al ZSET `due` lo reclamado que no llegó a activarse (al cerrar)"""
+        await self.ack_activated()
+        if not self.pending:
+            return 0
+        pipe = self.redis_client.pipeline(transaction=True)
+        for message_id, message in self.pending.items():
+            pipe.hset(self.payloads_key, message_id, self.encode(message))
+            pipe.zadd(self.due_key, {message_id: message.scheduled_at})
+            self.wheel.cancel(message_id)
+        pipe.zrem(self.processing_key, *self.pending)
+        await pipe.execute()
+        released = len(self.pending)
+        self.pending.clear()
+        return released
+    
+    async def migrate_legacy_keys(self, pattern: str = "robertai:scheduled:*") -> int:
+        """Pasar al ZSET los mensajes del formato anterior (una clave por mensaje)"""
+        migrated = 0
+        async for key in self.redis_client.scan_iter(match=pattern):
+            data = await self.redis_client.get(key)
+            if data:
+                try:
+                    message = self.decode(data)
+                    await self.schedule(message)
+                    migrated += 1
+                except Exception as e:
+                    logger.warning(f"Error migrating scheduled message {key}: {e}")
+            await self.redis_client.delete(key)
+        return migrated
+    
+    async def _claim_batch(self, until: float) -> List[Any]:
+        args = (self.due_key, self.payloads_key, self.processing_key,
+                repr(until), self.batch_size, repr(self.lease_ttl), repr(time.time()))
+        if self._script_sha is None:
+            self._script_sha = await self.redis_client.script_load(CLAIM_DUE_SCRIPT)
+        try:
+            return await self.redis_client.evalsha(self._script_sha, 3, *args)
+        except Exception as e:
+            if "NOSCRIPT" not in str(e):
+                raise
+            return await self.redis_client.eval(CLAIM_DUE_SCRIPT, 3, *args)
+    
+    def _lease_until(self, message: Any) -> float:
+        return max(message.scheduled_at, time.time()) + self.lease_ttl
+    
+    def _hold(self, message: Any):
+        # Rueda al día antes de insertar: con el reloj atrasado caería en un nivel superior
+        self.activate_due(time.time())
+        self.pending[message.id] = message
+        self.wheel.schedule(message.id, message.scheduled_at)
+    
+    def get_stats(self) -> dict:
+        return {
+            "waiting_in_memory": len(self.pending),
+            "unacked": len(self.unacked),
+            "stored": self.stored,
+            "claimed": self.claimed,
+            "reclaimed": self.reclaimed,
+            "activated": self.activated,
+            "acked": self.acked,
+            "avg_activation_lag_ms": self.total_activation_lag / self.activated * 1000 if self.activated else 0.0,
+            "max_activation_lag_ms": self.max_activation_lag * 1000
+        }
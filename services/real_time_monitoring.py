@@ -8,7 +8,7 @@ import asyncio
 import json
 import time
 import logging
-from typing import Dict, Any, Optional, List, Callable, Union
+from typing import Dict, Any, Optional, List, Callable, Union, Tuple
 from dataclasses import dataclass, field, asdict
 from datetime import datetime, timedelta
 from enum import Enum
@@ -236,6 +236,22 @@ class RealTimeMonitor:
             labels=labels
         )
     
+    async def set_gauges(self, gauges: List[Tuple[str, float, Optional[Dict[str, str]]]]):
+        """Establecer varios gauges con una sola escritura a Redis (pipeline)"""
+        
+        metrics = [
+            Metric(name=name, type=MetricType.GAUGE, value=value, labels=labels or {})
+            for name, value, labels in gauges
+        ]
+        
+        for metric in metrics:
+            self.metrics[metric.name].append(metric)
+        
+        await self._persist_metrics(metrics)
+        
+        for metric in metrics:
+            await self._evaluate_alert_rules(metric)
+    
     async def record_histogram(self, name: str, value: float,
                               labels: Optional[Dict[str, str]] = None):
         """Registrar valor en histograma"""
@@ -507,6 +523,9 @@ class RealTimeMonitor:
                 await self.set_gauge("cache_l2_hits", cache_stats["metrics"]["l2_hits"])
                 await self.set_gauge("cache_size", cache_stats["l1_cache"]["size"])
                 await self.set_gauge("cache_memory_usage", cache_stats["l1_cache"]["size_bytes"])
+                
+                if cache_stats.get("instrumentation"):
+                    await self.set_gauges(self._cache_instrumentation_gauges(cache_stats["instrumentation"]))
             
             # Queue metrics
             if queue:
@@ -517,10 +536,46 @@ class RealTimeMonitor:
                 await self.set_gauge("queue_retry_size", queue_stats["retry_queue_size"])
                 await self.set_gauge("queue_dead_letter_size", queue_stats["dead_letter_queue_size"])
                 await self.set_gauge("queue_messages_per_second", queue_stats["stats"]["messages_per_second"])
+                
+                if queue_stats.get("retry"):
+                    retry_lag = queue_stats["retry"]["lag"]
+                    await self.set_gauges([
+                        ("queue_retry_lag_p50_ms", retry_lag["p50_ms"], None),
+                        ("queue_retry_lag_p99_ms", retry_lag["p99_ms"], None),
+                        ("queue_retry_lag_max_ms", retry_lag["max_ms"], None),
+                        ("queue_retry_requeued", queue_stats["retry"]["requeued"], None)
+                    ])
             
         except Exception as e:
             logger.error(f"Error collecting application metrics: {e}")
     
+    def _cache_instrumentation_gauges(self, instrumentation: Dict[str, Any]) -> List[Tuple[str, float, Dict[str, str]]]:
+        """Gauges etiquetados a partir de los contadores en memoria del cache"""
+        
+        gauges = []
+        for level, namespaces in instrumentation["latency"].items():
+            for namespace, histogram in namespaces.items():
+                labels = {"level": level, "namespace": namespace}
+                gauges.append(("cache_latency_p50_ms", histogram["p50_ms"], labels))
+                gauges.append(("cache_latency_p99_ms", histogram["p99_ms"], labels))
+                gauges.append(("cache_latency_count", histogram["count"], labels))
+        
+        for level, counters in instrumentation["bytes"].items():
+            gauges.append(("cache_bytes_read", counters["read"], {"level": level}))
+            gauges.append(("cache_bytes_written", counters["written"], {"level": level}))
+        
+        for reason, namespaces in instrumentation["evictions"].items():
+            for namespace, count in namespaces.items():
+                gauges.append(("cache_evictions", count, {"reason": reason, "namespace": namespace}))
+        
+        for path, count in instrumentation["promotions"].items():
+            gauges.append(("cache_promotions", count, {"path": path}))
+        
+        if instrumentation.get("codec"):
+            gauges.append(("cache_compression_ratio", instrumentation["codec"]["compression_ratio"], None))
+        
+        return gauges
+    
     # Dashboard y APIs
     
     async def get_dashboard_data(self) -> Dict[str, Any]:
@@ -674,17 +729,24 @@ class RealTimeMonitor:
     
     # Persistencia
     
+    def _metric_key(self, metric: Metric) -> str:
+        """Prefijo de Redis de la serie; las etiquetas separan series del mismo nombre"""
+        if not metric.labels:
+            return f"robertai:metrics:{metric.name}"
+        labels = ",".join(f"{k}={v}" for k, v in sorted(metric.labels.items()))
+        return f"robertai:metrics:{metric.name}[{labels}]"  # Sin llaves: serían un hash tag de cluster
+    
     async def _persist_metric(self, metric: Metric):
         """Persistir métrica en Redis"""
         
         try:
             # Guardar valor más reciente
-            latest_key = f"robertai:metrics:{metric.name}:latest"
+            latest_key = f"{self._metric_key(metric)}:latest"
             await self.redis_client.set(latest_key, str(metric.value), ex=3600)
             
             # Guardar en serie temporal (opcional para métricas críticas)
             if metric.type in [MetricType.COUNTER, MetricType.GAUGE]:
-                ts_key = f"robertai:metrics:{metric.name}:timeseries"
+                ts_key = f"{self._metric_key(metric)}:timeseries"
                 timestamp = int(metric.timestamp)
                 await self.redis_client.zadd(ts_key, {str(metric.value): timestamp})
                 
@@ -695,6 +757,25 @@ class RealTimeMonitor:
         except Exception as e:
             logger.error(f"Error persisting metric: {e}")
     
+    async def _persist_metrics(self, metrics: List[Metric]):
+        """Persistir un lote de métricas en un solo pipeline"""
+        
+        if not metrics:
+            return
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for metric in metrics:
+                key = self._metric_key(metric)
+                pipe.set(f"{key}:latest", str(metric.value), ex=3600)
+                pipe.zadd(f"{key}:timeseries", {str(metric.value): int(metric.timestamp)})
+                pipe.zremrangebyrank(f"{key}:timeseries", 0, -1000)
+                pipe.expire(f"{key}:timeseries", self.metrics_retention_hours * 3600)
+            await pipe.execute()
+        
+        except Exception as e:
+            logger.error(f"Error persisting metrics batch: {e}")
+    
     async def _persist_alert(self, alert: Alert):
         """Persistir alerta en Redis"""
         
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Hierarchical Timing Wheel for RobertAI
+Expiración de temporizadores en O(1) por inserción/cancelación y costo proporcional a lo que vence
+"""
+
+import heapq
+import math
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+class HierarchicalTimingWheel:
+    """Rueda de tiempo jerárquica (segundos → minutos → horas por defecto)
+    
+    Cada nivel tiene `size` slots y cubre `span` ticks por slot. Los vencimientos
+    lejanos bajan de nivel (cascada) a medida que avanza el reloj; lo que excede
+    el último nivel espera en un heap de desborde.
+    """
+    
+    def __init__(self,
+                 tick: float = 1.0,
+                 wheel_sizes: Sequence[int] = (60, 60, 24),
+                 start_time: float = 0.0):
+        
+        self.tick = tick
+        self.wheel_sizes = list(wheel_sizes)
+        self.spans: List[int] = []
+        span = 1
+        for size in self.wheel_sizes:
+            self.spans.append(span)
+            span *= size
+        self.total_span = span
+        
+        self.levels: List[List[Set[Hashable]]] = [
+            [set() for _ in range(size)] for size in self.wheel_sizes
+        ]
+        self.overflow: List[Tuple[int, int, Hashable]] = []  # (tick, versión, item)
+        self.current_tick = self._to_tick(start_time)
+        
+        # item -> (tick de vencimiento, versión); la versión invalida entradas viejas del heap
+        self.timers: Dict[Hashable, Tuple[int, int]] = {}
+        self.slot_of: Dict[Hashable, Tuple[int, int]] = {}
+        self._version = 0
+    
+    def _to_tick(self, timestamp: float) -> int:
+        return int(math.floor(timestamp / self.tick))
+    
+    def schedule(self, item: Hashable, expires_at: float):
+        """Programar (o reprogramar) el vencimiento de un item"""
+        self.cancel(item)
+        
+        # Redondear hacia arriba: nunca vencer antes de tiempo
+        expire_tick = max(int(math.ceil(expires_at / self.tick)), self.current_tick + 1)
+        self._version += 1
+        self.timers[item] = (expire_tick, self._version)
+        self._place(item, expire_tick)
+    
+    def cancel(self, item: Hashable) -> bool:
+        """Cancelar el temporizador de un item"""
+        if self.timers.pop(item, None) is None:
+            return False
+        
+        slot = self.slot_of.pop(item, None)
+        if slot is not None:
+            level, index = slot
+            self.levels[level][index].discard(item)
+        # Las entradas en el heap de desborde se descartan al salir (versión vieja)
+        return True
+    
+    def advance(self, now: float) -> List[Hashable]:
+        """Avanzar el reloj hasta `now` y devolver los items vencidos"""
+        target_tick = self._to_tick(now)
+        expired: List[Hashable] = []
+        
+        while self.current_tick < target_tick:
+            self.current_tick += 1
+            
+            # Cascada: al completar una vuelta, bajar el slot correspondiente del nivel superior
+            for level in range(len(self.levels) - 1, 0, -1):
+                span = self.spans[level]
+                if self.current_tick % span == 0:
+                    index = (self.current_tick // span) % self.wheel_sizes[level]
+                    self._cascade(level, index)
+            
+            if self.current_tick % self.total_span == 0:
+                self._drain_overflow()
+            
+            slot = self.levels[0][self.current_tick % self.wheel_sizes[0]]
+            if slot:
+                due = list(slot)
+                slot.clear()
+                for item in due:
+                    expire_tick, _ = self.timers[item]
+                    del self.slot_of[item]
+                    if expire_tick <= self.current_tick:
+                        del self.timers[item]
+                        expired.append(item)
+                    else:
+                        self._place(item, expire_tick)
+        
+        return expired
+    
+    def next_expiration(self) -> Optional[float]:
+        """Tiempo aproximado del próximo vencimiento (para dormir hasta entonces)"""
+        if not self.timers:
+            return None
+        for offset in range(1, self.wheel_sizes[0] + 1):
+            tick = self.current_tick + offset
+            if self.levels[0][tick % self.wheel_sizes[0]]:
+                return tick * self.tick
+        return (self.current_tick + self.wheel_sizes[0]) * self.tick
+    
+    def _place(self, item: Hashable, expire_tick: int):
+        for level, (span, size) in enumerate(zip(self.spans, self.wheel_sizes)):
+            if expire_tick // span - self.current_tick // span < size:
+                index = (expire_tick // span) % size
+                self.levels[level][index].add(item)
+                self.slot_of[item] = (level, index)
+                return
+        
+        heapq.heappush(self.overflow, (expire_tick, self.timers[item][1], item))
+    
+    def _cascade(self, level: int, index: int):
+        slot = self.levels[level][index]
+        if not slot:
+            return
+        items = list(slot)
+        slot.clear()
+        for item in items:
+            del self.slot_of[item]
+            self._place(item, self.timers[item][0])
+    
+    def _drain_overflow(self):
+        limit = self.current_tick + self.total_span
+        while self.overflow and self.overflow[0][0] < limit:
+            expire_tick, version, item = heapq.heappop(self.overflow)
+            timer = self.timers.get(item)
+            if timer is None or timer[1] != version:
+                continue  # Cancelado o reprogramado
+            self._place(item, expire_tick)
+    
+    def __len__(self) -> int:
+        return len(self.timers)
+    
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self.timers
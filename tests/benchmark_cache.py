@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Cache Microbenchmarks for RobertAI
+Mide el costo por operación de las piezas internas de MassiveCacheStrategy
+"""
+
+import asyncio
+import argparse
+import hashlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services"))
+
+from cache_codec import CacheCodec, LegacyCodec
+from cache_eviction import EvictionPolicy, PromotionPolicy
+from cache_keys import HASH_ALGORITHM, FunctionKeyBuilder, memoized_hash, stable_hash
+from massive_cache import CacheEntry, MassiveCacheStrategy
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct))
+    return ordered[index]
+
+async def benchmark_l1_hit_latency(sizes: List[int], policy: EvictionPolicy,
+                                   lookups: int = 100000) -> List[Dict[str, Any]]:
+    """Latencia de hits en L1 para distintos tamaños de cache
+    
+    Con el motor O(1) la latencia debe mantenerse plana de 1k a 1M entradas.
+    """
+    results = []
+    
+    for size in sizes:
+        cache = MassiveCacheStrategy(
+            max_memory_cache_size=size + 1,
+            max_memory_size_bytes=1 << 40,
+            eviction_policy=policy
+        )
+        
+        # Poblar solo L1; get() resuelve los hits sin tocar Redis
+        for i in range(size):
+            await cache._set_l1(f"bench:{i}", i, 3600, 8)
+        
+        keys = [f"bench:{(i * 7919) % size}" for i in range(lookups)]
+        samples = []
+        for key in keys:
+            start = time.perf_counter()
+            await cache.get(key)
+            samples.append(time.perf_counter() - start)
+        
+        results.append({
+            "policy": policy.value,
+            "entries": size,
+            "mean_us": statistics.mean(samples) * 1e6,
+            "p50_us": _percentile(samples, 0.50) * 1e6,
+            "p99_us": _percentile(samples, 0.99) * 1e6
+        })
+    
+    return results
+
+async def benchmark_promotion(policy: PromotionPolicy, requests: int = 200000,
+                              l1_size: int = 2000, hot_keys: int = 10000,
+                              one_off_ratio: float = 0.5) -> Dict[str, Any]:
+    """Hit rate y churn de L1 según la política de promoción
+    
+    Mezcla lecturas Zipf sobre un conjunto caliente con lecturas únicas
+    (scans, usuarios nuevos). Los misses de L1 se tratan como hits de L2.
+    """
+    cache = MassiveCacheStrategy(
+        max_memory_cache_size=l1_size,
+        max_memory_size_bytes=1 << 40,
+        promotion_policy=policy
+    )
+    
+    rng = random.Random(42)
+    weights = [1 / (rank ** 1.1) for rank in range(1, hot_keys + 1)]
+    hot_sample = rng.choices(range(hot_keys), weights=weights, k=requests)
+    
+    for i in range(requests):
+        if rng.random() < one_off_ratio:
+            key = f"ai_response:once:{i}"
+        else:
+            key = f"ai_response:hot:{hot_sample[i]}"
+        
+        # Mismo camino de L1 que _lookup, sin Redis
+        cache.metrics.total_requests += 1
+        entry = cache.l1_cache.get(key)
+        if entry is not None:
+            entry.touch()
+            cache._l1_policy(key).record_access(key)
+            cache.metrics.hits += 1
+            cache.metrics.l1_hits += 1
+            continue
+        
+        remote = CacheEntry(key=key, value=i, created_at=time.time(), ttl=3600)
+        await cache._promote_to_l1(key, remote, "l2")
+    
+    stats = cache.get_cache_stats()["promotion"]
+    return {
+        "policy": policy.value,
+        "l1_hit_rate": stats["l1_hit_rate"],
+        "admission_rate": stats["admission_rate"],
+        "churn_rate": stats["churn_rate"],
+        "wasted_promotion_rate": stats["wasted_promotion_rate"],
+        "l1_evictions": stats["l1_evictions"]
+    }
+
+def _codec_samples() -> Dict[str, Any]:
+    """Valores representativos: respuesta AI, contexto de conversación y texto corto"""
+    ai_response = {
+        "text": "¡Claro! Te recuerdo mañana a las 9:00 revisar el informe trimestral.",
+        "type": "text",
+        "confidence": 0.93,
+        "intent": "create_reminder",
+        "entities": {"time": "09:00", "date": "tomorrow"}
+    }
+    conversation = {
+        "user_id": "5215512345678",
+        "conversation_stage": "active",
+        "history": [
+            {"role": "user" if i % 2 == 0 else "assistant",
+             "text": f"Mensaje número {i} sobre recordatorios y agenda de la semana",
+             "timestamp": 1700000000 + i * 30}
+            for i in range(60)
+        ]
+    }
+    return {
+        "ai_response": ai_response,
+        "conversation_context": conversation,
+        "short_text": "Hola, ¿cómo estás?"
+    }
+
+def benchmark_codecs(iterations: int = 5000) -> List[Dict[str, Any]]:
+    """CPU por operación y bytes por entrada: codec legacy vs codec binario"""
+    results = []
+    codecs = {"legacy": LegacyCodec(), "binary": CacheCodec()}
+    
+    for sample_name, value in _codec_samples().items():
+        for codec_name, codec in codecs.items():
+            payload = codec.encode(value, ttl=3600)
+            
+            start = time.process_time()
+            for _ in range(iterations):
+                codec.encode(value, ttl=3600)
+            encode_cpu = (time.process_time() - start) / iterations
+            
+            start = time.process_time()
+            for _ in range(iterations):
+                codec.decode(payload)
+            decode_cpu = (time.process_time() - start) / iterations
+            
+            results.append({
+                "sample": sample_name,
+                "codec": codec_name,
+                "bytes_per_entry": len(payload),
+                "encode_cpu_us": encode_cpu * 1e6,
+                "decode_cpu_us": decode_cpu * 1e6
+            })
+    
+    return results
+
+def benchmark_context_writes(turns: int = 200, max_turns: int = 50) -> List[Dict[str, Any]]:
+    """Bytes enviados a Redis por turno: reescribir el contexto completo vs append_turn
+    
+    El reemplazo completo crece con el historial hasta el tope; el delta se
+    mantiene en el tamaño de un turno.
+    """
+    codec = CacheCodec()
+    context = {"user_id": "5215512345678", "conversation_stage": "active", "history": []}
+    results = []
+    
+    for i in range(1, turns + 1):
+        turn = {"role": "user" if i % 2 else "assistant",
+                "text": f"Mensaje número {i} sobre recordatorios y agenda de la semana",
+                "timestamp": 1700000000 + i * 30}
+        context["history"] = (context["history"] + [turn])[-max_turns:]
+        
+        if i in (1, 10, max_turns, turns):
+            results.append({
+                "turn": i,
+                "full_rewrite_bytes": len(codec.encode(context, ttl=86400)),
+                "append_turn_bytes": len(codec.encode(turn, ttl=86400))
+            })
+    
+    return results
+
+def benchmark_key_derivation(iterations: int = 20000) -> List[Dict[str, Any]]:
+    """Costo de derivar claves: md5 sobre JSON/str(args) frente al hash estructural"""
+    def lookup_legacy(query_data):
+        return "ai_response:" + hashlib.md5(json.dumps(query_data, sort_keys=True).encode()).hexdigest()
+    
+    def context_legacy(context):
+        relevant = {key: context.get(key) for key in ("user_type", "conversation_stage", "last_intent")}
+        return hashlib.md5(json.dumps(relevant, sort_keys=True).encode()).hexdigest()
+    
+    def args_legacy(args, kwargs):
+        return "func:" + hashlib.md5((str(args) + str(sorted(kwargs.items()))).encode()).hexdigest()
+    
+    def summarize(user_id, messages, options=None):
+        return None
+    
+    builder = FunctionKeyBuilder(summarize)
+    context = {"user_id": "5215512345678", "user_type": "premium",
+               "conversation_stage": "active", "last_intent": "create_reminder"}
+    query_data = {"input": "recuérdame mañana revisar el informe", "context_hash": "a1b2c3d4e5f60718"}
+    big_args = ("5215512345678", [{"role": "user", "text": f"mensaje {i}", "ts": i} for i in range(500)])
+    big_kwargs = {"options": {"language": "es", "max_tokens": 256}}
+    
+    cases = {
+        "ai_query_key": (lambda: lookup_legacy(query_data), lambda: "ai_response:" + stable_hash(query_data)),
+        "context_hash": (lambda: context_legacy(context),
+                         lambda: memoized_hash((context.get("user_type"), context.get("conversation_stage"),
+                                                context.get("last_intent")))),
+        "cache_result_small_args": (lambda: args_legacy(("5215512345678", []), {}),
+                                    lambda: builder.build(("5215512345678", []), {})),
+        "cache_result_big_args": (lambda: args_legacy(big_args, big_kwargs),
+                                  lambda: builder.build(big_args, big_kwargs))
+    }
+    
+    results = []
+    for name, (legacy, structural) in cases.items():
+        timings = {}
+        for label, func in (("legacy", legacy), ("structural", structural)):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            timings[label] = (time.perf_counter() - start) / iterations * 1e6
+        results.append({
+            "case": name,
+            "hash": HASH_ALGORITHM,
+            "legacy_us": timings["legacy"],
+            "structural_us": timings["structural"],
+            "speedup": timings["legacy"] / timings["structural"]
+        })
+    
+    return results
+
+async def main():
+    parser = argparse.ArgumentParser(description="RobertAI cache microbenchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="Tamaños de L1 separados por coma")
+    parser.add_argument("--policies", default=",".join(p.value for p in EvictionPolicy),
+                        help="Políticas de expulsión separadas por coma")
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--codec-iterations", type=int, default=5000)
+    parser.add_argument("--promotion-requests", type=int, default=200000)
+    parser.add_argument("--context-turns", type=int, default=200)
+    parser.add_argument("--key-iterations", type=int, default=20000)
+    args = parser.parse_args()
+    
+    sizes = [int(s) for s in args.sizes.split(",")]
+    
+    report = {"l1_hit_latency": []}
+    for policy_name in args.policies.split(","):
+        report["l1_hit_latency"].extend(
+            await benchmark_l1_hit_latency(sizes, EvictionPolicy(policy_name), args.lookups)
+        )
+    
+    report["codecs"] = benchmark_codecs(args.codec_iterations)
+    report["promotion"] = [
+        await benchmark_promotion(policy, args.promotion_requests) for policy in PromotionPolicy
+    ]
+    report["context_writes"] = benchmark_context_writes(args.context_turns)
+    report["key_derivation"] = benchmark_key_derivation(args.key_iterations)
+    
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
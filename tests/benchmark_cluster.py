@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Redis Cluster Key Layout Benchmark for RobertAI
+Latencia de lecturas multi-clave por usuario: claves repartidas vs hash tag por usuario
+"""
+
+import asyncio
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services"))
+
+from redis.asyncio import RedisCluster
+
+from cache_cluster import group_by_slot, parse_cluster_nodes, user_key
+
+NAMESPACES = ["conversation", "user_profile", "ai_response", "func"]
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct))
+    return ordered[index]
+
+def spawn_local_cluster(nodes: int, base_port: int) -> List[subprocess.Popen]:
+    """Levantar instancias locales de redis-server en modo cluster como sustituto de un cluster real"""
+    if not shutil.which("redis-server") or not shutil.which("redis-cli"):
+        raise SystemExit("redis-server and redis-cli are required for --spawn")
+    
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="robertai-cluster-")
+    ports = [base_port + i for i in range(nodes)]
+    for port in ports:
+        node_dir = os.path.join(workdir, str(port))
+        os.makedirs(node_dir)
+        processes.append(subprocess.Popen(
+            ["redis-server", "--port", str(port), "--cluster-enabled", "yes",
+             "--cluster-config-file", "nodes.conf", "--save", "", "--appendonly", "no",
+             "--dir", node_dir],
+            stdout=subprocess.DEVNULL
+        ))
+    time.sleep(1.0)
+    
+    subprocess.run(
+        ["redis-cli", "--cluster", "create", *[f"127.0.0.1:{port}" for port in ports],
+         "--cluster-replicas", "0", "--cluster-yes"],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    time.sleep(2.0)  # Esperar a que el cluster propague la configuración
+    return processes
+
+def build_keys(layout: str, users: int, keys_per_user: int) -> Dict[str, List[str]]:
+    """Claves de cada usuario según el esquema de nombres"""
+    keys: Dict[str, List[str]] = {}
+    for user in range(users):
+        user_id = f"57300{user:07d}"
+        user_keys = []
+        for i in range(keys_per_user):
+            namespace = NAMESPACES[i % len(NAMESPACES)]
+            if layout == "tagged":
+                user_keys.append(f"robertai:l2:{user_key(namespace, user_id, str(i))}")
+            else:
+                # Esquema anterior: md5 por clave, cada una en un slot distinto
+                digest = hashlib.md5(f"{user_id}:{i}".encode()).hexdigest()
+                user_keys.append(f"robertai:l2:{namespace}:{digest}")
+        keys[user_id] = user_keys
+    return keys
+
+async def benchmark_layout(client: RedisCluster, layout: str, users: int, keys_per_user: int,
+                           iterations: int, value_size: int) -> Dict[str, Any]:
+    """Latencia de leer todas las claves de un usuario en un round trip lógico"""
+    keys_by_user = build_keys(layout, users, keys_per_user)
+    value = os.urandom(value_size)
+    
+    pipe = client.pipeline(transaction=False)
+    for user_keys in keys_by_user.values():
+        for key in user_keys:
+            pipe.setex(key, 600, value)
+    await pipe.execute()
+    
+    pipelined_samples = []
+    mget_samples = []
+    nodes_touched = []
+    user_keys_list = list(keys_by_user.values())
+    
+    for i in range(iterations):
+        user_keys = user_keys_list[i % len(user_keys_list)]
+        
+        # Pipeline de GETs (lo que hacía get_many antes)
+        start = time.perf_counter()
+        pipe = client.pipeline(transaction=False)
+        for key in user_keys:
+            pipe.get(key)
+        await pipe.execute()
+        pipelined_samples.append(time.perf_counter() - start)
+        
+        # Un MGET por slot, como _get_many_from_redis
+        start = time.perf_counter()
+        pipe = client.pipeline(transaction=False)
+        for group in group_by_slot(user_keys):
+            pipe.mget([user_keys[index] for index in group])
+        await pipe.execute()
+        mget_samples.append(time.perf_counter() - start)
+        
+        nodes_touched.append(len({client.get_node_from_key(key).name for key in user_keys}))
+    
+    await client.delete(*[key for user_keys in user_keys_list for key in user_keys])
+    
+    return {
+        "layout": layout,
+        "keys_per_user": keys_per_user,
+        "avg_slots_per_user": statistics.mean(len(group_by_slot(keys)) for keys in user_keys_list),
+        "avg_nodes_per_user": statistics.mean(nodes_touched),
+        "pipelined_get_p50_ms": _percentile(pipelined_samples, 0.50) * 1000,
+        "pipelined_get_p99_ms": _percentile(pipelined_samples, 0.99) * 1000,
+        "mget_by_slot_p50_ms": _percentile(mget_samples, 0.50) * 1000,
+        "mget_by_slot_p99_ms": _percentile(mget_samples, 0.99) * 1000
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="RobertAI Redis Cluster key layout benchmark")
+    parser.add_argument("--nodes", default=None,
+                        help="Nodos del cluster (host:puerto separados por coma)")
+    parser.add_argument("--spawn", type=int, default=0,
+                        help="Levantar N instancias locales de redis-server en modo cluster")
+    parser.add_argument("--base-port", type=int, default=17000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--keys-per-user", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--value-size", type=int, default=512)
+    parser.add_argument("--max-connections", type=int, default=64)
+    args = parser.parse_args()
+    
+    processes: List[subprocess.Popen] = []
+    if args.spawn:
+        processes = spawn_local_cluster(args.spawn, args.base_port)
+        nodes = [f"127.0.0.1:{args.base_port + i}" for i in range(args.spawn)]
+    elif args.nodes:
+        nodes = args.nodes.split(",")
+    else:
+        raise SystemExit("Use --nodes host:port,... or --spawn N")
+    
+    client: Optional[RedisCluster] = None
+    try:
+        client = RedisCluster(startup_nodes=parse_cluster_nodes(nodes),
+                              max_connections=args.max_connections, decode_responses=False)
+        await client.initialize()
+        
+        report = {
+            "nodes": nodes,
+            "results": [
+                await benchmark_layout(client, layout, args.users, args.keys_per_user,
+                                       args.iterations, args.value_size)
+                for layout in ("spread", "tagged")
+            ]
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        if client is not None:
+            await client.close()
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
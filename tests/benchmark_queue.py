@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Queue Dispatch Benchmark for RobertAI
+CPU en reposo, latencia de encolado a inicio y equidad entre usuarios con un usuario muy activo
+"""
+
+import asyncio
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services"))
+
+from massive_queue_processor import MassiveQueueProcessor, MessagePriority, MessageType, QueuedMessage
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct))
+    return ordered[index]
+
+class PollingQueueProcessor(MassiveQueueProcessor):
+    """Despacho anterior: cada worker sin trabajo duerme 100 ms y vuelve a mirar"""
+    
+    async def _get_next_message(self) -> QueuedMessage:
+        while True:
+            message = self.ready_queue.get_nowait()
+            if message is not None:
+                return message
+            await asyncio.sleep(0.1)
+
+async def _start_workers(processor: MassiveQueueProcessor):
+    """Arrancar solo los workers (sin Redis ni loops de fondo)"""
+    processor._register_default_processors()
+    await processor.start()
+    for task in (processor.monitoring_task, processor.retry_processor_task, processor.scheduled_processor_task):
+        task.cancel()
+
+async def _stop_workers(processor: MassiveQueueProcessor):
+    processor.running = False
+    for worker in processor.workers:
+        worker.cancel()
+    await asyncio.gather(*processor.workers, return_exceptions=True)
+    processor.thread_pool.shutdown(wait=False)
+
+async def benchmark_dispatch(processor_class, workers: int, idle_seconds: float,
+                             messages: int, interval: float) -> Dict[str, Any]:
+    processor = processor_class(max_workers=workers)
+    samples: List[float] = []
+    
+    async def record_start(message: QueuedMessage):
+        samples.append(time.perf_counter() - message.content["enqueued_at"])
+    
+    await _start_workers(processor)
+    processor.register_processor(MessageType.TEXT, record_start)
+    await asyncio.sleep(0.2)  # Dejar que los workers lleguen a su primera espera
+    
+    # CPU del proceso con todos los workers sin trabajo
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.sleep(idle_seconds)
+    idle_cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+    
+    # Mensajes espaciados: cada uno encuentra a los workers en reposo
+    for i in range(messages):
+        await processor.enqueue_message(
+            user_id=f"bench_{i}",  # Un usuario por mensaje: sin rate limit ni tope de concurrencia
+            message_type=MessageType.TEXT,
+            content={"enqueued_at": time.perf_counter()},
+            priority=MessagePriority.NORMAL
+        )
+        await asyncio.sleep(interval)
+    
+    deadline = time.perf_counter() + 5.0
+    while len(samples) < messages and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await _stop_workers(processor)
+    
+    return {
+        "dispatch": "polling" if processor_class is PollingQueueProcessor else "event",
+        "workers": workers,
+        "idle_cpu_percent": idle_cpu * 100,
+        "messages": len(samples),
+        "enqueue_to_start_p50_ms": _percentile(samples, 0.50) * 1000,
+        "enqueue_to_start_p99_ms": _percentile(samples, 0.99) * 1000,
+        "enqueue_to_start_mean_ms": statistics.mean(samples) * 1000
+    }
+
+async def benchmark_fairness(workers: int, chatty_backlog: int, light_users: int,
+                             work_seconds: float) -> Dict[str, Any]:
+    """Latencia de usuarios livianos detrás del backlog de un usuario muy activo"""
+    # Sin rate limit para aislar el efecto del scheduler
+    processor = MassiveQueueProcessor(max_workers=workers, rate_limits={MessageType.TEXT: None})
+    finished: Dict[str, List[float]] = {}
+    
+    async def simulated_work(message: QueuedMessage):
+        await asyncio.sleep(work_seconds)
+        finished.setdefault(message.user_id, []).append(time.perf_counter() - message.content["enqueued_at"])
+    
+    await _start_workers(processor)
+    processor.register_processor(MessageType.TEXT, simulated_work)
+    
+    for i in range(chatty_backlog):
+        await processor.enqueue_message("chatty", MessageType.TEXT, {"enqueued_at": time.perf_counter()})
+    for i in range(light_users):
+        await processor.enqueue_message(f"light_{i}", MessageType.TEXT, {"enqueued_at": time.perf_counter()})
+    
+    deadline = time.perf_counter() + 30.0
+    while sum(len(v) for v in finished.values()) < chatty_backlog + light_users and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    stats = processor.ready_queue.get_stats()
+    await _stop_workers(processor)
+    
+    light = [latency for user_id, latencies in finished.items() if user_id != "chatty" for latency in latencies]
+    return {
+        "workers": workers,
+        "chatty_backlog": chatty_backlog,
+        "light_users": light_users,
+        "light_p50_ms": _percentile(light, 0.50) * 1000,
+        "light_p99_ms": _percentile(light, 0.99) * 1000,
+        "chatty_last_ms": max(finished.get("chatty", [0.0])) * 1000,
+        "user_blocks": stats["user_blocks"]
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="RobertAI queue dispatch benchmark")
+    parser.add_argument("--workers", type=int, default=100)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=0.005,
+                        help="Segundos entre mensajes encolados")
+    parser.add_argument("--chatty-backlog", type=int, default=2000)
+    parser.add_argument("--light-users", type=int, default=200)
+    parser.add_argument("--work-ms", type=float, default=10.0)
+    args = parser.parse_args()
+    
+    report = {
+        "results": [
+            await benchmark_dispatch(processor_class, args.workers, args.idle_seconds,
+                                     args.messages, args.interval)
+            for processor_class in (PollingQueueProcessor, MassiveQueueProcessor)
+        ],
+        "fairness": await benchmark_fairness(args.workers, args.chatty_backlog,
+                                             args.light_users, args.work_ms / 1000)
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test fixtures for RobertAI
+Nodos del cache compartiendo un Redis en memoria (fakeredis)
+"""
+
+import contextlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services"))
+
+# Script de locust (se corre con `locust -f`), no es un módulo de pytest
+collect_ignore = ["locust_load_test.py"]
+
+@pytest.fixture
+def cache_nodes(monkeypatch):
+    """Fábrica de nodos MassiveCacheStrategy inicializados contra el mismo Redis
+    
+    Uso: async with cache_nodes(2, negative_cache_ttl=5) as (node_a, node_b): ...
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    from cache_cluster import shared_redis_clients
+    from massive_cache import MassiveCacheStrategy
+    
+    server = fakeredis.FakeServer()
+    
+    async def acquire(url, db=0, **kwargs):
+        return fakeredis.FakeAsyncRedis(server=server, db=db)
+    
+    async def release(client):
+        await client.aclose()
+    
+    monkeypatch.setattr(shared_redis_clients, "acquire", acquire)
+    monkeypatch.setattr(shared_redis_clients, "release", release)
+    
+    @contextlib.asynccontextmanager
+    async def start(count: int = 2, **kwargs):
+        nodes = [MassiveCacheStrategy(**kwargs) for _ in range(count)]
+        for node in nodes:
+            await node.initialize()
+        try:
+            yield nodes
+        finally:
+            for node in nodes:
+                await node.shutdown()
+    
+    return start
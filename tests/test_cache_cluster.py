@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Shared Redis Client Tests for RobertAI
+Un cliente por destino, compartido hasta que lo libera el último que lo pidió
+"""
+
+import asyncio
+
+import pytest
+
+import cache_cluster
+from cache_cluster import SharedRedisClients
+
+@pytest.fixture
+def fake_pools(monkeypatch):
+    """Pools de redis.asyncio con conexiones de fakeredis (mismo servidor para todos)"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from fakeredis.aioredis import FakeAsyncRedisConnection
+    
+    server = fakeredis.FakeServer()
+    pools = []
+    
+    def from_url(url, **kwargs):
+        pool = cache_cluster.ConnectionPool(connection_class=FakeAsyncRedisConnection, server=server, **kwargs)
+        pools.append(pool)
+        return pool
+    
+    monkeypatch.setattr(cache_cluster.ConnectionPool, "from_url", from_url)
+    return pools
+
+def test_clients_are_shared_per_target_and_closed_by_last_release(fake_pools):
+    async def scenario():
+        registry = SharedRedisClients()
+        first = await registry.acquire("redis://cache:6379", db=0, max_connections=8)
+        second = await registry.acquire("redis://cache:6379", db=0, max_connections=8)
+        other_db = await registry.acquire("redis://cache:6379", db=1)
+        
+        assert first is second and first is not other_db
+        assert len(fake_pools) == 2 and fake_pools[0].max_connections == 8
+        await first.set("k", b"v")
+        assert await second.get("k") == b"v"
+        assert await other_db.get("k") is None
+        
+        # El primer release no cierra: el otro usuario sigue usándolo
+        await registry.release(first)
+        assert registry.refcounts[("redis://cache:6379", 0, None)] == 1
+        assert await second.get("k") == b"v"
+        
+        await registry.release(second)
+        assert ("redis://cache:6379", 0, None) not in registry.clients
+        assert not any(connection.is_connected for connection in fake_pools[0]._available_connections)
+        
+        # Pedirlo de nuevo abre un pool nuevo
+        reopened = await registry.acquire("redis://cache:6379", db=0)
+        assert reopened is not first and len(fake_pools) == 3
+        
+        await registry.release(reopened)
+        await registry.release(other_db)
+        await registry.release(other_db)  # Liberar de más no falla
+        assert not registry.clients and not registry.refcounts
+    
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Cache Codec Tests for RobertAI
+Ida y vuelta con metadatos, payloads de formatos anteriores y headers corruptos que no pasan en silencio
+"""
+
+import pickle
+import struct
+
+import pytest
+
+from cache_codec import HEADER, CacheCodec, CodecError, Compression, LegacyCodec
+
+VALUE = {"user": "u1", "tags": ["a", "b"], "score": 0.5, "raw": b"\x00\x01", 7: None}
+
+def test_round_trip_keeps_value_and_metadata():
+    codec = CacheCodec()
+    decoded = codec.decode(codec.encode(VALUE, created_at=1000.0, ttl=60, soft_ttl=30, delta=0.25))
+    assert decoded.value == VALUE
+    assert (decoded.created_at, decoded.ttl, decoded.soft_ttl, decoded.delta) == (1000.0, 60, 30, 0.25)
+    assert decoded.compression == Compression.NONE
+    
+    plain = codec.decode(codec.encode("hola", ttl=5))
+    assert plain.value == "hola" and plain.soft_ttl is None
+
+def test_round_trip_compressed_value():
+    codec = CacheCodec(compression_threshold=64)
+    value = {"text": "respuesta " * 200}
+    decoded = codec.decode(codec.encode(value, ttl=60))
+    assert decoded.value == value
+    assert decoded.compression != Compression.NONE
+    assert codec.get_stats()["compression_ratio"] > 1
+
+def test_unsupported_types_raise_codec_error():
+    with pytest.raises(CodecError):
+        CacheCodec().encode(object())
+
+def test_legacy_json_payloads_still_decode():
+    codec = CacheCodec()
+    legacy = LegacyCodec(compression_threshold=64)
+    
+    small = codec.decode(legacy.encode({"name": "Ana"}, created_at=1000.0, ttl=60))
+    assert small.value == {"name": "Ana"}
+    assert (small.created_at, small.ttl) == (1000.0, 60)
+    
+    big = codec.decode(legacy.encode(["x" * 10] * 50, ttl=60))
+    assert big.value == ["x" * 10] * 50
+    assert big.compression == Compression.ZLIB
+    
+    assert codec.decode(legacy.encode("texto plano", ttl=60)).value == "texto plano"
+
+def test_pickle_era_payloads_are_refused():
+    pickle_format_byte = (1 << 4) | (1 << 2)  # versión 1, serializador pickle, sin compresión
+    payload = HEADER.pack(pickle_format_byte, 1000.0, 60, 0, 0.0) + pickle.dumps({"a": 1})
+    with pytest.raises(ValueError, match="pickle"):
+        CacheCodec().decode(payload)
+    
+    # Pickle crudo empieza con 0x80 y parece un dict legacy: tampoco se carga
+    with pytest.raises(ValueError):
+        CacheCodec().decode(pickle.dumps({"a": 1}))
+
+def test_truncated_or_corrupt_payloads_raise():
+    codec = CacheCodec()
+    payload = codec.encode(VALUE, ttl=60)
+    
+    for truncated in (b"", payload[:1], payload[:HEADER.size - 1], payload[:-3]):
+        with pytest.raises(ValueError):
+            codec.decode(truncated)
+    
+    wrong_version = bytes([(2 << 4) | payload[0] & 0xF]) + payload[1:]
+    with pytest.raises(ValueError, match="version"):
+        codec.decode(wrong_version)
+    
+    # Bit de compresión dañado: el cuerpo msgpack no es zlib
+    flipped = bytes([payload[0] | Compression.ZLIB.value]) + payload[1:]
+    with pytest.raises(ValueError):
+        codec.decode(flipped)
+    
+    with pytest.raises(ValueError):
+        codec.decode(payload + b"\x01")
+    
+    legacy = LegacyCodec(compression_threshold=0).encode({"a": "b" * 100}, ttl=60)
+    with pytest.raises(ValueError):
+        codec.decode(legacy[:-4])
+
+def test_header_layout_is_stable():
+    assert HEADER.size == struct.calcsize("!BdIIf") == 21
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Conversation Context Tests for RobertAI
+Con el L1 vencido se lee el hash vivo de L2 antes que el checkpoint de L3
+"""
+
+import asyncio
+
+from cache_cluster import user_key
+
+def test_expired_l1_reads_turns_appended_by_other_node(cache_nodes):
+    async def scenario():
+        async with cache_nodes(2) as (node_a, node_b):
+            context = {"topic": "envíos", "history": [f"turno {i}" for i in range(5)]}
+            assert await node_a.set_conversation_context("u1", context)
+            for i in range(5, 13):
+                assert await node_b.append_turn("u1", f"turno {i}")
+            
+            # La copia de A en L1 vence; el checkpoint de L3 sigue con 5 turnos
+            node_a.l1_cache[user_key("conversation", "u1")].created_at -= 86400 * 2
+            context = await node_a.get_conversation_context("u1")
+            assert context["topic"] == "envíos"
+            assert context["history"] == [f"turno {i}" for i in range(13)]
+    
+    asyncio.run(scenario())
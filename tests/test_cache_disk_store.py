@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Disk Log Store Tests for RobertAI
+CRC de registros, borrados que sobreviven a la compactación y reconstrucción del índice tras una caída
+"""
+
+import os
+import time
+
+from cache_disk_store import RECORD_HEADER, DiskLogStore
+
+SEGMENT_SIZE = 1024
+
+def open_store(directory) -> DiskLogStore:
+    store = DiskLogStore(str(directory), segment_size=SEGMENT_SIZE, index_capacity=64)
+    store.open()
+    return store
+
+def crash(store: DiskLogStore):
+    """Soltar los archivos sin close(): el índice queda marcado como sucio"""
+    for segment_id in list(store.segments):
+        store._unmap_segment(segment_id)
+    store._close_index()
+
+def read(store: DiskLogStore, key: str):
+    value = store.get(key)
+    return bytes(value) if value is not None else None
+
+def fill_until_segment(store: DiskLogStore, segment_id: int, key: str = "filler"):
+    while store.active_segment < segment_id:
+        store.put(key, b"f" * 200)
+
+def test_rebuild_after_unclean_shutdown(tmp_path):
+    store = open_store(tmp_path)
+    store.put("a", b"1")
+    store.put("b", b"2")
+    store.put("a", b"3")
+    store.delete("b")
+    store.put("gone", b"x", ttl=0.001)
+    fill_until_segment(store, 1)
+    store.put("c", b"4")
+    crash(store)
+    time.sleep(0.01)
+    
+    store = open_store(tmp_path)
+    assert store.stats["index_rebuilds"] == 1
+    assert (read(store, "a"), read(store, "b"), read(store, "gone"), read(store, "c")) == (b"3", None, None, b"4")
+    assert sorted(store.keys()) == ["a", "c", "filler"]
+    
+    # Las escrituras siguen después del último registro válido
+    store.put("d", b"5")
+    store.close()
+    store = open_store(tmp_path)
+    assert store.stats["index_rebuilds"] == 0
+    assert (read(store, "a"), read(store, "c"), read(store, "d")) == (b"3", b"4", b"5")
+    store.close()
+
+def test_corrupt_record_is_rejected_by_crc(tmp_path):
+    store = open_store(tmp_path)
+    store.put("a", b"first")
+    offset = store.write_offset
+    store.put("a", b"second")
+    assert read(store, "a") == b"second"
+    crash(store)
+    
+    # Un byte del valor dañado (escritura a medias): el registro no pasa el CRC
+    with open(os.path.join(tmp_path, "segment-00000000.log"), "r+b") as f:
+        f.seek(offset + RECORD_HEADER.size + 1)
+        f.write(b"X")
+    
+    store = open_store(tmp_path)
+    assert read(store, "a") == b"first"
+    assert store.write_offset == offset  # El registro dañado se sobrescribe
+    store.put("b", b"new")
+    crash(store)
+    
+    store = open_store(tmp_path)
+    assert (read(store, "a"), read(store, "b")) == (b"first", b"new")
+    store.close()
+
+def test_tombstone_survives_compaction_and_rebuild(tmp_path):
+    store = open_store(tmp_path)
+    store.put("keep", b"k" * 600)  # Segmento 0 queda con poca basura y no se compacta
+    store.put("victim", b"v" * 50)
+    fill_until_segment(store, 1)
+    store.delete("victim")  # Tombstone en el segmento 1
+    fill_until_segment(store, 2)
+    
+    assert store.needs_compaction()
+    assert store.compact(max_segments=4) > 0
+    assert not os.path.exists(os.path.join(tmp_path, "segment-00000001.log"))
+    assert os.path.exists(os.path.join(tmp_path, "segment-00000000.log"))
+    assert read(store, "victim") is None
+    crash(store)
+    
+    # Sin el tombstone reescrito, el registro viejo del segmento 0 revive la clave
+    store = open_store(tmp_path)
+    assert store.stats["index_rebuilds"] == 1
+    assert read(store, "victim") is None
+    assert read(store, "keep") == b"k" * 600
+    store.close()
+
+def test_compact_step_is_incremental(tmp_path):
+    store = open_store(tmp_path)
+    for i in range(6):
+        store.put(f"key{i}", f"value-{i}".encode() * 3)
+    store.put("big", b"b" * 900)  # No entra: pasa al segmento 1
+    assert store.active_segment == 1
+    
+    assert store.compact_step(record_budget=2) == 0
+    assert store.compacting
+    
+    # Entre tramos se lee y escribe normalmente
+    store.put("key4", b"rewritten")
+    assert store.delete("key5")
+    assert read(store, "key1") == b"value-1" * 3
+    
+    steps = 1
+    while True:
+        reclaimed = store.compact_step(record_budget=2)
+        steps += 1
+        if reclaimed:
+            break
+    assert steps >= 3
+    assert not store.compacting
+    assert store.stats["compactions"] == 1
+    assert not os.path.exists(os.path.join(tmp_path, "segment-00000000.log"))
+    
+    expected = {f"key{i}": f"value-{i}".encode() * 3 for i in range(4)}
+    expected.update({"key4": b"rewritten", "key5": None, "big": b"b" * 900})
+    assert {key: read(store, key) for key in expected} == expected
+    
+    store.close()
+    store = open_store(tmp_path)
+    assert {key: read(store, key) for key in expected} == expected
+    store.close()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Eviction Engine Tests for RobertAI
+Orden de expulsión de LRU, LFU y W-TinyLFU y llenado de las regiones de W-TinyLFU
+"""
+
+from cache_eviction import LFUEngine, LRUEngine, WTinyLFUEngine
+
+def _insert(engine, key: str, capacity: int):
+    """Insertar como lo hace el L1: expulsar víctimas hasta volver a la capacidad"""
+    evicted = []
+    engine.record_insert(key)
+    while len(engine) > capacity:
+        victim = engine.select_victim()
+        engine.remove(victim)
+        evicted.append(victim)
+    return evicted
+
+def test_lru_evicts_least_recently_used():
+    engine = LRUEngine(3)
+    for key in ("a", "b", "c"):
+        engine.record_insert(key)
+    engine.record_access("a")
+    assert engine.select_victim() == "b"
+    engine.remove("b")
+    assert engine.select_victim() == "c"
+
+def test_lfu_evicts_least_frequent_then_oldest():
+    engine = LFUEngine(3)
+    for key in ("a", "b", "c"):
+        engine.record_insert(key)
+    engine.record_access("a")
+    engine.record_access("a")
+    engine.record_access("c")
+    assert engine.select_victim() == "b"
+    engine.remove("b")
+    assert engine.select_victim() == "c"
+    engine.remove("c")
+    assert engine.select_victim() == "a"
+
+def test_wtinylfu_fills_main_region():
+    engine = WTinyLFUEngine(100, window_ratio=0.1, protected_ratio=0.8)
+    for index in range(100):
+        assert _insert(engine, f"k{index}", 100) == []
+    assert len(engine.window) == engine.window_capacity == 10
+    assert len(engine.probation) == 90 and len(engine.protected) == 0
+    
+    # Las releídas pasan a protected, acotada a su cuota
+    for index in range(100):
+        engine.record_access(f"k{index}")
+    assert len(engine.protected) == engine.protected_capacity == 72
+    assert len(engine) == 100
+
+def _hot_key_misses(engine, rounds: int = 20, scan_length: int = 200) -> int:
+    """Lecturas de 20 claves frecuentes intercaladas con recorridos de claves de una sola lectura"""
+    hot = [f"hot{index}" for index in range(20)]
+    misses = 0
+    for round_index in range(rounds):
+        for key in hot:
+            if key in engine:
+                engine.record_access(key)
+            else:
+                misses += 1
+                _insert(engine, key, 100)
+        for index in range(scan_length):
+            _insert(engine, f"scan{round_index}:{index}", 100)
+    return misses
+
+def test_wtinylfu_keeps_frequent_keys_through_scans():
+    # LRU pierde las frecuentes en cada recorrido; W-TinyLFU las protege tras las primeras lecturas
+    assert _hot_key_misses(LRUEngine(100)) == 400
+    assert _hot_key_misses(WTinyLFUEngine(100, window_ratio=0.1)) < 200
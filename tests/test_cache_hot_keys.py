@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Hot Key Replica Tests for RobertAI
+Las réplicas en L2 de una clave caliente siguen a las escrituras de cualquier nodo
+"""
+
+import asyncio
+
+from massive_cache import REPLICATED_KEYS_KEY
+
+def test_replicas_follow_writes_from_other_nodes(cache_nodes):
+    async def scenario():
+        async with cache_nodes(2, hot_key_replicas=2, hot_key_min_count=1) as (node_a, node_b):
+            await node_a.set("catalog:top", {"version": 1})
+            for _ in range(5):
+                node_a.hot_key_detector.record("catalog:top")
+            
+            # A anuncia la clave y en el ciclo siguiente escribe las copias; B se entera entre medio
+            await node_a._refresh_hot_keys()
+            await node_b._refresh_hot_keys()
+            await node_a._refresh_hot_keys()
+            replica_keys = node_a._replica_keys_for("catalog:top")
+            assert replica_keys and all([await node_a.redis_client.exists(key) for key in replica_keys])
+            assert "catalog:top" in node_b.replicated_keys
+            
+            # B no la detectó caliente, pero su escritura actualiza las copias
+            assert "catalog:top" not in node_b.hot_key_detector.hot_keys()
+            await node_b.set("catalog:top", {"version": 2})
+            for key in replica_keys:
+                entry = node_a._entry_from_payload("catalog:top", await node_a.redis_client.get(key))
+                assert entry.value == {"version": 2}
+            
+            await node_b.delete("catalog:top")
+            assert not any([await node_a.redis_client.exists(key) for key in replica_keys])
+            assert await node_a.redis_client.zscore(REPLICATED_KEYS_KEY, "catalog:top") is not None
+    
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Cache Key Tests for RobertAI
+Claves estables ante el orden de los dicts y llamadas inválidas que no se tragan en silencio
+"""
+
+import pytest
+
+from cache_keys import FunctionKeyBuilder, stable_hash
+
+def test_nested_dict_order_does_not_change_hash():
+    first = {"filters": {"lang": "es", "tags": [{"a": 1, "b": 2}]}, "limit": 10}
+    second = {"limit": 10, "filters": {"tags": [{"b": 2, "a": 1}], "lang": "es"}}
+    assert stable_hash(first) == stable_hash(second)
+    assert stable_hash({"a": 1}) != stable_hash([["a", 1]])
+
+def test_var_keyword_arguments_are_sorted_at_every_level():
+    def search(**filters):
+        pass
+    
+    builder = FunctionKeyBuilder(search)
+    assert (builder.build((), {"user": {"id": 1, "plan": "pro"}, "lang": "es"})
+            == builder.build((), {"lang": "es", "user": {"plan": "pro", "id": 1}}))
+
+def test_fast_path_rejects_invalid_keyword_arguments():
+    def get_profile(user_id, lang="es"):
+        pass
+    
+    builder = FunctionKeyBuilder(get_profile)
+    assert builder.build(("u1",), {}) == builder.build((), {"user_id": "u1", "lang": "es"})
+    with pytest.raises(TypeError):
+        builder.build(("u1",), {"typo": 2})
+    with pytest.raises(TypeError):
+        builder.build(("u1",), {"user_id": "u2"})
+
+def test_non_text_keys_keep_their_type():
+    assert stable_hash({1: "a", "b": 2}) == stable_hash({"b": 2, 1: "a"})
+    assert stable_hash({True: 1, "a": 2}) != stable_hash({1: 1, "a": 2})
+    assert stable_hash([{"x": 1, "y": 2}, {"y": 2, "x": 1}]) == stable_hash([{"y": 2, "x": 1}] * 2)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Negative Cache Tests for RobertAI
+Un miss recordado en un nodo no tapa la escritura que otro nodo hace después
+"""
+
+import asyncio
+
+def test_remote_set_visible_after_local_miss_without_bus(cache_nodes):
+    async def scenario():
+        async with cache_nodes(2) as (node_a, node_b):
+            assert node_a.negative_cache is None
+            assert await node_a.get("user:u2") is None
+            await node_b.set("user:u2", {"name": "Ana"})
+            assert await node_a.get("user:u2") == {"name": "Ana"}
+    
+    asyncio.run(scenario())
+
+def test_remote_set_clears_tombstone_with_bus(cache_nodes):
+    async def scenario():
+        async with cache_nodes(2, enable_invalidation_bus=True) as (node_a, node_b):
+            assert node_a.negative_cache is not None
+            assert await node_a.get("user:u2") is None
+            assert await node_a.get("user:u2") is None
+            assert node_a.metrics.negative_hits == 1
+            
+            await node_b.set("user:u2", {"name": "Ana"})
+            for _ in range(50):
+                value = await node_a.get("user:u2")
+                if value is not None:
+                    break
+                await asyncio.sleep(0.02)
+            assert value == {"name": "Ana"}
+    
+    asyncio.run(scenario())
+
+def test_bloom_filter_knows_keys_written_before_it_was_enabled(cache_nodes):
+    async def scenario():
+        async with cache_nodes(1) as (legacy,):
+            await legacy.set("user:old", {"name": "Beto"})
+        
+        async with cache_nodes(2, bloom_namespaces={"user": 1000}) as (node_a, node_b):
+            assert node_a.bloom_ready == {"user"} and node_b.bloom_ready == {"user"}
+            assert await node_b.get("user:old") == {"name": "Beto"}
+            assert await node_a.get("user:never") is None
+            assert node_a.metrics.bloom_rejections == 1
+    
+    asyncio.run(scenario())
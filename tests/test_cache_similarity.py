@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Query Normalization Tests for RobertAI
+Consultas sin palabras (solo emojis o puntuación) no comparten clave de cache
+"""
+
+import asyncio
+
+from cache_similarity import normalize_query
+
+def test_normalize_query_without_words_returns_none():
+    assert normalize_query("👍") is None
+    assert normalize_query("?!...") is None
+    assert normalize_query("   ") is None
+    assert normalize_query("¡Hola!! 👋") == "hola"
+
+def test_symbol_only_queries_are_not_cached(cache_nodes):
+    async def scenario():
+        async with cache_nodes(1) as (cache,):
+            assert await cache.cache_ai_response("👎", {}, {"text": "lo siento"}) is False
+            assert await cache.get_cached_ai_response("👍", {}) is None
+            
+            # Las consultas con palabras se siguen cacheando
+            assert await cache.cache_ai_response("¡Hola!!", {}, {"text": "hola"})
+            response = await cache.get_cached_ai_response("hola", {})
+            assert response["text"] == "hola"
+    
+    asyncio.run(scenario())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Single-Flight Tests for RobertAI
+Una sola computación por clave entre llamadas concurrentes y tombstones de get_many protegidos ante un set
+"""
+
+import asyncio
+
+import massive_cache as massive_cache_module
+from massive_cache import cache_result
+
+def slow_compute(calls: list, value, delay: float = 0.05):
+    async def compute():
+        calls.append(value)
+        await asyncio.sleep(delay)
+        return value
+    return compute
+
+def test_concurrent_callers_share_one_computation(cache_nodes):
+    async def scenario():
+        async with cache_nodes(1) as (node,):
+            calls = []
+            results = await asyncio.gather(*(
+                node.get_or_compute("report:1", slow_compute(calls, {"total": 3}), ttl=60)
+                for _ in range(20)
+            ))
+            assert results == [{"total": 3}] * 20
+            assert len(calls) == 1
+            assert node.metrics.computations == 1
+            assert node.metrics.coalesced_requests == 19
+            assert not node.inflight_computations
+            
+            assert await node.get_or_compute("report:1", slow_compute(calls, None), ttl=60) == {"total": 3}
+            assert len(calls) == 1
+    
+    asyncio.run(scenario())
+
+def test_leader_failure_reaches_waiters_and_is_not_cached(cache_nodes):
+    async def scenario():
+        async with cache_nodes(1) as (node,):
+            calls = []
+            
+            async def failing():
+                calls.append(1)
+                await asyncio.sleep(0.02)
+                raise RuntimeError("backend down")
+            
+            results = await asyncio.gather(
+                *(node.get_or_compute("report:2", failing, ttl=60) for _ in range(5)),
+                return_exceptions=True
+            )
+            assert len(calls) == 1
+            assert all(isinstance(result, RuntimeError) for result in results)
+            assert not node.inflight_computations
+            
+            assert await node.get_or_compute("report:2", slow_compute(calls, "ok"), ttl=60) == "ok"
+            assert len(calls) == 2
+    
+    asyncio.run(scenario())
+
+def test_cache_result_coalesces_per_arguments(cache_nodes, monkeypatch):
+    async def scenario():
+        async with cache_nodes(1) as (node,):
+            monkeypatch.setattr(massive_cache_module, "massive_cache", node)
+            calls = []
+            
+            @cache_result(ttl=60)
+            async def profile(user_id: str):
+                calls.append(user_id)
+                await asyncio.sleep(0.05)
+                return {"user": user_id}
+            
+            results = await asyncio.gather(*(profile(user_id) for user_id in ["u1", "u2"] * 5))
+            assert results == [{"user": "u1"}, {"user": "u2"}] * 5
+            assert sorted(calls) == ["u1", "u2"]
+    
+    asyncio.run(scenario())
+
+def test_distributed_lease_computes_once_across_nodes(cache_nodes):
+    async def scenario():
+        async with cache_nodes(2, lease_ttl=2.0) as (node_a, node_b):
+            calls = []
+            results = await asyncio.gather(
+                node_a.get_or_compute("report:3", slow_compute(calls, "a", 0.2), ttl=60, distributed=True),
+                node_b.get_or_compute("report:3", slow_compute(calls, "b", 0.2), ttl=60, distributed=True)
+            )
+            assert len(calls) == 1
+            assert results == [calls[0]] * 2
+    
+    asyncio.run(scenario())
+
+def test_get_many_leaves_tombstones_for_confirmed_misses(cache_nodes):
+    async def scenario():
+        async with cache_nodes(2, negative_cache_ttl=30) as (node, writer):
+            await writer.set("user:u1", {"name": "Ana"})
+            
+            result = await node.get_many(["user:u1", "user:u2"])
+            assert result == {"user:u1": {"name": "Ana"}, "user:u2": None}
+            assert list(node.negative_cache.tombstones) == ["user:u2"]
+            assert not node.negative_cache.probing
+            
+            assert await node.get("user:u2") is None
+            assert node.metrics.negative_hits == 1
+    
+    asyncio.run(scenario())
+
+def test_get_many_set_during_read_does_not_leave_tombstone(cache_nodes):
+    async def scenario():
+        async with cache_nodes(1, negative_cache_ttl=30) as (node,):
+            read_l2 = node._get_many_from_redis
+            
+            async def racing_read(client, prefix, keys, **kwargs):
+                found = await read_l2(client, prefix, keys, **kwargs)
+                if prefix == "robertai:l2":
+                    # El set llega después de que L2 respondió miss y antes de cerrar la búsqueda
+                    await node.set("user:u3", {"name": "Beto"})
+                return found
+            
+            node._get_many_from_redis = racing_read
+            assert await node.get_many(["user:u3", "user:u4"]) == {"user:u3": None, "user:u4": None}
+            del node._get_many_from_redis
+            
+            assert "user:u3" not in node.negative_cache.tombstones
+            assert "user:u4" in node.negative_cache.tombstones
+            assert await node.get("user:u3") == {"name": "Beto"}
+    
+    asyncio.run(scenario())
+
+def test_get_many_redis_error_does_not_leave_tombstones(cache_nodes):
+    async def scenario():
+        async with cache_nodes(1, negative_cache_ttl=30) as (node,):
+            def broken_pipeline(*args, **kwargs):
+                raise ConnectionError("redis down")
+            
+            node.redis_client.pipeline = broken_pipeline
+            assert await node.get_many(["user:u5"]) == {"user:u5": None}
+            del node.redis_client.pipeline
+            
+            assert not node.negative_cache.tombstones
+            assert not node.negative_cache.probing
+    
+    asyncio.run(scenario())
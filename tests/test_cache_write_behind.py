@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Buffer Tests for RobertAI
+Coalescer no pierde niveles y con Redis caído el buffer no crece sin límite
+"""
+
+import asyncio
+
+from cache_write_behind import PendingWrite, WriteBehindBuffer
+
+def _write(payload: bytes, to_l3: bool = False, tags=()) -> PendingWrite:
+    return PendingWrite(payload=payload, ttl=60, to_l2=True, to_l3=to_l3, tags=list(tags))
+
+def test_coalescing_keeps_levels_and_tags():
+    async def scenario():
+        flushed = {}
+        async def flush_func(batch):
+            flushed.update(batch)
+        
+        buffer = WriteBehindBuffer(flush_func)
+        await buffer.put("k", _write(b"v1", to_l3=True, tags=["user:1"]))
+        await buffer.put("k", _write(b"v2", tags=["profile"]))
+        assert await buffer.flush()
+        
+        assert flushed["k"].payload == b"v2"
+        assert flushed["k"].to_l3
+        assert flushed["k"].tags == ["user:1", "profile"]
+    
+    asyncio.run(scenario())
+
+def test_failed_flush_requeue_merges_into_newer_write():
+    async def scenario():
+        buffer = None
+        async def flush_func(batch):
+            # Llega una escritura más nueva mientras el lote está en vuelo
+            await buffer.put("k", _write(b"v2"))
+            raise ConnectionError("redis down")
+        
+        buffer = WriteBehindBuffer(flush_func)
+        await buffer.put("k", _write(b"v1", to_l3=True))
+        assert not await buffer.flush()
+        
+        assert buffer.pending["k"].payload == b"v2"
+        assert buffer.pending["k"].to_l3
+    
+    asyncio.run(scenario())
+
+def test_full_buffer_rejects_writes_while_flush_fails():
+    async def scenario():
+        async def flush_func(batch):
+            raise ConnectionError("redis down")
+        
+        buffer = WriteBehindBuffer(flush_func, max_pending=3, max_batch_size=2)
+        for index in range(3):
+            assert await buffer.put(f"k{index}", _write(b"v"))
+        
+        assert not await buffer.put("k3", _write(b"v"))
+        assert len(buffer.pending) == 3
+        assert buffer.get_stats()["rejected"] == 1
+        
+        # Sobre una clave pendiente se coalesce aunque el buffer esté lleno
+        assert await buffer.put("k0", _write(b"v2"))
+        assert len(buffer.pending) == 3
+    
+    asyncio.run(scenario())
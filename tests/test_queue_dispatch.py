@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Queue Dispatch Tests for RobertAI
+Un rate limit sobre un tipo de mensaje no frena los demás tipos del mismo usuario
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from queue_dispatch import WAIT_FOR_RELEASE, ReadyQueue
+
+@dataclass
+class Message:
+    user_id: str
+    priority: str
+    message_type: str
+    created_at: float = field(default_factory=time.time)
+
+def test_rate_limited_type_does_not_block_other_types():
+    async def scenario():
+        limited = {("u1", "video")}
+        queue = ReadyQueue(["critical", "high", "low"],
+                           admit=lambda message: 30.0 if (message.user_id, message.message_type) in limited else 0.0)
+        queue.put_nowait(Message("u1", "low", "video"))
+        assert queue.get_nowait() is None
+        assert ("u1", "video") in queue.blocked and "u1" not in queue.blocked
+        
+        text = Message("u1", "critical", "text")
+        queue.put_nowait(text)
+        assert queue.get_nowait() is text
+        
+        # Al vencer la espera el video vuelve a ser elegible
+        limited.clear()
+        queue.release(("u1", "video"))
+        assert queue.get_nowait().message_type == "video"
+        assert not queue.unblock_timers
+    
+    asyncio.run(scenario())
+
+def test_concurrency_wait_blocks_whole_user_until_release():
+    async def scenario():
+        busy = {"u1"}
+        queue = ReadyQueue(["critical", "low"],
+                           admit=lambda message: WAIT_FOR_RELEASE if message.user_id in busy else 0.0)
+        queue.put_nowait(Message("u1", "low", "video"))
+        assert queue.get_nowait() is None
+        queue.put_nowait(Message("u1", "critical", "text"))
+        assert queue.get_nowait() is None
+        
+        busy.clear()
+        queue.release("u1")
+        assert queue.get_nowait().message_type == "text"
+        assert queue.get_nowait().message_type == "video"
+    
+    asyncio.run(scenario())
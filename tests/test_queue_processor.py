@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Queue Processor Tests for RobertAI
+Un usuario devuelto por el rate limit compartido no queda bloqueado para siempre
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aioredis")
+
+from massive_queue_processor import MassiveQueueProcessor, MessagePriority, MessageType, QueuedMessage
+
+class YieldingLimiter:
+    """Límite compartido de mentira: cede el loop como una llamada a Redis y rechaza la primera"""
+    
+    def __init__(self, rejections: int = 1, wait: float = 0.05):
+        self.rejections = rejections
+        self.wait = wait
+    
+    async def acquire(self, user_id, message_type, tier=None):
+        await asyncio.sleep(0)
+        if self.rejections:
+            self.rejections -= 1
+            return self.wait
+        return 0.0
+
+def test_shared_rate_limit_defer_does_not_strand_user():
+    async def scenario():
+        processor = MassiveQueueProcessor(max_workers=2, max_concurrent_per_user=1)
+        processor.shared_rate_limiter = YieldingLimiter()
+        processed = []
+        
+        async def handle(message):
+            processed.append(message.id)
+        
+        processor.message_processors[MessageType.TEXT] = handle
+        for index in range(4):
+            processor.ready_queue.put_nowait(QueuedMessage(
+                id=f"m{index}", user_id="u1", message_type=MessageType.TEXT,
+                priority=MessagePriority.HIGH, content={}
+            ))
+        
+        processor.running = True
+        workers = [asyncio.create_task(processor._worker(f"worker-{index}")) for index in range(2)]
+        try:
+            for _ in range(100):
+                if len(processed) == 4:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            processor.running = False
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            processor.thread_pool.shutdown(wait=False)
+        
+        assert sorted(processed) == ["m0", "m1", "m2", "m3"]
+        assert not processor.ready_queue.blocked
+    
+    asyncio.run(scenario())
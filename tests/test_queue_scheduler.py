@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Scheduled Delivery Tests for RobertAI
+Lo reclamado o programado cerca sigue en Redis hasta activarse: otro pod lo retoma si el dueño cae
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import asdict, dataclass
+
+import pytest
+
+from queue_scheduler import ScheduledDelivery
+
+@dataclass
+class Scheduled:
+    id: str
+    scheduled_at: float
+
+def _pod(redis_client, activated, **kwargs):
+    delivery = ScheduledDelivery(
+        encode=lambda message: json.dumps(asdict(message)).encode(),
+        decode=lambda payload: Scheduled(**json.loads(payload)),
+        activate=activated.extend,
+        **kwargs
+    )
+    delivery.redis_client = redis_client
+    return delivery
+
+@pytest.fixture
+def redis_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # EVAL del script de reclamo
+    return fakeredis.FakeAsyncRedis()
+
+def test_claimed_messages_survive_a_crash(redis_client):
+    async def scenario():
+        crashed, survivor = [], []
+        pod_a = _pod(redis_client, crashed, horizon=0.2, lease_ttl=0.1)
+        far = Scheduled("far", time.time() + 0.3)
+        await pod_a.schedule(far)
+        assert await redis_client.zscore(pod_a.due_key, "far") is not None
+        
+        # A lo reclama a su rueda y cae antes de activarlo; cerca del vencimiento programa otro
+        assert await pod_a.claim_due(far.scheduled_at) == 1
+        near = Scheduled("near", time.time() + 0.1)
+        await pod_a.schedule(near)
+        assert await redis_client.zscore(pod_a.due_key, "far") is None
+        assert await redis_client.zcard(pod_a.processing_key) == 2
+        
+        pod_b = _pod(redis_client, survivor, horizon=0.2, lease_ttl=0.1)
+        await pod_b.run_once()
+        assert survivor == [] and pod_b.reclaimed == 0  # Leases vigentes
+        
+        await asyncio.sleep(far.scheduled_at + 0.15 - time.time())
+        pod_b.next_poll = 0.0
+        await pod_b.run_once()
+        await asyncio.sleep(0.02)  # Los vencidos salen en el próximo tick de la rueda
+        await pod_b.run_once()
+        assert sorted(message.id for message in survivor) == ["far", "near"]
+        assert pod_b.reclaimed == 2 and crashed == []
+        assert await redis_client.zcard(pod_b.processing_key) == 0
+        assert await redis_client.hlen(pod_b.payloads_key) == 0
+    
+    asyncio.run(scenario())
+
+def test_activation_acks_and_shutdown_releases(redis_client):
+    async def scenario():
+        activated = []
+        pod = _pod(redis_client, activated, horizon=1.0)
+        await pod.schedule(Scheduled("soon", time.time() + 0.05))
+        await pod.schedule(Scheduled("later", time.time() + 0.8))
+        assert await redis_client.zcard(pod.processing_key) == 2
+        
+        await asyncio.sleep(0.1)
+        await pod.run_once()
+        assert [message.id for message in activated] == ["soon"]
+        assert await redis_client.zrange(pod.processing_key, 0, -1) == [b"later"]
+        assert await redis_client.hkeys(pod.payloads_key) == [b"later"]
+        
+        # Al cerrar lo que quedó en la rueda vuelve a `due` para cualquier pod
+        assert await pod.release_pending() == 1
+        assert await redis_client.zcard(pod.processing_key) == 0
+        assert await redis_client.zrange(pod.due_key, 0, -1) == [b"later"]
+    
+    asyncio.run(scenario())